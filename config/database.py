@@ -1,6 +1,33 @@
 """
 数据库连接配置文件
 """
+import os
+
+from dotenv import load_dotenv
+
+# 从 .env 文件加载环境变量（已存在的环境变量优先）
+load_dotenv()
+
+
+def _env_int(name, default):
+    """读取整数类型的环境变量"""
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _env_float(name, default):
+    """读取浮点类型的环境变量"""
+    value = os.getenv(name)
+    return float(value) if value not in (None, '') else default
+
+
+def _env_bool(name, default):
+    """读取布尔类型的环境变量"""
+    value = os.getenv(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
 
 # 不指定数据库名称的配置，用于初始连接和创建数据库
 MYSQL_CONFIG = {
@@ -17,4 +44,42 @@ MYSQL_CONFIG = {
 DB_CONFIG = {
     **MYSQL_CONFIG,
     'database': 'mcp_memory',
-}
\ No newline at end of file
+}
+
+# 连接池配置，可通过环境变量覆盖
+POOL_CONFIG = {
+    # 常驻连接数
+    'pool_size': _env_int('NARRAMIND_DB_POOL_SIZE', 5),
+    # 连接池满时允许额外创建的临时连接数，归还时关闭
+    'max_overflow': _env_int('NARRAMIND_DB_MAX_OVERFLOW', 10),
+    # 等待可用连接的最长秒数，<= 0 表示无限等待
+    'timeout': _env_float('NARRAMIND_DB_POOL_TIMEOUT', 30.0),
+    # 空闲超过该秒数的连接在下次取出时重建，<= 0 表示不回收
+    'recycle': _env_float('NARRAMIND_DB_POOL_RECYCLE', 3600.0),
+    # 取出连接前是否先 ping 一次，剔除已断开的连接
+    'pre_ping': _env_bool('NARRAMIND_DB_POOL_PRE_PING', True),
+}
+
+# 实体缓存配置，缓存 get_by_id 的查询结果
+CACHE_CONFIG = {
+    # 最多缓存的行数，0 表示禁用缓存
+    'maxsize': _env_int('NARRAMIND_CACHE_SIZE', 1024),
+    # 缓存条目的存活秒数，<= 0 表示不过期（仍会在写入时失效）
+    'ttl': _env_float('NARRAMIND_CACHE_TTL', 300.0),
+}
+
+# 上下文快照配置，保存组装好的角色/地点上下文
+SNAPSHOT_CONFIG = {
+    # 最多保存的快照数，0 表示禁用
+    'maxsize': _env_int('NARRAMIND_SNAPSHOT_SIZE', 256),
+    # 快照的存活秒数，<= 0 表示不过期（仍会在相关数据写入时失效）
+    'ttl': _env_float('NARRAMIND_SNAPSHOT_TTL', 300.0),
+}
+
+# 列表工具的分页配置
+PAGE_CONFIG = {
+    # 未指定 limit 时每页返回的行数
+    'default_size': _env_int('NARRAMIND_PAGE_SIZE', 50),
+    # 每页最多返回的行数，更大的 limit 会被截断到该值
+    'max_size': _env_int('NARRAMIND_MAX_PAGE_SIZE', 200),
+}
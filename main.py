@@ -2,14 +2,18 @@
 NarraMind：智能角色扮演与记忆管理系统主入口文件
 """
 import argparse
+import asyncio
 import sys
 import logging
 import os
 import mysql.connector
 from mysql.connector import Error
 
-from src.mcp.server import mcp_server
+from src.mcp.server import build_indexes, mcp_server
 from src.utils.init_database import create_database, create_tables
+from src.utils.migrate import run_migrations
+from src.utils.transfer import TABLES, export_world, import_world
+from src.utils.snapshot import CODECS, DEFAULT_ROW_GROUP_SIZE, restore_snapshot, write_snapshot
 from config.database import MYSQL_CONFIG, DB_CONFIG
 
 # 配置日志
@@ -49,23 +53,104 @@ def initialize_database():
     else:
         logger.info("数据库已存在")
     
+    # 应用尚未执行的结构迁移（索引等），已存在的数据库也能获得新的结构变更
+    logger.info("正在检查数据库迁移...")
+    if not run_migrations():
+        logger.error("数据库迁移失败")
+        return False
+    
     return True
 
+def run_export(args):
+    """执行 export 子命令"""
+    counts = export_world(args.output, args.tables, args.fetch_size)
+    logger.info(f"导出完成，共 {sum(counts.values())} 行：{args.output}")
+
+def run_import(args):
+    """执行 import 子命令"""
+    if not args.skip_db_init and not initialize_database():
+        logger.error("数据库初始化失败，程序退出")
+        sys.exit(1)
+    counts = import_world(args.input, args.chunk_size, args.truncate)
+    logger.info(f"导入完成，共 {sum(counts.values())} 行")
+
+def run_snapshot(args):
+    """执行 snapshot 子命令"""
+    counts = write_snapshot(args.output, args.codec, args.row_group_size, args.tables)
+    logger.info(f"快照完成，共 {sum(counts.values())} 行：{args.output}")
+
+def run_restore(args):
+    """执行 restore 子命令"""
+    if not args.skip_db_init and not initialize_database():
+        logger.error("数据库初始化失败，程序退出")
+        sys.exit(1)
+    counts = restore_snapshot(args.input, args.chunk_size, args.truncate)
+    logger.info(f"恢复完成，共 {sum(counts.values())} 行")
+
 def main():
     """主函数，解析命令行参数并启动MCP服务器"""
     parser = argparse.ArgumentParser(description='启动NarraMind智能角色扮演与记忆管理系统')
     parser.add_argument('--host', type=str, default='localhost', help='服务器主机地址')
     parser.add_argument('--port', type=int, default=8080, help='服务器端口')
     parser.add_argument('--skip-db-init', action='store_true', help='跳过数据库初始化')
+    parser.add_argument('--restore-snapshot', metavar='PATH',
+                        help='启动前清空数据库并从快照恢复，同时预热实体缓存')
+    
+    subparsers = parser.add_subparsers(dest='command')
+    export_parser = subparsers.add_parser('export', help='把整个世界导出为 JSONL 文件')
+    export_parser.add_argument('output', help='输出文件路径，以 .gz 结尾时压缩')
+    export_parser.add_argument('--tables', nargs='+', choices=TABLES, help='只导出这些表')
+    export_parser.add_argument('--fetch-size', type=int, default=1000, help='每次从数据库取回的行数')
+    import_parser = subparsers.add_parser('import', help='从 JSONL 文件导入整个世界')
+    import_parser.add_argument('input', help='export 生成的文件路径')
+    import_parser.add_argument('--chunk-size', type=int, default=1000, help='每条 INSERT 语句的行数')
+    import_parser.add_argument('--truncate', action='store_true', help='导入前清空所有表')
+    snapshot_parser = subparsers.add_parser('snapshot', help='把整个世界写为列式二进制快照')
+    snapshot_parser.add_argument('output', help='输出文件路径')
+    snapshot_parser.add_argument('--tables', nargs='+', choices=TABLES, help='只写入这些表')
+    snapshot_parser.add_argument('--codec', choices=list(CODECS), help='压缩方式，默认取可用的最优者')
+    snapshot_parser.add_argument('--row-group-size', type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                                 help='每个行组的行数')
+    restore_parser = subparsers.add_parser('restore', help='从列式二进制快照恢复整个世界')
+    restore_parser.add_argument('input', help='snapshot 生成的文件路径')
+    restore_parser.add_argument('--chunk-size', type=int, default=5000, help='每条 INSERT 语句的行数')
+    restore_parser.add_argument('--truncate', action='store_true', help='恢复前清空所有表')
     
     args = parser.parse_args()
     
+    commands = {'export': run_export, 'import': run_import,
+                'snapshot': run_snapshot, 'restore': run_restore}
+    if args.command in commands:
+        try:
+            commands[args.command](args)
+        except (Error, OSError, ValueError) as e:
+            logger.error(f"{args.command} 失败: {e}")
+            sys.exit(1)
+        return
+    
     # 初始化数据库（除非指定跳过）
     if not args.skip_db_init:
         if not initialize_database():
             logger.error("数据库初始化失败，程序退出")
             sys.exit(1)
     
+    # 从快照恢复世界，服务器启动时缓存中已有快照中的实体
+    if args.restore_snapshot:
+        try:
+            counts = restore_snapshot(args.restore_snapshot, truncate=True, warm=True)
+        except (Error, OSError, ValueError) as e:
+            logger.error(f"从快照恢复失败，数据库保持恢复前的状态: {e}")
+            sys.exit(1)
+        logger.info(f"已从快照恢复 {sum(counts.values())} 行：{args.restore_snapshot}")
+    
+    # 启动前建立进程内检索索引，检索时不再扫描数据库
+    logger.info("正在建立检索索引...")
+    try:
+        asyncio.run(build_indexes())
+    except Error as e:
+        logger.error(f"建立检索索引失败: {e}")
+        sys.exit(1)
+    
     # 设置服务器配置
     mcp_server.host = args.host
     mcp_server.port = args.port
@@ -3,6 +3,10 @@
 """
 
 from .connection import DatabaseConnection
+from .async_connection import AsyncDatabaseConnection
 
 # 创建全局数据库连接实例
-db = DatabaseConnection()
\ No newline at end of file
+db = DatabaseConnection()
+
+# 创建全局异步数据库连接实例（连接池在首次使用时创建）
+adb = AsyncDatabaseConnection()
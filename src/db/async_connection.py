@@ -0,0 +1,243 @@
+"""
+异步数据库连接管理模块
+"""
+import mysql.connector
+import sys
+import os
+from contextlib import asynccontextmanager
+from itertools import batched
+
+# 添加项目根目录到系统路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from config.database import DB_CONFIG, POOL_CONFIG
+from src.db.ids import decode_rows
+from src.db.pool import AsyncConnectionPool
+from src.db.session import AsyncSession
+
+
+class AsyncDatabaseConnection:
+    """异步数据库连接管理类"""
+
+    _instance = None
+    _connection_pool = None
+
+    def __new__(cls):
+        """单例模式，确保只创建一个异步连接池"""
+        if cls._instance is None:
+            cls._instance = super(AsyncDatabaseConnection, cls).__new__(cls)
+        return cls._instance
+
+    def _get_pool(self):
+        """延迟创建连接池，使其绑定到实际运行的事件循环"""
+        if AsyncDatabaseConnection._connection_pool is None:
+            AsyncDatabaseConnection._connection_pool = AsyncConnectionPool(**POOL_CONFIG, **DB_CONFIG)
+        return AsyncDatabaseConnection._connection_pool
+
+    async def get_connection(self):
+        """获取数据库连接"""
+        try:
+            return await self._get_pool().get_connection()
+        except mysql.connector.Error as err:
+            print(f"无法获取数据库连接: {err}")
+            raise
+
+    def pool_stats(self):
+        """
+        获取连接池实时统计
+        
+        Returns:
+            dict: 使用中/空闲/等待者数量及获取等待直方图
+        """
+        return self._get_pool().get_stats()
+
+    async def close(self):
+        """关闭连接池"""
+        if AsyncDatabaseConnection._connection_pool is not None:
+            await AsyncDatabaseConnection._connection_pool.close()
+            AsyncDatabaseConnection._connection_pool = None
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        开启一个事务会话，块内所有语句共用一个连接，正常退出时提交，异常时回滚
+
+        用法:
+            async with adb.transaction() as session:
+                await session.execute_query(...)
+                await session.execute_update(...)
+
+        Yields:
+            AsyncSession: 事务会话
+        """
+        connection = await self.get_connection()
+        broken = False
+        try:
+            await connection.start_transaction()
+            session = AsyncSession(connection)
+            yield session
+            await connection.commit()
+            session._run_after_commit()
+        except BaseException as exc:
+            if isinstance(exc, mysql.connector.Error):
+                broken = await connection.is_broken(exc)
+            if not broken:
+                try:
+                    await connection.rollback()
+                except mysql.connector.Error as err:
+                    print(f"事务回滚失败: {err}")
+            raise
+        finally:
+            if broken:
+                await connection.discard()
+            else:
+                await connection.close()
+
+    async def execute_query(self, query, params=None):
+        """
+        执行查询操作
+
+        Args:
+            query (str): SQL查询语句
+            params (tuple, optional): 参数化查询的参数
+
+        Returns:
+            list: 查询结果
+        """
+        connection = await self.get_connection()
+        cursor = None
+        broken = False
+        try:
+            cursor = await connection.cursor(dictionary=True)
+            if params:
+                await cursor.execute(query, params)
+            else:
+                await cursor.execute(query)
+
+            result = await cursor.fetchall()
+            return decode_rows(result)
+        except mysql.connector.Error as err:
+            print(f"查询执行失败: {err}")
+            broken = await connection.is_broken(err)
+            raise
+        finally:
+            if cursor:
+                await cursor.close()
+            if broken:
+                await connection.discard()
+            else:
+                await connection.close()
+
+    async def execute_update(self, query, params=None):
+        """
+        执行更新操作（INSERT, UPDATE, DELETE）
+
+        Args:
+            query (str): SQL更新语句
+            params (tuple, optional): 参数化查询的参数
+
+        Returns:
+            int: 影响的行数
+        """
+        connection = await self.get_connection()
+        cursor = None
+        broken = False
+        try:
+            cursor = await connection.cursor()
+            if params:
+                await cursor.execute(query, params)
+            else:
+                await cursor.execute(query)
+
+            await connection.commit()
+            return cursor.rowcount
+        except mysql.connector.Error as err:
+            print(f"更新操作失败: {err}")
+            broken = await connection.is_broken(err)
+            if not broken:
+                await connection.rollback()
+            raise
+        finally:
+            if cursor:
+                await cursor.close()
+            if broken:
+                await connection.discard()
+            else:
+                await connection.close()
+
+    async def execute_insert(self, query, params=None):
+        """
+        执行插入操作并返回自动生成的ID
+
+        Args:
+            query (str): SQL插入语句
+            params (tuple, optional): 参数化查询的参数
+
+        Returns:
+            int: 最后插入的ID
+        """
+        connection = await self.get_connection()
+        cursor = None
+        broken = False
+        try:
+            cursor = await connection.cursor()
+            if params:
+                await cursor.execute(query, params)
+            else:
+                await cursor.execute(query)
+
+            await connection.commit()
+            return cursor.lastrowid
+        except mysql.connector.Error as err:
+            print(f"插入操作失败: {err}")
+            broken = await connection.is_broken(err)
+            if not broken:
+                await connection.rollback()
+            raise
+        finally:
+            if cursor:
+                await cursor.close()
+            if broken:
+                await connection.discard()
+            else:
+                await connection.close()
+
+    async def execute_many(self, query, seq_params, chunk_size=1000):
+        """
+        批量执行同一条语句，按块提交
+
+        INSERT ... VALUES 语句会由驱动改写为多行插入，每块只需一次往返和一次提交。
+        某一块失败时只回滚该块，之前已提交的块保持不变。
+
+        Args:
+            query (str): SQL语句
+            seq_params (iterable): 每行一个参数元组
+            chunk_size (int): 每次提交的行数
+
+        Returns:
+            int: 影响的总行数
+        """
+        connection = await self.get_connection()
+        cursor = None
+        broken = False
+        total = 0
+        try:
+            cursor = await connection.cursor()
+            for chunk in batched(seq_params, chunk_size):
+                await cursor.executemany(query, chunk)
+                await connection.commit()
+                total += cursor.rowcount
+            return total
+        except mysql.connector.Error as err:
+            print(f"批量操作失败: {err}")
+            broken = await connection.is_broken(err)
+            if not broken:
+                await connection.rollback()
+            raise
+        finally:
+            if cursor:
+                await cursor.close()
+            if broken:
+                await connection.discard()
+            else:
+                await connection.close()
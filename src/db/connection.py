@@ -2,14 +2,18 @@
 数据库连接管理模块
 """
 import mysql.connector
-from mysql.connector import pooling
 import sys
 import os
+from contextlib import contextmanager
+from itertools import batched
 
 # 添加项目根目录到系统路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from config.database import DB_CONFIG
+from config.database import DB_CONFIG, POOL_CONFIG
+from src.db.ids import decode_rows
+from src.db.pool import ConnectionPool
+from src.db.session import Session
 
 class DatabaseConnection:
     """数据库连接管理类"""
@@ -22,11 +26,7 @@ class DatabaseConnection:
         if cls._instance is None:
             cls._instance = super(DatabaseConnection, cls).__new__(cls)
             try:
-                cls._connection_pool = pooling.MySQLConnectionPool(
-                    pool_name="mcp_pool",
-                    pool_size=5,
-                    **DB_CONFIG
-                )
+                cls._connection_pool = ConnectionPool(**POOL_CONFIG, **DB_CONFIG)
                 print("数据库连接池创建成功")
             except mysql.connector.Error as err:
                 print(f"数据库连接池创建失败: {err}")
@@ -41,6 +41,51 @@ class DatabaseConnection:
             print(f"无法获取数据库连接: {err}")
             raise
     
+    def pool_stats(self):
+        """
+        获取连接池实时统计
+        
+        Returns:
+            dict: 使用中/空闲/等待者数量及获取等待直方图
+        """
+        return self._connection_pool.get_stats()
+    
+    @contextmanager
+    def transaction(self):
+        """
+        开启一个事务会话，块内所有语句共用一个连接，正常退出时提交，异常时回滚
+        
+        用法:
+            with db.transaction() as session:
+                session.execute_query(...)
+                session.execute_update(...)
+        
+        Yields:
+            Session: 事务会话
+        """
+        connection = self.get_connection()
+        broken = False
+        try:
+            connection.start_transaction()
+            session = Session(connection)
+            yield session
+            connection.commit()
+            session._run_after_commit()
+        except BaseException as exc:
+            if isinstance(exc, mysql.connector.Error):
+                broken = connection.is_broken(exc)
+            if not broken:
+                try:
+                    connection.rollback()
+                except mysql.connector.Error as err:
+                    print(f"事务回滚失败: {err}")
+            raise
+        finally:
+            if broken:
+                connection.discard()
+            else:
+                connection.close()
+    
     def execute_query(self, query, params=None):
         """
         执行查询操作
@@ -54,6 +99,7 @@ class DatabaseConnection:
         """
         connection = self.get_connection()
         cursor = None
+        broken = False
         try:
             cursor = connection.cursor(dictionary=True)
             if params:
@@ -62,14 +108,18 @@ class DatabaseConnection:
                 cursor.execute(query)
             
             result = cursor.fetchall()
-            return result
+            return decode_rows(result)
         except mysql.connector.Error as err:
             print(f"查询执行失败: {err}")
+            broken = connection.is_broken(err)
             raise
         finally:
             if cursor:
                 cursor.close()
-            connection.close()
+            if broken:
+                connection.discard()
+            else:
+                connection.close()
     
     def execute_update(self, query, params=None):
         """
@@ -84,6 +134,7 @@ class DatabaseConnection:
         """
         connection = self.get_connection()
         cursor = None
+        broken = False
         try:
             cursor = connection.cursor()
             if params:
@@ -95,12 +146,17 @@ class DatabaseConnection:
             return cursor.rowcount
         except mysql.connector.Error as err:
             print(f"更新操作失败: {err}")
-            connection.rollback()
+            broken = connection.is_broken(err)
+            if not broken:
+                connection.rollback()
             raise
         finally:
             if cursor:
                 cursor.close()
-            connection.close()
+            if broken:
+                connection.discard()
+            else:
+                connection.close()
     
     def execute_insert(self, query, params=None):
         """
@@ -115,6 +171,7 @@ class DatabaseConnection:
         """
         connection = self.get_connection()
         cursor = None
+        broken = False
         try:
             cursor = connection.cursor()
             if params:
@@ -126,9 +183,54 @@ class DatabaseConnection:
             return cursor.lastrowid
         except mysql.connector.Error as err:
             print(f"插入操作失败: {err}")
-            connection.rollback()
+            broken = connection.is_broken(err)
+            if not broken:
+                connection.rollback()
             raise
         finally:
             if cursor:
                 cursor.close()
-            connection.close()
\ No newline at end of file
+            if broken:
+                connection.discard()
+            else:
+                connection.close()
+    
+    def execute_many(self, query, seq_params, chunk_size=1000):
+        """
+        批量执行同一条语句，按块提交
+        
+        INSERT ... VALUES 语句会由驱动改写为多行插入，每块只需一次往返和一次提交。
+        某一块失败时只回滚该块，之前已提交的块保持不变。
+        
+        Args:
+            query (str): SQL语句
+            seq_params (iterable): 每行一个参数元组
+            chunk_size (int): 每次提交的行数
+            
+        Returns:
+            int: 影响的总行数
+        """
+        connection = self.get_connection()
+        cursor = None
+        broken = False
+        total = 0
+        try:
+            cursor = connection.cursor()
+            for chunk in batched(seq_params, chunk_size):
+                cursor.executemany(query, chunk)
+                connection.commit()
+                total += cursor.rowcount
+            return total
+        except mysql.connector.Error as err:
+            print(f"批量操作失败: {err}")
+            broken = connection.is_broken(err)
+            if not broken:
+                connection.rollback()
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+            if broken:
+                connection.discard()
+            else:
+                connection.close()
@@ -0,0 +1,128 @@
+"""
+实体ID：生成按时间递增的 UUIDv7，并在字符串和 BINARY(16) 存储格式之间转换
+
+各表的ID列以 BINARY(16) 存储（见迁移 0007_binary_ids），模型层以外的代码（工具、
+记忆引擎、实体缓存）只看到标准的 36 位小写字符串：
+
+    写入：模型构造 SQL 参数时用 encode_id / encode_ids 转换ID参数
+    读取：db 层返回查询结果前用 decode_rows 按列名转换 ID_COLUMNS 中的列
+    键：变更通知、实体缓存等以ID为键的地方用 canonical_id 规范为结果中的写法
+
+参数没有列名，无法判断一个字符串是不是ID，因此由模型显式转换；结果带列名，统一在 db 层转换。
+"""
+import os
+import threading
+import time
+import uuid
+
+# 以 BINARY(16) 存储的ID列
+ID_COLUMNS = frozenset({
+    'character_id', 'character_id_1', 'character_id_2',
+    'location_id', 'parent_location_id', 'region_id',
+    'event_id', 'skill_id', 'item_id', 'relationship_id',
+})
+
+# 不是 UUID 的旧ID（如批量创建时手动指定的 'hero-1'）按名称映射为固定的 UUIDv5，
+# 迁移按同样的规则转换已有数据，旧ID作为输入仍然能找到对应的行。
+# 映射前转为小写并去掉末尾空格，与原 utf8mb4_unicode_ci 列上的比较规则一致
+LEGACY_NAMESPACE = uuid.UUID('6f1c7a52-3d4e-4b8a-9c0f-5e2d8b7a1c93')
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7():
+    """
+    生成 UUIDv7（RFC 9562）
+
+    高 48 位是毫秒级 Unix 时间戳，新ID总是追加在主键索引的末尾，不会像随机的
+    UUIDv4 那样造成页分裂。同一毫秒内的 12 位计数器从随机值开始递增，
+    计数器用尽时借用下一毫秒，同一进程生成的ID严格递增。
+
+    Returns:
+        uuid.UUID: 新的 UUID
+    """
+    global _last_ms, _counter
+    with _lock:
+        now = time.time_ns() // 1_000_000
+        if now > _last_ms:
+            _last_ms, _counter = now, int.from_bytes(os.urandom(2)) & 0x7FF
+        elif _counter < 0xFFF:
+            _counter += 1
+        else:
+            _last_ms, _counter = _last_ms + 1, 0
+        timestamp, counter = _last_ms, _counter
+    rand_b = int.from_bytes(os.urandom(8)) & ((1 << 62) - 1)
+    return uuid.UUID(int=(timestamp << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand_b)
+
+
+def new_id():
+    """生成新的实体ID"""
+    return str(uuid7())
+
+
+def parse_id(value):
+    """把ID字符串解析为 UUID，接受大写、无连字符等写法，不是 UUID 的旧ID映射为 UUIDv5"""
+    if isinstance(value, uuid.UUID):
+        return value
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        return uuid.uuid5(LEGACY_NAMESPACE, value.rstrip(' ').lower())
+
+
+def canonical_id(value):
+    """把ID规范为查询结果中的写法（小写标准 UUID，旧ID为映射后的 UUID），None 保持不变"""
+    if value is None or isinstance(value, (bytes, bytearray)):
+        return decode_id(value)
+    return str(parse_id(value))
+
+
+def canonical_fields(fields):
+    """返回ID列规范化后的字段副本"""
+    return {name: canonical_id(value) if name in ID_COLUMNS else value for name, value in fields.items()}
+
+
+def encode_id(value):
+    """把ID转换为 BINARY(16) 参数，None 保持不变"""
+    if value is None or isinstance(value, (bytes, bytearray)):
+        return value
+    return parse_id(value).bytes
+
+
+def encode_ids(values):
+    """把一组ID转换为参数元组"""
+    return tuple(encode_id(value) for value in values)
+
+
+def encode_field(name, value):
+    """按列名转换字段值：ID列转换为 BINARY(16)，其他列保持不变"""
+    return encode_id(value) if name in ID_COLUMNS else value
+
+
+def decode_id(value):
+    """把 BINARY(16) 列的值转换为ID字符串"""
+    if isinstance(value, (bytes, bytearray)):
+        return str(uuid.UUID(bytes=bytes(value)))
+    return value
+
+
+def decode_rows(rows):
+    """
+    就地转换查询结果中的ID列
+
+    Args:
+        rows (list): 字典形式的行
+
+    Returns:
+        list: 同一个列表
+    """
+    if not rows:
+        return rows
+    columns = [name for name in rows[0] if name in ID_COLUMNS]
+    if columns:
+        for row in rows:
+            for name in columns:
+                row[name] = decode_id(row[name])
+    return rows
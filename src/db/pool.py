@@ -0,0 +1,447 @@
+"""
+数据库连接池模块，提供带公平等待队列与运行统计的同步/异步连接池
+"""
+import asyncio
+import bisect
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector import aio
+from mysql.connector.errors import PoolError
+
+
+class PoolTimeoutError(PoolError):
+    """在超时时间内未能从连接池获取到连接"""
+
+
+# 获取连接等待时间直方图的桶上界（毫秒），最后一个桶收纳所有更长的等待
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolStats:
+    """连接池运行统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.timeouts = 0
+        self.created = 0
+        self.recycled = 0
+        self.discarded = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self._histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def record_wait(self, seconds):
+        """记录一次成功获取连接的等待时间"""
+        wait_ms = seconds * 1000
+        with self._lock:
+            self.acquired += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+            self._histogram[bisect.bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+
+    def incr(self, counter):
+        """累加指定计数器"""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self):
+        """
+        返回统计快照
+
+        Returns:
+            dict: 累计计数与等待时间直方图
+        """
+        with self._lock:
+            labels = [f"<={bound}ms" for bound in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+            return {
+                'acquired': self.acquired,
+                'timeouts': self.timeouts,
+                'created': self.created,
+                'recycled': self.recycled,
+                'discarded': self.discarded,
+                'wait_avg_ms': round(self.wait_total_ms / self.acquired, 3) if self.acquired else 0.0,
+                'wait_max_ms': round(self.wait_max_ms, 3),
+                'wait_histogram': dict(zip(labels, self._histogram)),
+            }
+
+
+class _PoolEntry:
+    """连接池中的一个物理连接及其时间信息"""
+
+    __slots__ = ('connection', 'created_at', 'last_used')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+# 交给等待者的占位符，表示等待者可以自行新建一个连接
+_CREATE_SLOT = object()
+
+
+class PooledConnection:
+    """从连接池借出的连接，close() 会将连接归还连接池而不是真正关闭"""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        return getattr(self._entry.connection, name)
+
+    def close(self):
+        """归还连接"""
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool.release(entry)
+
+    def discard(self):
+        """连接已不可用时调用，关闭物理连接并释放其占用的名额"""
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool.release(entry, discard=True)
+
+    def is_broken(self, err):
+        """执行出错后判断连接是否已不可用：连接断开或协议错误，或已无法 ping 通"""
+        if isinstance(err, (mysql.connector.OperationalError, mysql.connector.InterfaceError)):
+            return True
+        try:
+            return not self._entry.connection.is_connected()
+        except mysql.connector.Error:
+            return True
+
+
+class AsyncPooledConnection:
+    """从异步连接池借出的连接，await close() 会将连接归还连接池"""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        return getattr(self._entry.connection, name)
+
+    async def close(self):
+        """归还连接"""
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            await self._pool.release(entry)
+
+    async def discard(self):
+        """连接已不可用时调用，关闭物理连接并释放其占用的名额"""
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            await self._pool.release(entry, discard=True)
+
+    async def is_broken(self, err):
+        """is_broken 的异步版本"""
+        if isinstance(err, (mysql.connector.OperationalError, mysql.connector.InterfaceError)):
+            return True
+        try:
+            return not await self._entry.connection.is_connected()
+        except mysql.connector.Error:
+            return True
+
+
+class _Waiter:
+    """同步连接池中的等待者"""
+
+    __slots__ = ('event', 'entry')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.entry = None
+
+
+class _BasePool:
+    """同步与异步连接池共用的容量与统计逻辑"""
+
+    def __init__(self, pool_size=5, max_overflow=0, timeout=30.0, recycle=3600.0,
+                 pre_ping=True, **config):
+        if pool_size < 1:
+            raise ValueError("连接池大小必须大于0")
+        self._config = config
+        self.pool_size = pool_size
+        self.max_overflow = max(0, max_overflow)
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.recycle = recycle if recycle and recycle > 0 else None
+        self.pre_ping = pre_ping
+        self.stats = PoolStats()
+        self._idle = deque()
+        self._waiters = deque()
+        self._open = 0
+        self._in_use = 0
+
+    @property
+    def max_connections(self):
+        return self.pool_size + self.max_overflow
+
+    def _is_stale(self, entry):
+        return self.recycle is not None and time.monotonic() - entry.last_used > self.recycle
+
+    def _timeout_error(self):
+        self.stats.incr('timeouts')
+        return PoolTimeoutError(
+            f"等待数据库连接超时({self.timeout}s)，"
+            f"使用中 {self._in_use}/{self.max_connections}，等待者 {len(self._waiters)}"
+        )
+
+    def _snapshot(self):
+        return {
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'open': self._open,
+            'in_use': self._in_use,
+            'idle': len(self._idle),
+            'waiters': len(self._waiters),
+            **self.stats.snapshot(),
+        }
+
+
+class ConnectionPool(_BasePool):
+    """
+    线程安全的同步连接池
+
+    连接耗尽时请求按 FIFO 顺序排队，归还的连接直接交给队首等待者，
+    超过 timeout 仍未拿到连接则抛出 PoolTimeoutError。
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+
+    def get_connection(self):
+        """
+        获取一个连接
+
+        Returns:
+            PooledConnection: 借出的连接，使用完毕后调用 close() 归还
+        """
+        started = time.monotonic()
+        waiter = None
+        with self._lock:
+            if self._idle and not self._waiters:
+                entry = self._idle.pop()
+            elif self._open < self.max_connections:
+                self._open += 1
+                entry = _CREATE_SLOT
+            else:
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+
+        if waiter is not None:
+            waiter.event.wait(self.timeout)
+            with self._lock:
+                if waiter.entry is None:
+                    error = self._timeout_error()
+                    self._waiters.remove(waiter)
+                    raise error
+                entry = waiter.entry
+
+        entry = self._checkout(entry)
+        with self._lock:
+            self._in_use += 1
+        self.stats.record_wait(time.monotonic() - started)
+        return PooledConnection(self, entry)
+
+    def _checkout(self, entry):
+        """确保交出去的是一个可用连接，必要时重建"""
+        try:
+            if entry is not _CREATE_SLOT:
+                if self._is_stale(entry):
+                    self.stats.incr('recycled')
+                    self._close_quietly(entry.connection)
+                elif not self.pre_ping or entry.connection.is_connected():
+                    return entry
+                else:
+                    self.stats.incr('discarded')
+                    self._close_quietly(entry.connection)
+            entry = _PoolEntry(mysql.connector.connect(**self._config))
+            self.stats.incr('created')
+            return entry
+        except BaseException:
+            self._release_slot()
+            raise
+
+    def release(self, entry, discard=False):
+        """归还连接，优先交给等待时间最长的请求"""
+        entry.last_used = time.monotonic()
+        close_entry = None
+        with self._lock:
+            self._in_use -= 1
+            if discard:
+                close_entry = entry
+                entry = _CREATE_SLOT
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.entry = entry
+                waiter.event.set()
+            elif entry is _CREATE_SLOT:
+                self._open -= 1
+            elif len(self._idle) >= self.pool_size:
+                # 溢出连接不常驻
+                self._open -= 1
+                close_entry = entry
+            else:
+                self._idle.append(entry)
+        if close_entry is not None:
+            if discard:
+                self.stats.incr('discarded')
+            self._close_quietly(close_entry.connection)
+
+    def _release_slot(self):
+        """新建连接失败时释放占用的名额"""
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.entry = _CREATE_SLOT
+                waiter.event.set()
+            else:
+                self._open -= 1
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except mysql.connector.Error:
+            pass
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+            self._open -= len(idle)
+        for entry in idle:
+            self._close_quietly(entry.connection)
+
+    def get_stats(self):
+        """
+        获取连接池实时统计
+
+        Returns:
+            dict: 使用中/空闲/等待者数量及获取等待直方图
+        """
+        with self._lock:
+            return self._snapshot()
+
+
+class AsyncConnectionPool(_BasePool):
+    """
+    基于 mysql.connector.aio 的异步连接池
+
+    语义与 ConnectionPool 相同；所有状态只在事件循环线程内修改，无需加锁。
+    """
+
+    async def get_connection(self):
+        """
+        获取一个连接，连接池耗尽时挂起等待而不是阻塞事件循环
+
+        Returns:
+            AsyncPooledConnection: 借出的连接，使用完毕后 await close() 归还
+        """
+        started = time.monotonic()
+        if self._idle and not self._waiters:
+            entry = self._idle.pop()
+        elif self._open < self.max_connections:
+            self._open += 1
+            entry = _CREATE_SLOT
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                async with asyncio.timeout(self.timeout):
+                    entry = await future
+            except (TimeoutError, asyncio.CancelledError) as exc:
+                error = self._timeout_error() if isinstance(exc, TimeoutError) else None
+                if future.done() and not future.cancelled():
+                    # 连接已经交到手上但请求超时或被取消，转交给下一个等待者
+                    surplus = self._hand_over(future.result())
+                    if surplus is not None:
+                        await self._close_quietly(surplus.connection)
+                elif future in self._waiters:
+                    self._waiters.remove(future)
+                if error is not None:
+                    raise error from None
+                raise
+
+        entry = await self._checkout(entry)
+        self._in_use += 1
+        self.stats.record_wait(time.monotonic() - started)
+        return AsyncPooledConnection(self, entry)
+
+    async def _checkout(self, entry):
+        """确保交出去的是一个可用连接，必要时重建"""
+        try:
+            if entry is not _CREATE_SLOT:
+                if self._is_stale(entry):
+                    self.stats.incr('recycled')
+                    await self._close_quietly(entry.connection)
+                elif not self.pre_ping or await entry.connection.is_connected():
+                    return entry
+                else:
+                    self.stats.incr('discarded')
+                    await self._close_quietly(entry.connection)
+            entry = _PoolEntry(await aio.connect(**self._config))
+            self.stats.incr('created')
+            return entry
+        except BaseException:
+            self._hand_over(_CREATE_SLOT)
+            raise
+
+    def _hand_over(self, entry):
+        """把连接（或新建名额）交给队首仍在等待的请求，没有等待者时放回空闲队列"""
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(entry)
+                return None
+        if entry is _CREATE_SLOT:
+            self._open -= 1
+        elif len(self._idle) >= self.pool_size:
+            # 溢出连接不常驻
+            self._open -= 1
+            return entry
+        else:
+            self._idle.append(entry)
+        return None
+
+    async def release(self, entry, discard=False):
+        """归还连接，优先交给等待时间最长的请求"""
+        entry.last_used = time.monotonic()
+        self._in_use -= 1
+        if discard:
+            self.stats.incr('discarded')
+            await self._close_quietly(entry.connection)
+            self._hand_over(_CREATE_SLOT)
+            return
+        surplus = self._hand_over(entry)
+        if surplus is not None:
+            await self._close_quietly(surplus.connection)
+
+    @staticmethod
+    async def _close_quietly(connection):
+        try:
+            await connection.close()
+        except mysql.connector.Error:
+            pass
+
+    async def close(self):
+        """关闭所有空闲连接"""
+        idle, self._idle = self._idle, deque()
+        self._open -= len(idle)
+        for entry in idle:
+            await self._close_quietly(entry.connection)
+
+    def get_stats(self):
+        """
+        获取连接池实时统计
+
+        Returns:
+            dict: 使用中/空闲/等待者数量及获取等待直方图
+        """
+        return self._snapshot()
@@ -0,0 +1,194 @@
+"""
+事务会话模块，在同一个连接上执行多条语句并统一提交
+"""
+from itertools import batched
+
+from src.db.ids import decode_rows
+
+
+class Session:
+    """
+    同步事务会话，由 DatabaseConnection.transaction() 创建
+
+    与 DatabaseConnection 提供相同的 execute_* 接口，但所有语句共用一个连接，
+    不单独提交，由 transaction() 在退出时统一提交或回滚。
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._after_commit = []
+
+    def after_commit(self, callback):
+        """登记一个在事务提交成功后执行的回调，事务回滚时丢弃"""
+        self._after_commit.append(callback)
+
+    def _run_after_commit(self):
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def execute_query(self, query, params=None):
+        """
+        执行查询操作
+
+        Args:
+            query (str): SQL查询语句
+            params (tuple, optional): 参数化查询的参数
+
+        Returns:
+            list: 查询结果
+        """
+        cursor = self._connection.cursor(dictionary=True)
+        try:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            return decode_rows(cursor.fetchall())
+        finally:
+            cursor.close()
+
+    def execute_update(self, query, params=None):
+        """
+        执行更新操作（INSERT, UPDATE, DELETE）
+
+        Returns:
+            int: 影响的行数
+        """
+        cursor = self._connection.cursor()
+        try:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def execute_insert(self, query, params=None):
+        """
+        执行插入操作并返回自动生成的ID
+
+        Returns:
+            int: 最后插入的ID
+        """
+        cursor = self._connection.cursor()
+        try:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            return cursor.lastrowid
+        finally:
+            cursor.close()
+
+    def execute_many(self, query, seq_params, chunk_size=1000):
+        """
+        批量执行同一条语句，随事务统一提交
+
+        Returns:
+            int: 影响的总行数
+        """
+        cursor = self._connection.cursor()
+        total = 0
+        try:
+            for chunk in batched(seq_params, chunk_size):
+                cursor.executemany(query, chunk)
+                total += cursor.rowcount
+            return total
+        finally:
+            cursor.close()
+
+
+class AsyncSession:
+    """
+    异步事务会话，由 AsyncDatabaseConnection.transaction() 创建
+
+    与 AsyncDatabaseConnection 提供相同的 execute_* 接口，但所有语句共用一个连接，
+    不单独提交，由 transaction() 在退出时统一提交或回滚。
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._after_commit = []
+
+    def after_commit(self, callback):
+        """登记一个在事务提交成功后执行的回调，事务回滚时丢弃"""
+        self._after_commit.append(callback)
+
+    def _run_after_commit(self):
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    async def execute_query(self, query, params=None):
+        """
+        执行查询操作
+
+        Args:
+            query (str): SQL查询语句
+            params (tuple, optional): 参数化查询的参数
+
+        Returns:
+            list: 查询结果
+        """
+        cursor = await self._connection.cursor(dictionary=True)
+        try:
+            if params:
+                await cursor.execute(query, params)
+            else:
+                await cursor.execute(query)
+            return decode_rows(await cursor.fetchall())
+        finally:
+            await cursor.close()
+
+    async def execute_update(self, query, params=None):
+        """
+        执行更新操作（INSERT, UPDATE, DELETE）
+
+        Returns:
+            int: 影响的行数
+        """
+        cursor = await self._connection.cursor()
+        try:
+            if params:
+                await cursor.execute(query, params)
+            else:
+                await cursor.execute(query)
+            return cursor.rowcount
+        finally:
+            await cursor.close()
+
+    async def execute_insert(self, query, params=None):
+        """
+        执行插入操作并返回自动生成的ID
+
+        Returns:
+            int: 最后插入的ID
+        """
+        cursor = await self._connection.cursor()
+        try:
+            if params:
+                await cursor.execute(query, params)
+            else:
+                await cursor.execute(query)
+            return cursor.lastrowid
+        finally:
+            await cursor.close()
+
+    async def execute_many(self, query, seq_params, chunk_size=1000):
+        """
+        批量执行同一条语句，随事务统一提交
+
+        Returns:
+            int: 影响的总行数
+        """
+        cursor = await self._connection.cursor()
+        total = 0
+        try:
+            for chunk in batched(seq_params, chunk_size):
+                await cursor.executemany(query, chunk)
+                total += cursor.rowcount
+            return total
+        finally:
+            await cursor.close()
@@ -0,0 +1,105 @@
+"""
+列表工具的分页：不透明的续页游标和每页数量上限
+"""
+import base64
+import binascii
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from config.database import PAGE_CONFIG
+
+
+def page_size(limit=None):
+    """
+    校验每页数量，超过上限时截断到上限
+
+    Args:
+        limit: 请求的每页数量，None 时取默认值
+
+    Returns:
+        int: 实际使用的每页数量
+    """
+    if limit is None:
+        return PAGE_CONFIG['default_size']
+    if not isinstance(limit, int) or limit <= 0:
+        raise ValueError("limit 必须是大于0的整数")
+    return min(limit, PAGE_CONFIG['max_size'])
+
+
+def _scope_digest(scope):
+    """查询范围（工具名、排序方式、过滤参数）的摘要，防止游标被用在别的查询上"""
+    raw = json.dumps(scope, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:12]
+
+
+def _encode_value(value):
+    """把排序键转换为可写入 JSON 的值，时间转为 MySQL 可直接比较的字符串"""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def encode_cursor(scope, values):
+    """
+    把上一页最后一行的排序键编码为续页游标
+
+    Args:
+        scope: 查询范围，同一查询的各页必须相同
+        values: 排序列上的值
+
+    Returns:
+        str: URL 安全的 base64 字符串
+    """
+    payload = {'s': _scope_digest(scope), 'v': [_encode_value(v) for v in values]}
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(scope, cursor):
+    """
+    解码续页游标
+
+    Args:
+        scope: 查询范围，必须与生成游标时相同
+        cursor: 游标字符串，None 或空字符串表示第一页
+
+    Returns:
+        tuple: 上一页最后一行的排序键，第一页时为 None
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        digest, values = payload['s'], payload['v']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("无效的分页游标")
+    if digest != _scope_digest(scope) or not isinstance(values, list):
+        raise ValueError("分页游标与当前查询不匹配")
+    return tuple(values)
+
+
+def make_page(rows, limit, scope, columns):
+    """
+    组装一页结果
+
+    Args:
+        rows: 按 limit + 1 查询得到的行，多出的一行只用来判断是否还有下一页
+        limit: 每页数量
+        scope: 查询范围
+        columns: 排序列 [(列名, 是否降序)]，与查询使用的相同
+
+    Returns:
+        dict: {"items": 本页的行, "next_cursor": 下一页的游标，没有下一页时为 None}
+    """
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(scope, [items[-1][name] for name, _ in columns])
+    return {'items': items, 'next_cursor': next_cursor}
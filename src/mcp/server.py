@@ -5,7 +5,10 @@ import logging
 from typing import Dict, Any, List, Optional, Union
 from fastmcp import FastMCP
 
+from src.db import db, adb
 from src.models import Character, Skill, CharacterSkill, Location, Relationship, Event
+from src.models.cache import entity_cache
+from src.mcp.single_flight import single_flight
 from src.mcp.tools import (
     CharacterTools, 
     SkillTools, 
@@ -33,237 +36,427 @@ relationship_tools = RelationshipTools()
 event_tools = EventTools()
 memory_tools = MemoryTools()
 
+async def build_indexes():
+    """
+    全量加载进程内检索索引和关系图，在服务器启动前调用，之后的检索不再访问数据库
+
+    加载用的异步连接池绑定在本次调用的事件循环上，完成后关闭，服务器运行时重新创建。
+    """
+    try:
+        for engine in (memory_tools.search_engines['bm25'], memory_tools.semantic_engine, relationship_tools.graph):
+            await engine.build()
+    finally:
+        await adb.close()
+
 # 角色工具
 @mcp_server.tool()
-def character_create(name: str, played_by: str, age: Optional[int] = None,
+async def character_create(name: str, played_by: str, age: Optional[int] = None,
                  gender: Optional[str] = None, occupation: Optional[str] = None, 
                  appearance: Optional[str] = None, voice_tone: Optional[str] = None,
                  voice_style: Optional[str] = None, mannerisms: Optional[str] = None,
                  current_goal: Optional[str] = None, backstory: Optional[str] = None,
                  notes: Optional[str] = None, character_id: Optional[str] = None) -> Dict[str, Any]:
     """创建新角色"""
-    return character_tools.create_character(
+    return await character_tools.create_character(
         name, played_by, age, gender, occupation, appearance, voice_tone,
         voice_style, mannerisms, current_goal, backstory, notes, character_id
     )
 
 @mcp_server.tool()
-def character_get(character_id: str) -> Dict[str, Any]:
+async def character_create_batch(characters: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """批量创建角色，每项字段同 character_create"""
+    return await character_tools.create_characters_batch(characters)
+
+@mcp_server.tool()
+@single_flight
+async def character_get(character_id: str) -> Dict[str, Any]:
     """获取角色信息"""
-    return character_tools.get_character(character_id)
+    return await character_tools.get_character(character_id)
 
 @mcp_server.tool()
-def character_get_all() -> List[Dict[str, Any]]:
-    """获取所有角色"""
-    return character_tools.get_all_characters()
+@single_flight
+async def character_get_all(limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """分页获取所有角色，返回 {"items", "next_cursor"}，把 next_cursor 作为 cursor 传入获取下一页"""
+    return await character_tools.get_all_characters(limit, cursor)
 
 @mcp_server.tool()
-def character_update(character_id: str, attribute: str, value: Any) -> Dict[str, Any]:
+async def character_update(character_id: str, attribute: str, value: Any) -> Dict[str, Any]:
     """更新角色属性"""
-    return character_tools.update_character(character_id, attribute, value)
+    return await character_tools.update_character(character_id, attribute, value)
+
+@mcp_server.tool()
+async def character_patch(character_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """一次更新角色的多个属性，fields 为属性名到新值的映射，返回更新后的角色"""
+    return await character_tools.patch_character(character_id, fields)
 
 @mcp_server.tool()
-def character_delete(character_id: str) -> Dict[str, Any]:
+async def character_delete(character_id: str) -> Dict[str, Any]:
     """删除角色"""
-    return character_tools.delete_character(character_id)
+    return await character_tools.delete_character(character_id)
 
 # 技能工具
 @mcp_server.tool()
-def skill_create(name: str, description: str, skill_id: Optional[str] = None) -> Dict[str, Any]:
+async def skill_create(name: str, description: str, skill_id: Optional[str] = None) -> Dict[str, Any]:
     """创建新技能"""
-    return skill_tools.create_skill(name, description, skill_id)
+    return await skill_tools.create_skill(name, description, skill_id)
 
 @mcp_server.tool()
-def skill_get(skill_id: str) -> Dict[str, Any]:
+@single_flight
+async def skill_get(skill_id: str) -> Dict[str, Any]:
     """获取技能信息"""
-    return skill_tools.get_skill(skill_id)
+    return await skill_tools.get_skill(skill_id)
 
 @mcp_server.tool()
-def skill_get_all() -> List[Dict[str, Any]]:
-    """获取所有技能"""
-    return skill_tools.get_all_skills()
+@single_flight
+async def skill_get_all(limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """分页获取所有技能，返回 {"items", "next_cursor"}，把 next_cursor 作为 cursor 传入获取下一页"""
+    return await skill_tools.get_all_skills(limit, cursor)
 
 @mcp_server.tool()
-def skill_update(skill_id: str, description: str) -> Dict[str, Any]:
+async def skill_update(skill_id: str, description: str) -> Dict[str, Any]:
     """更新技能描述"""
-    return skill_tools.update_skill(skill_id, description)
+    return await skill_tools.update_skill(skill_id, description)
 
 @mcp_server.tool()
-def skill_delete(skill_id: str) -> Dict[str, Any]:
+async def skill_delete(skill_id: str) -> Dict[str, Any]:
     """删除技能"""
-    return skill_tools.delete_skill(skill_id)
+    return await skill_tools.delete_skill(skill_id)
 
 @mcp_server.tool()
-def character_add_skill(character_id: str, skill_id: str, level: int = 1) -> Dict[str, Any]:
+async def character_add_skill(character_id: str, skill_id: str, level: int = 1) -> Dict[str, Any]:
     """为角色添加技能"""
-    return skill_tools.add_character_skill(character_id, skill_id, level)
+    return await skill_tools.add_character_skill(character_id, skill_id, level)
 
 @mcp_server.tool()
-def character_get_skills(character_id: str) -> List[Dict[str, Any]]:
+@single_flight
+async def character_get_skills(character_id: str) -> List[Dict[str, Any]]:
     """获取角色的所有技能"""
-    return skill_tools.get_character_skills(character_id)
+    return await skill_tools.get_character_skills(character_id)
 
 @mcp_server.tool()
-def character_update_skill(character_id: str, skill_id: str, level: int) -> Dict[str, Any]:
+async def character_update_skill(character_id: str, skill_id: str, level: int) -> Dict[str, Any]:
     """更新角色的技能等级"""
-    return skill_tools.update_character_skill(character_id, skill_id, level)
+    return await skill_tools.update_character_skill(character_id, skill_id, level)
 
 @mcp_server.tool()
-def character_remove_skill(character_id: str, skill_id: str) -> Dict[str, Any]:
+async def character_remove_skill(character_id: str, skill_id: str) -> Dict[str, Any]:
     """移除角色的技能"""
-    return skill_tools.remove_character_skill(character_id, skill_id)
+    return await skill_tools.remove_character_skill(character_id, skill_id)
 
 # 地点工具
 @mcp_server.tool()
-def location_create(name: str, description: str, location_type: str,
+async def location_create(name: str, description: str, location_type: str,
                parent_location_id: Optional[str] = None,
                location_id: Optional[str] = None) -> Dict[str, Any]:
     """创建新地点"""
-    return location_tools.create_location(
+    return await location_tools.create_location(
         name, description, location_type, parent_location_id, location_id
     )
 
 @mcp_server.tool()
-def location_get(location_id: str) -> Dict[str, Any]:
+@single_flight
+async def location_get(location_id: str) -> Dict[str, Any]:
     """获取地点信息"""
-    return location_tools.get_location(location_id)
+    return await location_tools.get_location(location_id)
 
 @mcp_server.tool()
-def location_get_all() -> List[Dict[str, Any]]:
-    """获取所有地点"""
-    return location_tools.get_all_locations()
+@single_flight
+async def location_get_all(limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """分页获取所有地点，返回 {"items", "next_cursor"}，把 next_cursor 作为 cursor 传入获取下一页"""
+    return await location_tools.get_all_locations(limit, cursor)
 
 @mcp_server.tool()
-def location_update(location_id: str, attribute: str, value: Any) -> Dict[str, Any]:
+async def location_update(location_id: str, attribute: str, value: Any) -> Dict[str, Any]:
     """更新地点属性"""
-    return location_tools.update_location(location_id, attribute, value)
+    return await location_tools.update_location(location_id, attribute, value)
+
+@mcp_server.tool()
+async def location_patch(location_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """一次更新地点的多个属性，fields 为属性名到新值的映射，返回更新后的地点"""
+    return await location_tools.patch_location(location_id, fields)
 
 @mcp_server.tool()
-def location_delete(location_id: str) -> Dict[str, Any]:
+async def location_delete(location_id: str) -> Dict[str, Any]:
     """删除地点"""
-    return location_tools.delete_location(location_id)
+    return await location_tools.delete_location(location_id)
 
 @mcp_server.tool()
-def location_get_children(parent_location_id: str) -> List[Dict[str, Any]]:
+@single_flight
+async def location_get_children(parent_location_id: str) -> List[Dict[str, Any]]:
     """获取子地点"""
-    return location_tools.get_child_locations(parent_location_id)
+    return await location_tools.get_child_locations(parent_location_id)
+
+@mcp_server.tool()
+@single_flight
+async def location_get_ancestors(location_id: str) -> List[Dict[str, Any]]:
+    """获取地点的所有上级地点（从父地点直到顶层），depth 为相隔的层数"""
+    return await location_tools.get_ancestors(location_id)
+
+@mcp_server.tool()
+@single_flight
+async def location_get_descendants(location_id: str, max_depth: Optional[int] = None) -> List[Dict[str, Any]]:
+    """获取地点的所有下级地点，max_depth 限制向下的层数"""
+    return await location_tools.get_descendants(location_id, max_depth)
+
+@mcp_server.tool()
+@single_flight
+async def location_get_subtree_events(location_id: str, limit: int = 20,
+                                      order_by: str = 'recency',
+                                      since: Optional[str] = None,
+                                      until: Optional[str] = None,
+                                      max_depth: Optional[int] = None) -> List[Dict[str, Any]]:
+    """获取发生在地点自身及其所有下级地点的事件，order_by 可选 'recency'、'importance' 或 'combined'"""
+    return await location_tools.get_subtree_events(location_id, limit, order_by, since, until, max_depth)
 
 # 关系工具
 @mcp_server.tool()
-def relationship_create(character_id_1: str, character_id_2: str, relationship_type: str,
+async def relationship_create(character_id_1: str, character_id_2: str, relationship_type: str,
                    strength: int, description: str,
                    relationship_id: Optional[str] = None) -> Dict[str, Any]:
     """创建新的角色关系"""
-    return relationship_tools.create_relationship(
+    return await relationship_tools.create_relationship(
         character_id_1, character_id_2, relationship_type,
         strength, description, relationship_id
     )
 
 @mcp_server.tool()
-def relationship_get(relationship_id: str) -> Dict[str, Any]:
+async def relationship_create_batch(relationships: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """批量创建角色关系，每项字段同 relationship_create"""
+    return await relationship_tools.create_relationships_batch(relationships)
+
+@mcp_server.tool()
+@single_flight
+async def relationship_get(relationship_id: str) -> Dict[str, Any]:
     """获取关系信息"""
-    return relationship_tools.get_relationship(relationship_id)
+    return await relationship_tools.get_relationship(relationship_id)
 
 @mcp_server.tool()
-def relationship_get_character_relationships(character_id: str) -> List[Dict[str, Any]]:
+@single_flight
+async def relationship_get_character_relationships(character_id: str) -> List[Dict[str, Any]]:
     """获取角色的所有关系"""
-    return relationship_tools.get_character_relationships(character_id)
+    return await relationship_tools.get_character_relationships(character_id)
 
 @mcp_server.tool()
-def relationship_get_between_characters(character_id_1: str, character_id_2: str) -> Dict[str, Any]:
+@single_flight
+async def relationship_get_between_characters(character_id_1: str, character_id_2: str) -> Dict[str, Any]:
     """获取两个角色之间的关系"""
-    return relationship_tools.get_relationship_between_characters(character_id_1, character_id_2)
+    return await relationship_tools.get_relationship_between_characters(character_id_1, character_id_2)
+
+@mcp_server.tool()
+@single_flight
+async def relationship_k_hop(character_id: str, k: int = 2,
+                             relationship_types: Optional[List[str]] = None,
+                             min_strength: Optional[int] = None,
+                             limit: int = 50) -> List[Dict[str, Any]]:
+    """获取角色 k 跳以内的关系网，可按关系类型和最小强度过滤，附带每个角色的关系路径"""
+    return await relationship_tools.get_k_hop(character_id, k, relationship_types, min_strength, limit)
+
+@mcp_server.tool()
+@single_flight
+async def relationship_path(character_id_1: str, character_id_2: str,
+                            mode: str = 'strongest',
+                            relationship_types: Optional[List[str]] = None,
+                            min_strength: Optional[int] = None) -> Dict[str, Any]:
+    """查找两个角色之间的关系路径，mode 为 'strongest'（强度之积最大）或 'shortest'（跳数最少）"""
+    return await relationship_tools.find_path(character_id_1, character_id_2, mode, relationship_types, min_strength)
+
+@mcp_server.tool()
+@single_flight
+async def relationship_common_connections(character_id_1: str, character_id_2: str,
+                                          relationship_types: Optional[List[str]] = None,
+                                          min_strength: Optional[int] = None) -> List[Dict[str, Any]]:
+    """获取与两个角色都有直接关系的角色"""
+    return await relationship_tools.get_common_connections(
+        character_id_1, character_id_2, relationship_types, min_strength
+    )
 
 @mcp_server.tool()
-def relationship_update(relationship_id: str, attribute: str, value: Any) -> Dict[str, Any]:
+async def relationship_update(relationship_id: str, attribute: str, value: Any) -> Dict[str, Any]:
     """更新关系属性"""
-    return relationship_tools.update_relationship(relationship_id, attribute, value)
+    return await relationship_tools.update_relationship(relationship_id, attribute, value)
+
+@mcp_server.tool()
+async def relationship_patch(relationship_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """一次更新关系的多个属性，fields 为属性名到新值的映射，返回更新后的关系"""
+    return await relationship_tools.patch_relationship(relationship_id, fields)
 
 @mcp_server.tool()
-def relationship_delete(relationship_id: str) -> Dict[str, Any]:
+async def relationship_delete(relationship_id: str) -> Dict[str, Any]:
     """删除关系"""
-    return relationship_tools.delete_relationship(relationship_id)
+    return await relationship_tools.delete_relationship(relationship_id)
+
+# 关系图分析工具
+@mcp_server.tool()
+@single_flight
+async def world_graph_stats(top_n: int = 10) -> Dict[str, Any]:
+    """获取整个关系图的统计：规模、关系类型分布、加权度和 PageRank 影响力排行、社群划分及模块度"""
+    return await relationship_tools.get_world_graph_stats(top_n)
+
+@mcp_server.tool()
+@single_flight
+async def character_influence(character_id: str) -> Dict[str, Any]:
+    """获取角色在关系图中的影响力（度、加权度、PageRank 及排名）和所在社群"""
+    return await relationship_tools.get_character_influence(character_id)
 
 # 事件工具
 @mcp_server.tool()
-def event_create(title: str, description: str, location_id: str,
+async def event_create(title: str, description: str, location_id: str,
             event_type: str, importance: int,
             timestamp: Optional[str] = None,
             event_id: Optional[str] = None) -> Dict[str, Any]:
     """创建新事件"""
-    return event_tools.create_event(
+    return await event_tools.create_event(
         title, description, location_id, event_type,
         importance, timestamp, event_id
     )
 
 @mcp_server.tool()
-def event_get(event_id: str) -> Dict[str, Any]:
+async def event_create_batch(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """批量创建事件，每项字段同 event_create"""
+    return await event_tools.create_events_batch(events)
+
+@mcp_server.tool()
+async def event_add_participants_batch(participants: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """批量为事件添加参与角色，每项包含 event_id、character_id 和可选的 role_in_event"""
+    return await event_tools.add_event_participants_batch(participants)
+
+@mcp_server.tool()
+@single_flight
+async def event_get(event_id: str) -> Dict[str, Any]:
     """获取事件信息"""
-    return event_tools.get_event(event_id)
+    return await event_tools.get_event(event_id)
 
 @mcp_server.tool()
-def event_get_all(limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
-    """获取所有事件"""
-    return event_tools.get_all_events(limit, offset)
+@single_flight
+async def event_get_all(limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """分页获取所有事件（按时间倒序），返回 {"items", "next_cursor"}，把 next_cursor 作为 cursor 传入获取下一页"""
+    return await event_tools.get_all_events(limit, cursor)
 
 @mcp_server.tool()
-def event_get_by_location(location_id: str) -> List[Dict[str, Any]]:
-    """获取指定地点的所有事件"""
-    return event_tools.get_events_by_location(location_id)
+@single_flight
+async def event_get_by_location(location_id: str, order_by: str = 'recency',
+                                limit: Optional[int] = None,
+                                cursor: Optional[str] = None) -> Dict[str, Any]:
+    """分页获取指定地点的事件，order_by 可选 'recency' 或 'importance'，返回 {"items", "next_cursor"}"""
+    return await event_tools.get_events_by_location(location_id, order_by, limit, cursor)
 
 @mcp_server.tool()
-def event_search(search_term: str) -> List[Dict[str, Any]]:
-    """搜索事件"""
-    return event_tools.search_events(search_term)
+@single_flight
+async def event_search(search_term: str, limit: Optional[int] = None,
+                       cursor: Optional[str] = None) -> Dict[str, Any]:
+    """分页搜索事件（按相关度降序），返回 {"items", "next_cursor"}"""
+    return await event_tools.search_events(search_term, limit, cursor)
 
 @mcp_server.tool()
-def event_update(event_id: str, attribute: str, value: Any) -> Dict[str, Any]:
+async def event_update(event_id: str, attribute: str, value: Any) -> Dict[str, Any]:
     """更新事件属性"""
-    return event_tools.update_event(event_id, attribute, value)
+    return await event_tools.update_event(event_id, attribute, value)
+
+@mcp_server.tool()
+async def event_patch(event_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """一次更新事件的多个属性，fields 为属性名到新值的映射，返回更新后的事件"""
+    return await event_tools.patch_event(event_id, fields)
 
 @mcp_server.tool()
-def event_delete(event_id: str) -> Dict[str, Any]:
+async def event_delete(event_id: str) -> Dict[str, Any]:
     """删除事件"""
-    return event_tools.delete_event(event_id)
+    return await event_tools.delete_event(event_id)
 
 # 记忆查询工具
 @mcp_server.tool()
-def memory_get_character_context(character_id: str, 
+@single_flight
+async def memory_get_character_context(character_id: str, 
                             include_relationships: bool = True, 
                             include_events: bool = True,
                             include_skills: bool = True,
-                            event_limit: int = 10) -> Dict[str, Any]:
-    """获取角色的完整上下文信息"""
-    return memory_tools.get_character_context(
+                            event_limit: int = 10,
+                            event_order: str = 'recency',
+                            event_since: Optional[str] = None,
+                            event_until: Optional[str] = None,
+                            max_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """
+    获取角色的完整上下文信息，event_order 可选 'recency'、'importance' 或 'combined'。
+    提供 max_tokens 时按预算裁剪：角色核心字段 > 关系 > 事件 > 技能 > 长文本字段
+    """
+    return await memory_tools.get_character_context(
         character_id, include_relationships, include_events,
-        include_skills, event_limit
+        include_skills, event_limit, event_order, event_since, event_until, max_tokens
     )
 
 @mcp_server.tool()
-def memory_get_location_context(location_id: str, 
+@single_flight
+async def memory_get_location_context(location_id: str, 
                            include_events: bool = True, 
-                           event_limit: int = 10) -> Dict[str, Any]:
-    """获取地点的完整上下文信息"""
-    return memory_tools.get_location_context(
-        location_id, include_events, event_limit
+                           event_limit: int = 10,
+                           event_order: str = 'recency',
+                           max_tokens: Optional[int] = None,
+                           include_subtree_events: bool = False) -> Dict[str, Any]:
+    """
+    获取地点的完整上下文信息，event_order 可选 'recency'、'importance' 或 'combined'。
+    include_subtree_events 为 True 时事件取自该地点及其所有下级地点（如整座城市的各个街区和建筑）。
+    提供 max_tokens 时按预算裁剪：地点核心字段 > 事件 > 子地点 > 长文本字段
+    """
+    return await memory_tools.get_location_context(
+        location_id, include_events, event_limit, event_order, max_tokens, include_subtree_events
     )
 
 @mcp_server.tool()
-def memory_get_relationship_context(character_id_1: str, character_id_2: str) -> Dict[str, Any]:
+@single_flight
+async def memory_get_relationship_context(character_id_1: str, character_id_2: str) -> Dict[str, Any]:
     """获取两个角色之间的关系上下文"""
-    return memory_tools.get_relationship_context(character_id_1, character_id_2)
+    return await memory_tools.get_relationship_context(character_id_1, character_id_2)
 
 @mcp_server.tool()
-def memory_search(query: str, 
+@single_flight
+async def memory_search(query: str, 
              search_characters: bool = True, 
              search_locations: bool = True, 
              search_events: bool = True,
-             limit: int = 5) -> Dict[str, List[Dict[str, Any]]]:
-    """搜索记忆知识库"""
-    return memory_tools.search_memory(
-        query, search_characters, search_locations, search_events, limit
+             limit: int = 5,
+             engine: str = 'fulltext',
+             character_id: Optional[str] = None,
+             weights: Optional[Dict[str, float]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    搜索记忆知识库，engine 可选 'fulltext' (MySQL全文索引) 或 'bm25' (进程内倒排索引)。
+    事件按文本相关度、时间衰减、重要性和与 character_id 的关系远近综合排序，
+    weights 可调整各项权重 (text/recency/importance/proximity)
+    """
+    return await memory_tools.search_memory(
+        query, search_characters, search_locations, search_events, limit, engine,
+        character_id, weights
+    )
+
+@mcp_server.tool()
+@single_flight
+async def memory_semantic_search(query: str,
+             search_characters: bool = True,
+             search_events: bool = True,
+             limit: int = 5,
+             character_id: Optional[str] = None,
+             weights: Optional[Dict[str, float]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """按语义相似度搜索角色背景故事和事件，事件排序方式同 memory_search"""
+    return await memory_tools.semantic_search(
+        query, search_characters, search_events, limit, character_id, weights
     )
 
+# 系统工具
+@mcp_server.tool()
+async def system_pool_stats() -> Dict[str, Any]:
+    """获取数据库连接池的实时统计（使用中、空闲、等待者与等待时间直方图）及读请求合并统计"""
+    return {
+        "sync": db.pool_stats(),
+        "async": adb.pool_stats(),
+        "single_flight": single_flight.get_stats()
+    }
+
+@mcp_server.tool()
+async def system_cache_stats() -> Dict[str, Any]:
+    """获取实体缓存和上下文快照的统计（条目数、命中率、淘汰、过期与失效次数）"""
+    return {
+        "entities": entity_cache.get_stats(),
+        "context_snapshots": memory_tools.context_engine.snapshots.get_stats()
+    }
+
 # 记录服务器已准备就绪
 logger.info("MCP服务器初始化完成")
 
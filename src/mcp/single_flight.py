@@ -0,0 +1,85 @@
+"""
+读工具的请求合并：参数相同的并发调用共享同一次执行
+"""
+import asyncio
+import functools
+import inspect
+import json
+
+from src.models import hooks
+
+
+class SingleFlight:
+    """
+    单飞（single-flight）合并器
+
+    用作异步读工具的装饰器。按 (工具名, 规范化后的参数) 记录正在执行的调用，
+    同一时刻参数相同的后续调用不再访问数据库，而是等待第一次调用的结果
+    （包括异常）。调用结束后记录即被移除，因此不会缓存任何结果。
+
+    任何数据写入都会清空正在执行的记录：写入之后到达的调用总是重新执行，
+    不会拿到写入之前开始的查询结果。已经在等待的调用不受影响。
+
+    执行放在独立的任务中，某个调用方被取消不会取消其他调用方共享的执行。
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.executions = 0
+        self.coalesced = 0
+        hooks.subscribe(self.on_change)
+
+    @staticmethod
+    def _key(name, signature, args, kwargs):
+        """把调用参数规范化为可哈希的键，位置参数、关键字参数和默认值等价"""
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return name, json.dumps(bound.arguments, sort_keys=True, ensure_ascii=False, default=repr)
+
+    def __call__(self, func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = self._key(func.__qualname__, signature, args, kwargs)
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(func(*args, **kwargs))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._forget(key, task))
+                self.executions += 1
+            else:
+                self.coalesced += 1
+            return await asyncio.shield(task)
+
+        return wrapper
+
+    def _forget(self, key, task):
+        # 写入后记录可能已被清空并由新的调用替换，只移除自己
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有调用方都已取消时异常无人读取，在此取出以免告警
+        if not task.cancelled():
+            task.exception()
+
+    def on_change(self, entity, key, deleted, fields=None):
+        """数据变更回调"""
+        self._inflight.clear()
+
+    def get_stats(self):
+        """
+        获取合并统计
+
+        Returns:
+            dict: 正在执行的调用数、实际执行次数和被合并的调用次数
+        """
+        calls = self.executions + self.coalesced
+        return {
+            'inflight': len(self._inflight),
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'coalesce_rate': round(self.coalesced / calls, 4) if calls else 0.0,
+        }
+
+
+single_flight = SingleFlight()
@@ -1,15 +1,17 @@
 """
 角色工具类，提供角色相关的MCP工具函数
 """
-import uuid
 from typing import Dict, Any, List, Optional
 
+from src.db import adb
+from src.db.ids import new_id
+from src.mcp.pagination import decode_cursor, make_page, page_size
 from src.models import Character
 
 class CharacterTools:
     """角色工具类"""
     
-    def create_character(self, 
+    async def create_character(self, 
                      name: str, 
                      played_by: str, 
                      age: Optional[int] = None,
@@ -44,9 +46,9 @@ class CharacterTools:
         Returns:
             dict: 包含角色数据和ID的字典
         """
-        # 如果没有提供ID，生成一个新的UUID
+        # 如果没有提供ID，生成一个新的 UUIDv7
         if not character_id:
-            character_id = str(uuid.uuid4())
+            character_id = new_id()
         
         character_data = {
             'character_id': character_id,
@@ -65,11 +67,38 @@ class CharacterTools:
         }
         
         # 创建角色并获取ID
-        created_id = Character.create(character_data)
+        created_id = await Character.acreate(character_data)
         
         return {"character_id": created_id, "data": character_data}
     
-    def get_character(self, character_id: str) -> Dict[str, Any]:
+    async def create_characters_batch(self, characters: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量创建角色，所有数据校验通过后才写入数据库
+        
+        Args:
+            characters: 角色数据列表，每项字段同 create_character
+            
+        Returns:
+            dict: 创建数量和角色ID列表
+        """
+        characters_data = []
+        for index, item in enumerate(characters, start=1):
+            if not item.get('name') or not item.get('played_by'):
+                raise ValueError(f"第 {index} 个角色缺少 name 或 played_by")
+            invalid = set(item) - set(Character.valid_attributes) - {'character_id'}
+            if invalid:
+                raise ValueError(f"第 {index} 个角色包含无效属性: {', '.join(sorted(invalid))}")
+            
+            character_data = dict(item)
+            # 如果没有提供ID，生成一个新的 UUIDv7
+            character_data['character_id'] = item.get('character_id') or new_id()
+            characters_data.append(character_data)
+        
+        created_ids = await Character.acreate_many(characters_data)
+        
+        return {"created": len(created_ids), "character_ids": created_ids}
+    
+    async def get_character(self, character_id: str) -> Dict[str, Any]:
         """
         获取角色信息
         
@@ -79,22 +108,30 @@ class CharacterTools:
         Returns:
             dict: 角色数据
         """
-        character = Character.get_by_id(character_id)
+        character = await Character.aget_by_id(character_id)
         if not character:
             raise ValueError(f"未找到ID为 {character_id} 的角色")
         
         return character
     
-    def get_all_characters(self) -> List[Dict[str, Any]]:
+    async def get_all_characters(self, limit: Optional[int] = None,
+                         cursor: Optional[str] = None) -> Dict[str, Any]:
         """
-        获取所有角色
+        分页获取所有角色，按ID排序
         
+        Args:
+            limit: 每页数量，不提供时取默认值，超过上限时按上限返回
+            cursor: 上一页返回的 next_cursor，不提供时返回第一页
+            
         Returns:
-            list: 角色列表
+            dict: {"items": 角色列表, "next_cursor": 下一页的游标，已是最后一页时为 None}
         """
-        return Character.get_all()
+        size = page_size(limit)
+        scope = ('character_get_all',)
+        rows = await Character.aget_page(size + 1, decode_cursor(scope, cursor))
+        return make_page(rows, size, scope, Character.page_order)
     
-    def update_character(self, character_id: str, attribute: str, value: Any) -> Dict[str, Any]:
+    async def update_character(self, character_id: str, attribute: str, value: Any) -> Dict[str, Any]:
         """
         更新角色属性
         
@@ -106,21 +143,38 @@ class CharacterTools:
         Returns:
             dict: 更新后的角色数据
         """
-        # 检查角色是否存在
-        character = Character.get_by_id(character_id)
-        if not character:
-            raise ValueError(f"未找到ID为 {character_id} 的角色")
-        
-        # 更新角色属性
-        rows_affected = Character.update(character_id, attribute, value)
-        if rows_affected == 0:
-            raise ValueError(f"更新角色属性失败")
+        # 在同一事务中锁定、更新并读回，只占用一个连接、提交一次
+        async with adb.transaction() as session:
+            character = await Character.aget_by_id(character_id, session=session, for_update=True)
+            if not character:
+                raise ValueError(f"未找到ID为 {character_id} 的角色")
+            
+            await Character.aupdate(character_id, attribute, value, session=session)
+            
+            # 返回更新后的角色数据
+            updated_character = await Character.aget_by_id(character_id, session=session)
+        return updated_character
+    
+    async def patch_character(self, character_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        一次更新角色的多个属性
         
-        # 返回更新后的角色数据
-        updated_character = Character.get_by_id(character_id)
+        Args:
+            character_id: 角色ID
+            fields: 属性名到新值的映射，如 {"current_goal": ..., "notes": ...}
+            
+        Returns:
+            dict: 更新后的角色数据
+        """
+        # 一条 UPDATE 加一次读回，共用一个连接并只提交一次
+        async with adb.transaction() as session:
+            await Character.apatch(character_id, fields, session=session)
+            updated_character = await Character.aget_by_id(character_id, session=session)
+            if not updated_character:
+                raise ValueError(f"未找到ID为 {character_id} 的角色")
         return updated_character
     
-    def delete_character(self, character_id: str) -> Dict[str, Any]:
+    async def delete_character(self, character_id: str) -> Dict[str, Any]:
         """
         删除角色
         
@@ -131,12 +185,12 @@ class CharacterTools:
             dict: 操作结果
         """
         # 检查角色是否存在
-        character = Character.get_by_id(character_id)
+        character = await Character.aget_by_id(character_id)
         if not character:
             raise ValueError(f"未找到ID为 {character_id} 的角色")
         
         # 删除角色
-        rows_affected = Character.delete(character_id)
+        rows_affected = await Character.adelete(character_id)
         if rows_affected == 0:
             raise ValueError(f"删除角色失败")
         
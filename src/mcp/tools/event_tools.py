@@ -1,16 +1,18 @@
 """
 事件工具类，提供事件相关的MCP工具函数
 """
-import uuid
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 
-from src.models import Event
+from src.db import adb
+from src.db.ids import new_id
+from src.mcp.pagination import decode_cursor, make_page, page_size
+from src.models import Event, EventCharacter
 
 class EventTools:
     """事件工具类"""
     
-    def create_event(self, 
+    async def create_event(self, 
                  title: str, 
                  description: str, 
                  location_id: str,
@@ -37,9 +39,9 @@ class EventTools:
         if not 1 <= importance <= 100:
             raise ValueError("事件重要性必须在1到100之间")
             
-        # 如果没有提供ID，生成一个新的UUID
+        # 如果没有提供ID，生成一个新的 UUIDv7
         if not event_id:
-            event_id = str(uuid.uuid4())
+            event_id = new_id()
         
         event_data = {
             'event_id': event_id,
@@ -52,11 +54,59 @@ class EventTools:
         }
         
         # 创建事件并获取ID
-        created_id = Event.create(event_data)
+        created_id = await Event.acreate(event_data)
         
         return {"event_id": created_id, "data": event_data}
     
-    def get_event(self, event_id: str) -> Dict[str, Any]:
+    async def create_events_batch(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量创建事件，所有数据校验通过后才写入数据库
+        
+        Args:
+            events: 事件数据列表，每项字段同 create_event
+            
+        Returns:
+            dict: 创建数量和事件ID列表
+        """
+        events_data = []
+        for index, item in enumerate(events, start=1):
+            if not item.get('title'):
+                raise ValueError(f"第 {index} 个事件缺少 title")
+            invalid = set(item) - set(Event.valid_attributes) - {'event_id'}
+            if invalid:
+                raise ValueError(f"第 {index} 个事件包含无效属性: {', '.join(sorted(invalid))}")
+            importance = item.get('importance')
+            if not isinstance(importance, int) or not 1 <= importance <= 100:
+                raise ValueError(f"第 {index} 个事件的重要性必须是1到100之间的整数")
+            
+            event_data = dict(item)
+            # 如果没有提供ID，生成一个新的 UUIDv7
+            event_data['event_id'] = item.get('event_id') or new_id()
+            events_data.append(event_data)
+        
+        created_ids = await Event.acreate_many(events_data)
+        
+        return {"created": len(created_ids), "event_ids": created_ids}
+    
+    async def add_event_participants_batch(self, participants: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量为事件添加参与角色
+        
+        Args:
+            participants: 参与记录列表，每项包含 event_id、character_id 和可选的 role_in_event
+            
+        Returns:
+            dict: 添加的记录数量
+        """
+        for index, item in enumerate(participants, start=1):
+            if not item.get('event_id') or not item.get('character_id'):
+                raise ValueError(f"第 {index} 条参与记录缺少 event_id 或 character_id")
+        
+        added = await EventCharacter.aadd_characters_to_events(participants)
+        
+        return {"added": added}
+    
+    async def get_event(self, event_id: str) -> Dict[str, Any]:
         """
         获取事件信息
         
@@ -66,50 +116,74 @@ class EventTools:
         Returns:
             dict: 事件数据
         """
-        event = Event.get_by_id(event_id)
+        event = await Event.aget_by_id(event_id)
         if not event:
             raise ValueError(f"未找到ID为 {event_id} 的事件")
         
         return event
     
-    def get_all_events(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+    async def get_all_events(self, limit: Optional[int] = None,
+                             cursor: Optional[str] = None) -> Dict[str, Any]:
         """
-        获取所有事件，按时间戳降序排序
+        分页获取所有事件，按时间戳降序排序
         
         Args:
-            limit: 返回记录的最大数量
-            offset: 分页偏移量
+            limit: 每页数量，不提供时取默认值，超过上限时按上限返回
+            cursor: 上一页返回的 next_cursor，不提供时返回第一页
             
         Returns:
-            list: 事件列表
+            dict: {"items": 事件列表, "next_cursor": 下一页的游标，已是最后一页时为 None}
         """
-        return Event.get_all(limit, offset)
+        size = page_size(limit)
+        scope = ('event_get_all',)
+        rows = await Event.aget_page(size + 1, decode_cursor(scope, cursor))
+        return make_page(rows, size, scope, Event.page_orderings['recency'])
     
-    def get_events_by_location(self, location_id: str) -> List[Dict[str, Any]]:
+    async def get_events_by_location(self, location_id: str,
+                                     order_by: str = 'recency',
+                                     limit: Optional[int] = None,
+                                     cursor: Optional[str] = None) -> Dict[str, Any]:
         """
-        获取指定地点的所有事件
+        分页获取指定地点的事件
         
         Args:
             location_id: 地点ID
+            order_by: 排序方式 ('recency' 或 'importance')
+            limit: 每页数量，不提供时取默认值，超过上限时按上限返回
+            cursor: 上一页返回的 next_cursor，不提供时返回第一页
             
         Returns:
-            list: 事件列表
+            dict: {"items": 事件列表, "next_cursor": 下一页的游标，已是最后一页时为 None}
         """
-        return Event.get_events_by_location(location_id)
+        if order_by not in Event.page_orderings:
+            raise ValueError(f"无效的事件排序方式: {order_by}，可选值: {', '.join(Event.page_orderings)}")
+        size = page_size(limit)
+        scope = ('event_get_by_location', location_id, order_by)
+        rows = await Event.aget_events_by_location(
+            location_id, limit=size + 1, order_by=order_by, after=decode_cursor(scope, cursor)
+        )
+        return make_page(rows, size, scope, Event.page_orderings[order_by])
     
-    def search_events(self, search_term: str) -> List[Dict[str, Any]]:
+    async def search_events(self, search_term: str,
+                            limit: Optional[int] = None,
+                            cursor: Optional[str] = None) -> Dict[str, Any]:
         """
-        搜索事件
+        分页搜索事件，按相关度降序
         
         Args:
             search_term: 搜索关键词
+            limit: 每页数量，不提供时取默认值，超过上限时按上限返回
+            cursor: 上一页返回的 next_cursor，不提供时返回第一页
             
         Returns:
-            list: 匹配的事件列表
+            dict: {"items": 匹配的事件列表, "next_cursor": 下一页的游标，已是最后一页时为 None}
         """
-        return Event.search_events(search_term)
+        size = page_size(limit)
+        scope = ('event_search', search_term)
+        rows = await Event.asearch_events(search_term, limit=size + 1, after=decode_cursor(scope, cursor))
+        return make_page(rows, size, scope, Event.search_page_order)
     
-    def update_event(self, event_id: str, attribute: str, value: Any) -> Dict[str, Any]:
+    async def update_event(self, event_id: str, attribute: str, value: Any) -> Dict[str, Any]:
         """
         更新事件属性
         
@@ -121,25 +195,47 @@ class EventTools:
         Returns:
             dict: 更新后的事件数据
         """
-        # 检查事件是否存在
-        event = Event.get_by_id(event_id)
-        if not event:
-            raise ValueError(f"未找到ID为 {event_id} 的事件")
-        
         # 如果是更新重要性，检查范围
         if attribute == 'importance' and (not isinstance(value, int) or not 1 <= value <= 100):
             raise ValueError("事件重要性必须是1到100之间的整数")
+        
+        # 在同一事务中锁定、更新并读回，只占用一个连接、提交一次
+        async with adb.transaction() as session:
+            event = await Event.aget_by_id(event_id, session=session, for_update=True)
+            if not event:
+                raise ValueError(f"未找到ID为 {event_id} 的事件")
             
-        # 更新事件属性
-        rows_affected = Event.update(event_id, attribute, value)
-        if rows_affected == 0:
-            raise ValueError(f"更新事件属性失败")
+            await Event.aupdate(event_id, attribute, value, session=session)
+            
+            # 返回更新后的事件数据
+            updated_event = await Event.aget_by_id(event_id, session=session)
+        return updated_event
+    
+    async def patch_event(self, event_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        一次更新事件的多个属性
+        
+        Args:
+            event_id: 事件ID
+            fields: 属性名到新值的映射，如 {"title": ..., "importance": ...}
+            
+        Returns:
+            dict: 更新后的事件数据
+        """
+        # 如果包含重要性，检查范围
+        importance = fields.get('importance')
+        if 'importance' in fields and (not isinstance(importance, int) or not 1 <= importance <= 100):
+            raise ValueError("事件重要性必须是1到100之间的整数")
         
-        # 返回更新后的事件数据
-        updated_event = Event.get_by_id(event_id)
+        # 一条 UPDATE 加一次读回，共用一个连接并只提交一次
+        async with adb.transaction() as session:
+            await Event.apatch(event_id, fields, session=session)
+            updated_event = await Event.aget_by_id(event_id, session=session)
+            if not updated_event:
+                raise ValueError(f"未找到ID为 {event_id} 的事件")
         return updated_event
     
-    def delete_event(self, event_id: str) -> Dict[str, Any]:
+    async def delete_event(self, event_id: str) -> Dict[str, Any]:
         """
         删除事件
         
@@ -150,12 +246,12 @@ class EventTools:
             dict: 操作结果
         """
         # 检查事件是否存在
-        event = Event.get_by_id(event_id)
+        event = await Event.aget_by_id(event_id)
         if not event:
             raise ValueError(f"未找到ID为 {event_id} 的事件")
         
         # 删除事件
-        rows_affected = Event.delete(event_id)
+        rows_affected = await Event.adelete(event_id)
         if rows_affected == 0:
             raise ValueError(f"删除事件失败")
         
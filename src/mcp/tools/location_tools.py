@@ -1,15 +1,30 @@
 """
 地点工具类，提供地点相关的MCP工具函数
 """
-import uuid
 from typing import Dict, Any, List, Optional
 
+from src.db import adb
+from src.db.ids import new_id, parse_id
+from src.mcp.pagination import decode_cursor, make_page, page_size
 from src.models import Location
 
 class LocationTools:
     """地点工具类"""
     
-    def create_location(self, 
+    @staticmethod
+    async def _check_parent(location_id: str, parent_location_id: Optional[str], session=None):
+        """检查把 parent_location_id 设为地点的父地点后层级不会成环"""
+        if not parent_location_id:
+            return
+        # 按解析后的 UUID 比较，大写或旧写法的ID与查询结果中的写法视为同一个地点
+        target = parse_id(location_id)
+        if parse_id(parent_location_id) == target:
+            raise ValueError("地点不能以自身为父地点")
+        ancestors = await Location.aget_ancestors(parent_location_id, session=session)
+        if any(parse_id(ancestor['location_id']) == target for ancestor in ancestors):
+            raise ValueError(f"地点 {parent_location_id} 是 {location_id} 的下级地点，不能作为其父地点")
+    
+    async def create_location(self, 
                     name: str, 
                     description: str, 
                     location_type: str,
@@ -28,9 +43,11 @@ class LocationTools:
         Returns:
             dict: 包含地点数据和ID的字典
         """
-        # 如果没有提供ID，生成一个新的UUID
+        # 如果没有提供ID，生成一个新的 UUIDv7
         if not location_id:
-            location_id = str(uuid.uuid4())
+            location_id = new_id()
+        elif parent_location_id and parse_id(parent_location_id) == parse_id(location_id):
+            raise ValueError("地点不能以自身为父地点")
         
         location_data = {
             'location_id': location_id,
@@ -41,11 +58,11 @@ class LocationTools:
         }
         
         # 创建地点并获取ID
-        created_id = Location.create(location_data)
+        created_id = await Location.acreate(location_data)
         
         return {"location_id": created_id, "data": location_data}
     
-    def get_location(self, location_id: str) -> Dict[str, Any]:
+    async def get_location(self, location_id: str) -> Dict[str, Any]:
         """
         获取地点信息
         
@@ -55,22 +72,30 @@ class LocationTools:
         Returns:
             dict: 地点数据
         """
-        location = Location.get_by_id(location_id)
+        location = await Location.aget_by_id(location_id)
         if not location:
             raise ValueError(f"未找到ID为 {location_id} 的地点")
         
         return location
     
-    def get_all_locations(self) -> List[Dict[str, Any]]:
+    async def get_all_locations(self, limit: Optional[int] = None,
+                         cursor: Optional[str] = None) -> Dict[str, Any]:
         """
-        获取所有地点
+        分页获取所有地点，按ID排序
         
+        Args:
+            limit: 每页数量，不提供时取默认值，超过上限时按上限返回
+            cursor: 上一页返回的 next_cursor，不提供时返回第一页
+            
         Returns:
-            list: 地点列表
+            dict: {"items": 地点列表, "next_cursor": 下一页的游标，已是最后一页时为 None}
         """
-        return Location.get_all()
+        size = page_size(limit)
+        scope = ('location_get_all',)
+        rows = await Location.aget_page(size + 1, decode_cursor(scope, cursor))
+        return make_page(rows, size, scope, Location.page_order)
     
-    def get_child_locations(self, parent_location_id: str) -> List[Dict[str, Any]]:
+    async def get_child_locations(self, parent_location_id: str) -> List[Dict[str, Any]]:
         """
         获取子地点
         
@@ -80,9 +105,71 @@ class LocationTools:
         Returns:
             list: 子地点列表
         """
-        return Location.get_child_locations(parent_location_id)
+        return await Location.aget_child_locations(parent_location_id)
+    
+    async def _require_location(self, location_id: str):
+        if not await Location.aget_by_id(location_id):
+            raise ValueError(f"未找到ID为 {location_id} 的地点")
+    
+    @staticmethod
+    def _check_max_depth(max_depth: Optional[int]):
+        if max_depth is not None and max_depth < 1:
+            raise ValueError("max_depth 必须大于0")
+    
+    async def get_ancestors(self, location_id: str) -> List[Dict[str, Any]]:
+        """
+        获取地点的所有上级地点，一条递归查询完成，与层数无关
+        
+        Args:
+            location_id: 地点ID
+            
+        Returns:
+            list: 从父地点到顶层地点的列表，depth 为相隔的层数
+        """
+        await self._require_location(location_id)
+        return await Location.aget_ancestors(location_id)
+    
+    async def get_descendants(self, location_id: str, max_depth: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        获取地点的所有下级地点，一条递归查询完成，与层数无关
+        
+        Args:
+            location_id: 地点ID
+            max_depth: 最多向下的层数，不提供时不限
+            
+        Returns:
+            list: 下级地点列表，depth 为相隔的层数
+        """
+        self._check_max_depth(max_depth)
+        await self._require_location(location_id)
+        return await Location.aget_descendants(location_id, max_depth)
+    
+    async def get_subtree_events(self, location_id: str, limit: int = 20,
+                                 order_by: str = 'recency',
+                                 since: Optional[str] = None,
+                                 until: Optional[str] = None,
+                                 max_depth: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        获取发生在地点自身及其所有下级地点的事件
+        
+        Args:
+            location_id: 地点ID
+            limit: 最多返回的事件数量
+            order_by: 排序方式 ('recency', 'importance' 或 'combined')
+            since: 只返回该时间及之后的事件
+            until: 只返回该时间及之前的事件
+            max_depth: 最多向下的层数，不提供时不限
+            
+        Returns:
+            list: 事件列表，location_depth 为事件地点相对该地点的层数
+        """
+        if limit <= 0:
+            raise ValueError("limit 必须大于0")
+        self._check_max_depth(max_depth)
+        await self._require_location(location_id)
+        return await Location.aget_subtree_events(location_id, limit, order_by, since, until, max_depth)
     
-    def update_location(self, location_id: str, attribute: str, value: Any) -> Dict[str, Any]:
+    async def update_location(self, location_id: str, attribute: str, value: Any) -> Dict[str, Any]:
         """
         更新地点属性
         
@@ -94,21 +181,42 @@ class LocationTools:
         Returns:
             dict: 更新后的地点数据
         """
-        # 检查地点是否存在
-        location = Location.get_by_id(location_id)
-        if not location:
-            raise ValueError(f"未找到ID为 {location_id} 的地点")
-        
-        # 更新地点属性
-        rows_affected = Location.update(location_id, attribute, value)
-        if rows_affected == 0:
-            raise ValueError(f"更新地点属性失败")
+        # 在同一事务中锁定、更新并读回，只占用一个连接、提交一次
+        async with adb.transaction() as session:
+            location = await Location.aget_by_id(location_id, session=session, for_update=True)
+            if not location:
+                raise ValueError(f"未找到ID为 {location_id} 的地点")
+            if attribute == 'parent_location_id':
+                await self._check_parent(location_id, value, session=session)
+            
+            await Location.aupdate(location_id, attribute, value, session=session)
+            
+            # 返回更新后的地点数据
+            updated_location = await Location.aget_by_id(location_id, session=session)
+        return updated_location
+    
+    async def patch_location(self, location_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        一次更新地点的多个属性
         
-        # 返回更新后的地点数据
-        updated_location = Location.get_by_id(location_id)
+        Args:
+            location_id: 地点ID
+            fields: 属性名到新值的映射，如 {"description": ..., "location_type": ...}
+            
+        Returns:
+            dict: 更新后的地点数据
+        """
+        # 一条 UPDATE 加一次读回，共用一个连接并只提交一次
+        async with adb.transaction() as session:
+            if 'parent_location_id' in fields:
+                await self._check_parent(location_id, fields['parent_location_id'], session=session)
+            await Location.apatch(location_id, fields, session=session)
+            updated_location = await Location.aget_by_id(location_id, session=session)
+            if not updated_location:
+                raise ValueError(f"未找到ID为 {location_id} 的地点")
         return updated_location
     
-    def delete_location(self, location_id: str) -> Dict[str, Any]:
+    async def delete_location(self, location_id: str) -> Dict[str, Any]:
         """
         删除地点
         
@@ -119,12 +227,12 @@ class LocationTools:
             dict: 操作结果
         """
         # 检查地点是否存在
-        location = Location.get_by_id(location_id)
+        location = await Location.aget_by_id(location_id)
         if not location:
             raise ValueError(f"未找到ID为 {location_id} 的地点")
         
         # 删除地点
-        rows_affected = Location.delete(location_id)
+        rows_affected = await Location.adelete(location_id)
         if rows_affected == 0:
             raise ValueError(f"删除地点失败")
         
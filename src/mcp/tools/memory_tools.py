@@ -4,16 +4,31 @@
 from typing import Dict, Any, List, Optional
 import json
 
-from src.models import Character, Location, Relationship, Event, EventCharacter
+from src.memory import ContextEngine, FullTextSearchEngine, BM25SearchEngine, SemanticSearchEngine, HybridRanker
 
 class MemoryTools:
     """记忆工具类，负责提供角色记忆与上下文检索服务"""
     
-    def get_character_context(self, character_id: str, 
+    # 事件检索时先取 limit 的多少倍作为候选，再由混合排序截取
+    rerank_candidate_factor = 4
+    
+    def __init__(self):
+        self.context_engine = ContextEngine()
+        self.search_engines = {
+            engine.name: engine for engine in (FullTextSearchEngine(), BM25SearchEngine())
+        }
+        self.semantic_engine = SemanticSearchEngine()
+        self.ranker = HybridRanker()
+    
+    async def get_character_context(self, character_id: str, 
                           include_relationships: bool = True, 
                           include_events: bool = True,
                           include_skills: bool = True,
-                          event_limit: int = 10) -> Dict[str, Any]:
+                          event_limit: int = 10,
+                          event_order: str = 'recency',
+                          event_since: Optional[str] = None,
+                          event_until: Optional[str] = None,
+                          max_tokens: Optional[int] = None) -> Dict[str, Any]:
         """
         获取角色的完整上下文信息
         
@@ -23,41 +38,26 @@ class MemoryTools:
             include_events: 是否包含角色参与的事件
             include_skills: 是否包含角色的技能
             event_limit: 最多包含多少个事件
+            event_order: 事件排序方式 ('recency' 按时间, 'importance' 按重要性, 'combined' 按重要性×时间衰减)
+            event_since: 只包含该时间及之后的事件 (可选)
+            event_until: 只包含该时间及之前的事件 (可选)
+            max_tokens: 上下文的 token 预算 (可选)，超出时按优先级裁剪，长文本字段最后放入
             
         Returns:
-            dict: 角色的上下文信息
+            dict: 角色的上下文信息，提供 max_tokens 时附带 packing 裁剪统计
         """
-        # 获取角色基本信息
-        character = Character.get_by_id(character_id)
-        if not character:
-            raise ValueError(f"未找到ID为 {character_id} 的角色")
-        
-        result = {
-            "character": character
-        }
-        
-        # 如果需要，添加角色关系信息
-        if include_relationships:
-            relationships = Relationship.get_character_relationships(character_id)
-            result["relationships"] = relationships
-        
-        # 如果需要，添加角色技能信息
-        if include_skills:
-            from src.models import CharacterSkill
-            skills = CharacterSkill.get_character_skills(character_id)
-            result["skills"] = skills
-        
-        # 如果需要，添加角色参与的事件
-        if include_events:
-            events = EventCharacter.get_events_involving_character(character_id)
-            # 限制事件数量
-            result["events"] = events[:event_limit]
-        
-        return result
+        # 各子查询并发执行，排序和数量限制在SQL中完成
+        return await self.context_engine.character_context(
+            character_id, include_relationships, include_events, include_skills,
+            event_limit, event_order, event_since, event_until, max_tokens
+        )
     
-    def get_location_context(self, location_id: str, 
+    async def get_location_context(self, location_id: str, 
                          include_events: bool = True, 
-                         event_limit: int = 10) -> Dict[str, Any]:
+                         event_limit: int = 10,
+                         event_order: str = 'recency',
+                         max_tokens: Optional[int] = None,
+                         include_subtree_events: bool = False) -> Dict[str, Any]:
         """
         获取地点的完整上下文信息
         
@@ -65,33 +65,18 @@ class MemoryTools:
             location_id: 地点ID
             include_events: 是否包含发生在该地点的事件
             event_limit: 最多包含多少个事件
+            event_order: 事件排序方式 ('recency', 'importance' 或 'combined')
+            max_tokens: 上下文的 token 预算 (可选)，超出时按优先级裁剪，长文本字段最后放入
+            include_subtree_events: 为 True 时事件取自地点及其所有下级地点，附带 location_depth
             
         Returns:
-            dict: 地点的上下文信息
+            dict: 地点的上下文信息，提供 max_tokens 时附带 packing 裁剪统计
         """
-        # 获取地点基本信息
-        location = Location.get_by_id(location_id)
-        if not location:
-            raise ValueError(f"未找到ID为 {location_id} 的地点")
-        
-        result = {
-            "location": location
-        }
-        
-        # 获取子地点
-        child_locations = Location.get_child_locations(location_id)
-        if child_locations:
-            result["child_locations"] = child_locations
-        
-        # 如果需要，添加地点相关事件
-        if include_events:
-            events = Event.get_events_by_location(location_id)
-            # 限制事件数量
-            result["events"] = events[:event_limit]
-        
-        return result
+        return await self.context_engine.location_context(
+            location_id, include_events, event_limit, event_order, max_tokens, include_subtree_events
+        )
     
-    def get_relationship_context(self, character_id_1: str, character_id_2: str) -> Dict[str, Any]:
+    async def get_relationship_context(self, character_id_1: str, character_id_2: str) -> Dict[str, Any]:
         """
         获取两个角色之间的关系上下文
         
@@ -102,45 +87,17 @@ class MemoryTools:
         Returns:
             dict: 关系上下文信息
         """
-        # 获取角色1信息
-        character1 = Character.get_by_id(character_id_1)
-        if not character1:
-            raise ValueError(f"未找到ID为 {character_id_1} 的角色")
-        
-        # 获取角色2信息
-        character2 = Character.get_by_id(character_id_2)
-        if not character2:
-            raise ValueError(f"未找到ID为 {character_id_2} 的角色")
-        
-        # 获取两个角色之间的关系
-        relationship = Relationship.get_relationship_between_characters(character_id_1, character_id_2)
-        
-        # 查找两个角色共同参与的事件
-        # 这需要通过子查询实现，此处简化处理
-        query = """
-        SELECT e.* FROM events e
-        JOIN event_characters ec1 ON e.event_id = ec1.event_id
-        JOIN event_characters ec2 ON e.event_id = ec2.event_id
-        WHERE ec1.character_id = %s AND ec2.character_id = %s
-        ORDER BY e.timestamp DESC
-        LIMIT 5
-        """
-        from src.db import db
-        shared_events = db.execute_query(query, (character_id_1, character_id_2))
-        
-        return {
-            "character1": character1,
-            "character2": character2,
-            "relationship": relationship,
-            "shared_events": shared_events
-        }
+        return await self.context_engine.relationship_context(character_id_1, character_id_2)
     
-    def search_memory(self, 
+    async def search_memory(self, 
                   query: str, 
                   search_characters: bool = True, 
                   search_locations: bool = True, 
                   search_events: bool = True,
-                  limit: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+                  limit: int = 5,
+                  engine: str = 'fulltext',
+                  character_id: Optional[str] = None,
+                  weights: Optional[Dict[str, float]] = None) -> Dict[str, List[Dict[str, Any]]]:
         """
         搜索记忆知识库
         
@@ -150,54 +107,57 @@ class MemoryTools:
             search_locations: 是否搜索地点
             search_events: 是否搜索事件
             limit: 每类结果的最大数量
+            engine: 检索引擎 ('fulltext' 使用 MySQL 全文索引, 'bm25' 使用进程内倒排索引)
+            character_id: 查询角色ID (可选)，提供时与其关系越近的角色参与的事件排名越靠前
+            weights: 事件混合排序的权重 (可选)，键为 text/recency/importance/proximity
             
         Returns:
-            dict: 搜索结果
+            dict: 搜索结果，每条记录附带 relevance 相关度；事件另附 score 综合得分并按其降序排列
         """
-        result = {}
-        search_pattern = f"%{query}%"
-        
-        # 搜索角色
-        if search_characters:
-            character_query = """
-            SELECT * FROM characters
-            WHERE name LIKE %s OR occupation LIKE %s OR backstory LIKE %s
-            LIMIT %s
-            """
-            from src.db import db
-            characters = db.execute_query(
-                character_query, 
-                (search_pattern, search_pattern, search_pattern, limit)
-            )
-            result["characters"] = characters
-        
-        # 搜索地点
-        if search_locations:
-            location_query = """
-            SELECT * FROM locations
-            WHERE name LIKE %s OR description LIKE %s
-            LIMIT %s
-            """
-            from src.db import db
-            locations = db.execute_query(
-                location_query, 
-                (search_pattern, search_pattern, limit)
-            )
-            result["locations"] = locations
+        if engine not in self.search_engines:
+            raise ValueError(f"无效的检索引擎: {engine}，可选值: {', '.join(self.search_engines)}")
+        
+        # 多取一些候选，角色和地点按相关度截取，事件经混合排序后截取
+        result = await self.search_engines[engine].search(
+            query, search_characters, search_locations, search_events,
+            limit * self.rerank_candidate_factor
+        )
+        return await self._rerank(result, limit, character_id, weights, 'relevance')
+    
+    async def semantic_search(self,
+                     query: str,
+                     search_characters: bool = True,
+                     search_events: bool = True,
+                     limit: int = 5,
+                     character_id: Optional[str] = None,
+                     weights: Optional[Dict[str, float]] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        按语义相似度搜索角色背景故事和事件，可以召回用词不同但含义相近的记忆
         
-        # 搜索事件
-        if search_events:
-            event_query = """
-            SELECT * FROM events
-            WHERE title LIKE %s OR description LIKE %s
-            ORDER BY timestamp DESC
-            LIMIT %s
-            """
-            from src.db import db
-            events = db.execute_query(
-                event_query, 
-                (search_pattern, search_pattern, limit)
-            )
-            result["events"] = events
+        Args:
+            query: 查询文本
+            search_characters: 是否搜索角色
+            search_events: 是否搜索事件
+            limit: 每类结果的最大数量
+            character_id: 查询角色ID (可选)，提供时与其关系越近的角色参与的事件排名越靠前
+            weights: 事件混合排序的权重 (可选)，键为 text/recency/importance/proximity
+            
+        Returns:
+            dict: 搜索结果，每条记录附带 similarity 相似度；事件另附 score 综合得分并按其降序排列
+        """
+        if limit <= 0:
+            raise ValueError("limit 必须大于0")
         
-        return result
\ No newline at end of file
+        result = await self.semantic_engine.search(
+            query, search_characters, search_events, limit * self.rerank_candidate_factor
+        )
+        return await self._rerank(result, limit, character_id, weights, 'similarity')
+    
+    async def _rerank(self, result, limit, character_id, weights, text_key):
+        """把检索结果截取到 limit 条，其中事件先经混合排序"""
+        for key in result:
+            if key == "events":
+                result[key] = await self.ranker.rerank(result[key], character_id, weights, text_key, limit)
+            else:
+                result[key] = result[key][:limit]
+        return result
@@ -1,15 +1,21 @@
 """
 关系工具类，提供角色关系相关的MCP工具函数
 """
-import uuid
 from typing import Dict, Any, List, Optional
 
+from src.db import adb
+from src.db.ids import new_id
 from src.models import Relationship
+from src.memory import RelationshipGraphEngine
+from src.memory.relationship_graph import MAX_HOPS
 
 class RelationshipTools:
     """关系工具类"""
     
-    def create_relationship(self, 
+    def __init__(self):
+        self.graph = RelationshipGraphEngine()
+    
+    async def create_relationship(self, 
                        character_id_1: str, 
                        character_id_2: str, 
                        relationship_type: str,
@@ -34,9 +40,17 @@ class RelationshipTools:
         if not 1 <= strength <= 100:
             raise ValueError("关系强度必须在1到100之间")
             
-        # 如果没有提供ID，生成一个新的UUID
+        # 同一对角色只能有一条关系（不论先后顺序）
+        existing = await Relationship.aget_relationship_between_characters(character_id_1, character_id_2)
+        if existing:
+            raise ValueError(
+                f"角色 {character_id_1} 和 {character_id_2} 之间已存在关系 {existing['relationship_id']}，"
+                f"请使用 relationship_update 修改"
+            )
+        
+        # 如果没有提供ID，生成一个新的 UUIDv7
         if not relationship_id:
-            relationship_id = str(uuid.uuid4())
+            relationship_id = new_id()
         
         relationship_data = {
             'relationship_id': relationship_id,
@@ -48,11 +62,50 @@ class RelationshipTools:
         }
         
         # 创建关系并获取ID
-        created_id = Relationship.create(relationship_data)
+        created_id = await Relationship.acreate(relationship_data)
         
         return {"relationship_id": created_id, "data": relationship_data}
     
-    def get_relationship(self, relationship_id: str) -> Dict[str, Any]:
+    async def create_relationships_batch(self, relationships: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量创建角色关系，所有数据校验通过后才写入数据库
+        
+        Args:
+            relationships: 关系数据列表，每项字段同 create_relationship
+            
+        Returns:
+            dict: 创建数量和关系ID列表
+        """
+        relationships_data = []
+        pairs = set()
+        for index, item in enumerate(relationships, start=1):
+            if not item.get('character_id_1') or not item.get('character_id_2'):
+                raise ValueError(f"第 {index} 个关系缺少 character_id_1 或 character_id_2")
+            if not item.get('relationship_type'):
+                raise ValueError(f"第 {index} 个关系缺少 relationship_type")
+            invalid = set(item) - set(Relationship.valid_attributes) - {
+                'relationship_id', 'character_id_1', 'character_id_2'
+            }
+            if invalid:
+                raise ValueError(f"第 {index} 个关系包含无效属性: {', '.join(sorted(invalid))}")
+            strength = item.get('strength')
+            if not isinstance(strength, int) or not 1 <= strength <= 100:
+                raise ValueError(f"第 {index} 个关系的强度必须是1到100之间的整数")
+            pair = Relationship.canonical_pair(item['character_id_1'], item['character_id_2'])
+            if pair in pairs:
+                raise ValueError(f"第 {index} 个关系与前面的关系是同一对角色")
+            pairs.add(pair)
+            
+            relationship_data = dict(item)
+            # 如果没有提供ID，生成一个新的 UUIDv7
+            relationship_data['relationship_id'] = item.get('relationship_id') or new_id()
+            relationships_data.append(relationship_data)
+        
+        created_ids = await Relationship.acreate_many(relationships_data)
+        
+        return {"created": len(created_ids), "relationship_ids": created_ids}
+    
+    async def get_relationship(self, relationship_id: str) -> Dict[str, Any]:
         """
         获取关系信息
         
@@ -62,13 +115,13 @@ class RelationshipTools:
         Returns:
             dict: 关系数据
         """
-        relationship = Relationship.get_by_id(relationship_id)
+        relationship = await Relationship.aget_by_id(relationship_id)
         if not relationship:
             raise ValueError(f"未找到ID为 {relationship_id} 的关系")
         
         return relationship
     
-    def get_character_relationships(self, character_id: str) -> List[Dict[str, Any]]:
+    async def get_character_relationships(self, character_id: str) -> List[Dict[str, Any]]:
         """
         获取角色的所有关系
         
@@ -78,9 +131,9 @@ class RelationshipTools:
         Returns:
             list: 关系列表
         """
-        return Relationship.get_character_relationships(character_id)
+        return await Relationship.aget_character_relationships(character_id)
     
-    def get_relationship_between_characters(self, character_id_1: str, character_id_2: str) -> Dict[str, Any]:
+    async def get_relationship_between_characters(self, character_id_1: str, character_id_2: str) -> Dict[str, Any]:
         """
         获取两个角色之间的关系
         
@@ -91,10 +144,10 @@ class RelationshipTools:
         Returns:
             dict: 关系数据，如果不存在则返回None
         """
-        relationship = Relationship.get_relationship_between_characters(character_id_1, character_id_2)
+        relationship = await Relationship.aget_relationship_between_characters(character_id_1, character_id_2)
         return relationship
     
-    def update_relationship(self, relationship_id: str, attribute: str, value: Any) -> Dict[str, Any]:
+    async def update_relationship(self, relationship_id: str, attribute: str, value: Any) -> Dict[str, Any]:
         """
         更新关系属性
         
@@ -106,25 +159,47 @@ class RelationshipTools:
         Returns:
             dict: 更新后的关系数据
         """
-        # 检查关系是否存在
-        relationship = Relationship.get_by_id(relationship_id)
-        if not relationship:
-            raise ValueError(f"未找到ID为 {relationship_id} 的关系")
-        
         # 如果是更新强度，检查范围
         if attribute == 'strength' and (not isinstance(value, int) or not 1 <= value <= 100):
             raise ValueError("关系强度必须是1到100之间的整数")
+        
+        # 在同一事务中锁定、更新并读回，只占用一个连接、提交一次
+        async with adb.transaction() as session:
+            relationship = await Relationship.aget_by_id(relationship_id, session=session, for_update=True)
+            if not relationship:
+                raise ValueError(f"未找到ID为 {relationship_id} 的关系")
             
-        # 更新关系属性
-        rows_affected = Relationship.update_relationship(relationship_id, attribute, value)
-        if rows_affected == 0:
-            raise ValueError(f"更新关系属性失败")
+            await Relationship.aupdate_relationship(relationship_id, attribute, value, session=session)
+            
+            # 返回更新后的关系数据
+            updated_relationship = await Relationship.aget_by_id(relationship_id, session=session)
+        return updated_relationship
+    
+    async def patch_relationship(self, relationship_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        一次更新关系的多个属性
+        
+        Args:
+            relationship_id: 关系ID
+            fields: 属性名到新值的映射，如 {"strength": ..., "description": ...}
+            
+        Returns:
+            dict: 更新后的关系数据
+        """
+        # 如果包含强度，检查范围
+        strength = fields.get('strength')
+        if 'strength' in fields and (not isinstance(strength, int) or not 1 <= strength <= 100):
+            raise ValueError("关系强度必须是1到100之间的整数")
         
-        # 返回更新后的关系数据
-        updated_relationship = Relationship.get_by_id(relationship_id)
+        # 一条 UPDATE 加一次读回，共用一个连接并只提交一次
+        async with adb.transaction() as session:
+            await Relationship.apatch(relationship_id, fields, session=session)
+            updated_relationship = await Relationship.aget_by_id(relationship_id, session=session)
+            if not updated_relationship:
+                raise ValueError(f"未找到ID为 {relationship_id} 的关系")
         return updated_relationship
     
-    def delete_relationship(self, relationship_id: str) -> Dict[str, Any]:
+    async def delete_relationship(self, relationship_id: str) -> Dict[str, Any]:
         """
         删除关系
         
@@ -135,13 +210,112 @@ class RelationshipTools:
             dict: 操作结果
         """
         # 检查关系是否存在
-        relationship = Relationship.get_by_id(relationship_id)
+        relationship = await Relationship.aget_by_id(relationship_id)
         if not relationship:
             raise ValueError(f"未找到ID为 {relationship_id} 的关系")
         
         # 删除关系
-        rows_affected = Relationship.delete(relationship_id)
+        rows_affected = await Relationship.adelete(relationship_id)
         if rows_affected == 0:
             raise ValueError(f"删除关系失败")
         
-        return {"success": True, "message": f"关系 {relationship_id} 已成功删除"}
\ No newline at end of file
+        return {"success": True, "message": f"关系 {relationship_id} 已成功删除"}
+    
+    @staticmethod
+    def _check_min_strength(min_strength: Optional[int]):
+        if min_strength is not None and not 1 <= min_strength <= 100:
+            raise ValueError("最小关系强度必须在1到100之间")
+    
+    async def get_k_hop(self, character_id: str, k: int = 2,
+                        relationship_types: Optional[List[str]] = None,
+                        min_strength: Optional[int] = None,
+                        limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        获取角色 k 跳以内的关系网，在内存关系图上计算，不访问数据库
+        
+        Args:
+            character_id: 角色ID
+            k: 最大跳数 (1-6)
+            relationship_types: 只沿这些类型的关系扩展，不提供时不限
+            min_strength: 只沿强度不低于该值的关系扩展
+            limit: 最多返回的角色数量
+            
+        Returns:
+            list: 角色列表，包含跳数、路径强度和从起点出发的关系路径
+        """
+        if not 1 <= k <= MAX_HOPS:
+            raise ValueError(f"跳数必须在1到{MAX_HOPS}之间")
+        if limit <= 0:
+            raise ValueError("limit 必须大于0")
+        self._check_min_strength(min_strength)
+        return await self.graph.k_hop(character_id, k, relationship_types, min_strength, limit)
+    
+    async def find_path(self, character_id_1: str, character_id_2: str,
+                        mode: str = 'strongest',
+                        relationship_types: Optional[List[str]] = None,
+                        min_strength: Optional[int] = None) -> Dict[str, Any]:
+        """
+        查找两个角色之间的关系路径，在内存关系图上计算，不访问数据库
+        
+        Args:
+            character_id_1: 角色1 ID
+            character_id_2: 角色2 ID
+            mode: 'strongest' 关系强度之积最大的路径，'shortest' 跳数最少的路径
+            relationship_types: 只经过这些类型的关系
+            min_strength: 只经过强度不低于该值的关系
+            
+        Returns:
+            dict: {"found", "hops"?, "strength"?, "path"?}
+        """
+        self._check_min_strength(min_strength)
+        result = await self.graph.path(character_id_1, character_id_2, mode, relationship_types, min_strength)
+        if result is None:
+            return {"found": False}
+        return {"found": True, **result}
+    
+    async def get_common_connections(self, character_id_1: str, character_id_2: str,
+                                     relationship_types: Optional[List[str]] = None,
+                                     min_strength: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        获取与两个角色都有直接关系的角色，在内存关系图上计算，不访问数据库
+        
+        Args:
+            character_id_1: 角色1 ID
+            character_id_2: 角色2 ID
+            relationship_types: 只考虑这些类型的关系
+            min_strength: 只考虑强度不低于该值的关系
+            
+        Returns:
+            list: 共同关系角色列表，附带其与两个角色各自的关系
+        """
+        self._check_min_strength(min_strength)
+        return await self.graph.common_connections(character_id_1, character_id_2, relationship_types, min_strength)
+    
+    async def get_world_graph_stats(self, top_n: int = 10) -> Dict[str, Any]:
+        """
+        获取整个关系图的统计：规模、关系类型分布、影响力排行和社群划分
+        
+        Args:
+            top_n: 排行榜和社群列表的长度
+            
+        Returns:
+            dict: 关系图统计
+        """
+        if top_n <= 0:
+            raise ValueError("top_n 必须大于0")
+        return await self.graph.world_stats(top_n)
+    
+    async def get_character_influence(self, character_id: str) -> Dict[str, Any]:
+        """
+        获取角色在关系图中的影响力：度、加权度、PageRank 排名和所在社群
+        
+        Args:
+            character_id: 角色ID
+            
+        Returns:
+            dict: 影响力指标
+        """
+        influence = await self.graph.influence(character_id)
+        if influence is None:
+            raise ValueError(f"未找到ID为 {character_id} 的角色")
+        return influence
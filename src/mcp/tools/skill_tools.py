@@ -1,15 +1,16 @@
 """
 技能工具类，提供技能相关的MCP工具函数
 """
-import uuid
 from typing import Dict, Any, List, Optional
 
+from src.db.ids import new_id
+from src.mcp.pagination import decode_cursor, make_page, page_size
 from src.models import Skill, CharacterSkill
 
 class SkillTools:
     """技能工具类"""
     
-    def create_skill(self, 
+    async def create_skill(self, 
                  name: str, 
                  description: str, 
                  skill_id: Optional[str] = None) -> Dict[str, Any]:
@@ -24,9 +25,9 @@ class SkillTools:
         Returns:
             dict: 包含技能数据和ID的字典
         """
-        # 如果没有提供ID，生成一个新的UUID
+        # 如果没有提供ID，生成一个新的 UUIDv7
         if not skill_id:
-            skill_id = str(uuid.uuid4())
+            skill_id = new_id()
         
         skill_data = {
             'skill_id': skill_id,
@@ -35,11 +36,11 @@ class SkillTools:
         }
         
         # 创建技能并获取ID
-        created_id = Skill.create(skill_data)
+        created_id = await Skill.acreate(skill_data)
         
         return {"skill_id": created_id, "data": skill_data}
     
-    def get_skill(self, skill_id: str) -> Dict[str, Any]:
+    async def get_skill(self, skill_id: str) -> Dict[str, Any]:
         """
         获取技能信息
         
@@ -49,22 +50,30 @@ class SkillTools:
         Returns:
             dict: 技能数据
         """
-        skill = Skill.get_by_id(skill_id)
+        skill = await Skill.aget_by_id(skill_id)
         if not skill:
             raise ValueError(f"未找到ID为 {skill_id} 的技能")
         
         return skill
     
-    def get_all_skills(self) -> List[Dict[str, Any]]:
+    async def get_all_skills(self, limit: Optional[int] = None,
+                         cursor: Optional[str] = None) -> Dict[str, Any]:
         """
-        获取所有技能
+        分页获取所有技能，按ID排序
         
+        Args:
+            limit: 每页数量，不提供时取默认值，超过上限时按上限返回
+            cursor: 上一页返回的 next_cursor，不提供时返回第一页
+            
         Returns:
-            list: 技能列表
+            dict: {"items": 技能列表, "next_cursor": 下一页的游标，已是最后一页时为 None}
         """
-        return Skill.get_all()
+        size = page_size(limit)
+        scope = ('skill_get_all',)
+        rows = await Skill.aget_page(size + 1, decode_cursor(scope, cursor))
+        return make_page(rows, size, scope, Skill.page_order)
     
-    def update_skill(self, skill_id: str, description: str) -> Dict[str, Any]:
+    async def update_skill(self, skill_id: str, description: str) -> Dict[str, Any]:
         """
         更新技能描述
         
@@ -76,20 +85,20 @@ class SkillTools:
             dict: 更新后的技能数据
         """
         # 检查技能是否存在
-        skill = Skill.get_by_id(skill_id)
+        skill = await Skill.aget_by_id(skill_id)
         if not skill:
             raise ValueError(f"未找到ID为 {skill_id} 的技能")
         
         # 更新技能描述
-        rows_affected = Skill.update_description(skill_id, description)
+        rows_affected = await Skill.aupdate_description(skill_id, description)
         if rows_affected == 0:
             raise ValueError(f"更新技能描述失败")
         
         # 返回更新后的技能数据
-        updated_skill = Skill.get_by_id(skill_id)
+        updated_skill = await Skill.aget_by_id(skill_id)
         return updated_skill
     
-    def delete_skill(self, skill_id: str) -> Dict[str, Any]:
+    async def delete_skill(self, skill_id: str) -> Dict[str, Any]:
         """
         删除技能
         
@@ -100,18 +109,18 @@ class SkillTools:
             dict: 操作结果
         """
         # 检查技能是否存在
-        skill = Skill.get_by_id(skill_id)
+        skill = await Skill.aget_by_id(skill_id)
         if not skill:
             raise ValueError(f"未找到ID为 {skill_id} 的技能")
         
         # 删除技能
-        rows_affected = Skill.delete(skill_id)
+        rows_affected = await Skill.adelete(skill_id)
         if rows_affected == 0:
             raise ValueError(f"删除技能失败")
         
         return {"success": True, "message": f"技能 {skill_id} 已成功删除"}
     
-    def add_character_skill(self, 
+    async def add_character_skill(self, 
                        character_id: str, 
                        skill_id: str, 
                        level: int = 1) -> Dict[str, Any]:
@@ -127,7 +136,7 @@ class SkillTools:
             dict: 包含关联ID和关联数据的字典
         """
         # 添加角色技能关联
-        relation_id = CharacterSkill.add_character_skill(character_id, skill_id, level)
+        relation_id = await CharacterSkill.aadd_character_skill(character_id, skill_id, level)
         
         return {
             "relation_id": relation_id,
@@ -136,7 +145,7 @@ class SkillTools:
             "level": level
         }
     
-    def get_character_skills(self, character_id: str) -> List[Dict[str, Any]]:
+    async def get_character_skills(self, character_id: str) -> List[Dict[str, Any]]:
         """
         获取角色的所有技能
         
@@ -146,9 +155,9 @@ class SkillTools:
         Returns:
             list: 角色技能列表
         """
-        return CharacterSkill.get_character_skills(character_id)
+        return await CharacterSkill.aget_character_skills(character_id)
     
-    def update_character_skill(self, 
+    async def update_character_skill(self, 
                         character_id: str, 
                         skill_id: str, 
                         level: int) -> Dict[str, Any]:
@@ -164,7 +173,7 @@ class SkillTools:
             dict: 操作结果
         """
         # 更新角色技能等级
-        rows_affected = CharacterSkill.update_character_skill_level(character_id, skill_id, level)
+        rows_affected = await CharacterSkill.aupdate_character_skill_level(character_id, skill_id, level)
         if rows_affected == 0:
             raise ValueError(f"更新角色技能等级失败")
         
@@ -175,7 +184,7 @@ class SkillTools:
             "level": level
         }
     
-    def remove_character_skill(self, character_id: str, skill_id: str) -> Dict[str, Any]:
+    async def remove_character_skill(self, character_id: str, skill_id: str) -> Dict[str, Any]:
         """
         移除角色的技能
         
@@ -187,7 +196,7 @@ class SkillTools:
             dict: 操作结果
         """
         # 移除角色技能关联
-        rows_affected = CharacterSkill.remove_character_skill(character_id, skill_id)
+        rows_affected = await CharacterSkill.aremove_character_skill(character_id, skill_id)
         if rows_affected == 0:
             raise ValueError(f"移除角色技能失败，可能关联不存在")
         
@@ -0,0 +1,10 @@
+"""
+记忆检索模块初始化文件
+"""
+
+from .context_engine import ContextEngine
+from .search_engine import FullTextSearchEngine, BM25SearchEngine, SemanticSearchEngine
+from .ranking import HybridRanker
+from .packing import ContextPacker, estimate_tokens
+from .snapshots import ContextSnapshotStore
+from .relationship_graph import RelationshipGraphEngine
@@ -0,0 +1,146 @@
+"""
+内存倒排索引，使用 CJK n-gram 分词和 BM25 打分
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+# 中日韩文字范围：汉字、日文假名、韩文音节
+CJK_RANGES = r'\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+
+# 连续的 CJK 文字，或连续的其他单词字符（字母、数字）
+_TOKEN_RE = re.compile(rf'([{CJK_RANGES}]+)|[^\W{CJK_RANGES}]+')
+
+# CJK 文字切分的 n-gram 长度，与 MySQL ngram 解析器的默认值一致
+CJK_NGRAM_SIZE = 2
+
+
+def tokenize(text: Optional[str], ngram_size: int = CJK_NGRAM_SIZE) -> List[str]:
+    """
+    切分文本为检索词
+
+    CJK 文字没有空格分词，按 n-gram 滑动切分（短于 n 的片段整体作为一个词）；
+    其他文字按单词切分并转为小写。
+
+    Args:
+        text: 待切分的文本
+        ngram_size: CJK 文字的 n-gram 长度
+
+    Returns:
+        list: 检索词列表，保留重复以便统计词频
+    """
+    if not text:
+        return []
+    tokens = []
+    for match in _TOKEN_RE.finditer(text):
+        run = match.group()
+        if match.group(1):
+            if len(run) <= ngram_size:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + ngram_size] for i in range(len(run) - ngram_size + 1))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+class BM25Index:
+    """
+    支持增量增删的 BM25 倒排索引
+
+    每个文档保存原始数据，检索完全在内存中完成。文档的词频表也一并保存，
+    以便更新或删除时从倒排表中精确撤掉旧的记录。
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Hashable, int]] = defaultdict(dict)
+        self._doc_terms: Dict[Hashable, Counter] = {}
+        self._doc_lengths: Dict[Hashable, int] = {}
+        self._docs: Dict[Hashable, Any] = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def get(self, doc_id: Hashable) -> Any:
+        """获取文档的原始数据"""
+        return self._docs.get(doc_id)
+
+    def docs(self) -> List[Any]:
+        """所有文档的原始数据"""
+        return list(self._docs.values())
+
+    def add(self, doc_id: Hashable, text: str, doc: Any = None):
+        """
+        加入或替换一个文档
+
+        Args:
+            doc_id: 文档ID
+            text: 参与检索的文本
+            doc: 检索命中时返回的原始数据
+        """
+        self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        for term, freq in terms.items():
+            self._postings[term][doc_id] = freq
+        self._doc_terms[doc_id] = terms
+        self._docs[doc_id] = doc
+        self._doc_lengths[doc_id] = sum(terms.values())
+        self._total_length += self._doc_lengths[doc_id]
+
+    def remove(self, doc_id: Hashable):
+        """删除一个文档，不存在时忽略"""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+        self._docs.pop(doc_id, None)
+        self._total_length -= self._doc_lengths.pop(doc_id)
+
+    def clear(self):
+        """清空索引"""
+        self._postings.clear()
+        self._doc_terms.clear()
+        self._doc_lengths.clear()
+        self._docs.clear()
+        self._total_length = 0
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[Hashable, float]]:
+        """
+        检索与查询最相关的文档
+
+        Args:
+            query: 查询文本
+            limit: 最多返回的数量
+
+        Returns:
+            list: [(doc_id, score)]，按得分降序
+        """
+        doc_count = len(self._docs)
+        if not doc_count or limit <= 0:
+            return []
+        avg_length = self._total_length / doc_count or 1.0
+
+        scores: Dict[Hashable, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for doc_id, freq in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + norm)
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
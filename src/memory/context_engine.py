@@ -0,0 +1,150 @@
+"""
+上下文组装引擎，为记忆工具并发获取角色、地点和关系的上下文
+"""
+import asyncio
+from typing import Dict, Any, Optional
+
+from config.database import SNAPSHOT_CONFIG
+from src.models import Character, CharacterSkill, Location, Relationship, Event, EventCharacter
+from src.memory.packing import pack_character_context, pack_location_context
+from src.memory.snapshots import ContextSnapshotStore, character_dependencies, location_dependencies
+
+
+class ContextEngine:
+    """
+    上下文组装引擎
+
+    组成一份上下文的各个子查询互不依赖，因此同时从异步连接池各取一个连接并发执行，
+    整体延迟约等于最慢的那一次往返，而不是所有往返之和。
+
+    角色和地点上下文组装后保存在 snapshots 中，相关数据未变化时直接返回快照；
+    按 token 预算裁剪在快照之上进行，不影响快照本身。
+    """
+
+    def __init__(self, snapshots: Optional[ContextSnapshotStore] = None):
+        self.snapshots = snapshots or ContextSnapshotStore(**SNAPSHOT_CONFIG)
+
+    @staticmethod
+    async def _gather(queries: Dict[str, Any]) -> Dict[str, Any]:
+        """并发执行一组子查询，按原有的键顺序返回结果"""
+        values = await asyncio.gather(*queries.values())
+        return dict(zip(queries.keys(), values))
+
+    async def character_context(self, character_id: str,
+                                include_relationships: bool = True,
+                                include_events: bool = True,
+                                include_skills: bool = True,
+                                event_limit: int = 10,
+                                event_order: str = 'recency',
+                                event_since: Optional[str] = None,
+                                event_until: Optional[str] = None,
+                                max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """
+        组装角色上下文，提供 max_tokens 时按 token 预算裁剪
+
+        Returns:
+            dict: {"character", "relationships"?, "skills"?, "events"?, "packing"?}
+        """
+        key = ('character', character_id, include_relationships, include_events, include_skills,
+               event_limit, event_order, event_since, event_until)
+        result = self.snapshots.get(key)
+        if result is None:
+            epoch = self.snapshots.epoch
+            result = await self._build_character_context(
+                character_id, include_relationships, include_events, include_skills,
+                event_limit, event_order, event_since, event_until
+            )
+            windowed = (event_since is not None or event_until is not None
+                        or len(result.get("events", ())) >= event_limit)
+            self.snapshots.put(key, result, character_dependencies(character_id, result, windowed), epoch)
+        if max_tokens is not None:
+            return pack_character_context(result, max_tokens)
+        return result
+
+    async def _build_character_context(self, character_id, include_relationships, include_events,
+                                       include_skills, event_limit, event_order, event_since, event_until):
+        """从数据库组装角色上下文"""
+        queries = {"character": Character.aget_by_id(character_id)}
+        if include_relationships:
+            queries["relationships"] = Relationship.aget_character_relationships(character_id)
+        if include_skills:
+            queries["skills"] = CharacterSkill.aget_character_skills(character_id)
+        if include_events:
+            queries["events"] = EventCharacter.aget_events_involving_character(
+                character_id, limit=event_limit, order_by=event_order,
+                since=event_since, until=event_until
+            )
+
+        result = await self._gather(queries)
+        if not result["character"]:
+            raise ValueError(f"未找到ID为 {character_id} 的角色")
+        return result
+
+    async def location_context(self, location_id: str,
+                               include_events: bool = True,
+                               event_limit: int = 10,
+                               event_order: str = 'recency',
+                               max_tokens: Optional[int] = None,
+                               include_subtree_events: bool = False) -> Dict[str, Any]:
+        """
+        组装地点上下文，提供 max_tokens 时按 token 预算裁剪
+
+        Returns:
+            dict: {"location", "child_locations"?, "events"?, "packing"?}
+        """
+        key = ('location', location_id, include_events, event_limit, event_order, include_subtree_events)
+        result = self.snapshots.get(key)
+        if result is None:
+            epoch = self.snapshots.epoch
+            result = await self._build_location_context(
+                location_id, include_events, event_limit, event_order, include_subtree_events
+            )
+            windowed = len(result.get("events", ())) >= event_limit
+            deps = location_dependencies(location_id, result, windowed, include_subtree_events)
+            self.snapshots.put(key, result, deps, epoch)
+        if max_tokens is not None:
+            return pack_location_context(result, max_tokens)
+        return result
+
+    async def _build_location_context(self, location_id, include_events, event_limit, event_order,
+                                      include_subtree_events=False):
+        """从数据库组装地点上下文，include_subtree_events 时事件取自整棵子树的区域索引"""
+        queries = {
+            "location": Location.aget_by_id(location_id),
+            "child_locations": Location.aget_child_locations(location_id)
+        }
+        if include_events and include_subtree_events:
+            queries["events"] = Location.aget_subtree_events(
+                location_id, limit=event_limit, order_by=event_order
+            )
+        elif include_events:
+            queries["events"] = Event.aget_events_by_location(
+                location_id, limit=event_limit, order_by=event_order
+            )
+
+        result = await self._gather(queries)
+        if not result["location"]:
+            raise ValueError(f"未找到ID为 {location_id} 的地点")
+        # 没有子地点时不返回该字段
+        if not result["child_locations"]:
+            del result["child_locations"]
+        return result
+
+    async def relationship_context(self, character_id_1: str, character_id_2: str) -> Dict[str, Any]:
+        """
+        组装两个角色之间的关系上下文
+
+        Returns:
+            dict: {"character1", "character2", "relationship", "shared_events"}
+        """
+        result = await self._gather({
+            "character1": Character.aget_by_id(character_id_1),
+            "character2": Character.aget_by_id(character_id_2),
+            "relationship": Relationship.aget_relationship_between_characters(character_id_1, character_id_2),
+            "shared_events": EventCharacter.aget_shared_events(character_id_1, character_id_2, limit=5)
+        })
+        if not result["character1"]:
+            raise ValueError(f"未找到ID为 {character_id_1} 的角色")
+        if not result["character2"]:
+            raise ValueError(f"未找到ID为 {character_id_2} 的角色")
+        return result
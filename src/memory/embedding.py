@@ -0,0 +1,75 @@
+"""
+本地文本向量化，不依赖网络和GPU
+"""
+import re
+import zlib
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from src.memory.bm25 import tokenize
+
+
+class Embedder(ABC):
+    """
+    文本向量化接口
+
+    子类实现 embed，把一批文本映射为 L2 归一化的向量矩阵，
+    这样向量索引中的内积即为余弦相似度。可以替换为任意本地模型。
+    """
+
+    # 向量维度
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        向量化一批文本
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            np.ndarray: 形状为 (len(texts), dim) 的 float32 矩阵，每行 L2 归一化
+        """
+
+    def embed_one(self, text: str) -> np.ndarray:
+        """向量化单条文本"""
+        return self.embed([text])[0]
+
+
+class HashingEmbedder(Embedder):
+    """
+    特征哈希向量化
+
+    以检索词（CJK n-gram、单词）和拉丁单词的字符三元组为特征，用带符号的哈希
+    投影到固定维度，词频取对数平滑后归一化。字符三元组使同词根的不同词形
+    （duel / duels / dueling）获得部分相似度。
+
+    哈希使用 crc32 而不是内置 hash()，保证跨进程结果一致。
+    """
+
+    def __init__(self, dim: int = 512, char_ngram: int = 3):
+        self.dim = dim
+        self.char_ngram = char_ngram
+
+    def _features(self, text: Optional[str]) -> Iterable[str]:
+        for token in tokenize(text):
+            yield token
+            if self.char_ngram and re.fullmatch(r'[a-z]+', token) and len(token) > self.char_ngram:
+                padded = f'#{token}#'
+                for i in range(len(padded) - self.char_ngram + 1):
+                    yield padded[i:i + self.char_ngram]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = zlib.crc32(feature.encode('utf-8'))
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                vectors[row, digest % self.dim] += sign
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
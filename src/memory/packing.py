@@ -0,0 +1,200 @@
+"""
+按 token 预算裁剪上下文，使返回给 LLM 的内容大小有上限且可预期
+"""
+import math
+import re
+from typing import Any, Dict, Iterable, List, Tuple
+
+from src.memory.bm25 import CJK_RANGES
+
+_CJK_RE = re.compile(f'[{CJK_RANGES}]')
+
+# 各部分中较长的文本字段，最后才放入，放不下时截断或丢弃
+LONG_TEXT_FIELDS = {
+    'character': ('backstory', 'appearance', 'mannerisms', 'notes'),
+    'location': ('description',),
+    'relationships': ('description',),
+    'events': ('description',),
+    'skills': ('description',),
+    'child_locations': ('description',),
+}
+
+# 剩余预算低于该值时不再截断放入长文本，直接丢弃
+MIN_TRUNCATED_TOKENS = 16
+
+TRUNCATION_MARK = '…'
+
+
+def estimate_tokens(value: Any) -> int:
+    """
+    快速估算一个值序列化为 JSON 后的 token 数
+
+    CJK 文字按每字1个 token 计，其他字符按每4个1个 token 计，
+    字典和列表按元素逐个累加并计入少量标点开销。结果只用于预算控制，
+    不追求与具体分词器完全一致。
+
+    Args:
+        value: 任意可序列化的值
+
+    Returns:
+        int: 估算的 token 数
+    """
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, dict):
+        return 2 + sum(estimate_tokens(key) + estimate_tokens(item) + 1 for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return 2 + sum(estimate_tokens(item) + 1 for item in value)
+    text = value if isinstance(value, str) else str(value)
+    cjk = len(_CJK_RE.findall(text))
+    return max(1, cjk + math.ceil((len(text) - cjk) / 4))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    截断文本使其估算 token 数不超过 max_tokens，被截断时末尾加省略号
+
+    Args:
+        text: 原文本
+        max_tokens: token 上限
+
+    Returns:
+        str: 截断后的文本
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # 二分查找能放下的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle] + TRUNCATION_MARK) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + TRUNCATION_MARK
+
+
+class ContextPacker:
+    """
+    贪心上下文打包器
+
+    按优先级依次放入内容，直到用完 max_tokens 预算：
+        1. 核心实体（角色/地点）去掉长文本字段后的部分，总是保留
+        2. 各列表部分按给定顺序逐条放入（长文本字段先去掉），放不下的条目跳过
+        3. 按同样的优先级把长文本字段放回，放不下时截断到剩余预算，预算过小时丢弃
+    """
+
+    def __init__(self, max_tokens: int):
+        if max_tokens <= 0:
+            raise ValueError("max_tokens 必须大于0")
+        self.max_tokens = max_tokens
+        self.remaining = max_tokens
+
+    def _charge(self, cost: int, force: bool = False) -> bool:
+        if cost > self.remaining and not force:
+            return False
+        self.remaining -= cost
+        return True
+
+    @staticmethod
+    def _strip(item: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+        return {key: value for key, value in item.items() if key not in fields}
+
+    def pack(self, context: Dict[str, Any], core_key: str,
+             sections: List[Tuple[str, Any]]) -> Dict[str, Any]:
+        """
+        裁剪一份上下文
+
+        Args:
+            context: 完整的上下文
+            core_key: 核心实体所在的键
+            sections: [(键, 排序函数或 None)]，按优先级排列；排序函数用于列表内排序
+
+        Returns:
+            dict: 裁剪后的上下文，附带 packing 统计
+        """
+        # (所在部分, 裁剪后的条目, 原始条目)，长文本回填按此顺序进行
+        placed = []
+        result = {}
+        omitted = {section: 0 for section, _ in sections if section in context}
+
+        # 为结果中的 packing 统计预留预算
+        self._charge(estimate_tokens('packing') + estimate_tokens(self._stats(omitted, 0, 0)) + 1, force=True)
+
+        core_fields = LONG_TEXT_FIELDS.get(core_key, ())
+        core = self._strip(context[core_key], core_fields)
+        self._charge(estimate_tokens(core_key) + estimate_tokens(core) + 3, force=True)
+        result[core_key] = core
+        placed.append((core_key, core, context[core_key]))
+
+        for section, sort_key in sections:
+            if section not in context:
+                continue
+            items = context[section]
+            if sort_key is not None:
+                items = sorted(items, key=sort_key)
+            fields = LONG_TEXT_FIELDS.get(section, ())
+            self._charge(estimate_tokens(section) + 3, force=True)
+            kept = []
+            for item in items:
+                slim = self._strip(item, fields)
+                if self._charge(estimate_tokens(slim) + 1):
+                    kept.append(slim)
+                    placed.append((section, slim, item))
+                else:
+                    omitted[section] += 1
+            result[section] = kept
+
+        truncated = dropped = 0
+        for section, slim, original in placed:
+            for field in LONG_TEXT_FIELDS.get(section, ()):
+                value = original.get(field)
+                if value is None or value == '':
+                    continue
+                overhead = estimate_tokens(field) + 1
+                if self._charge(overhead + estimate_tokens(value)):
+                    slim[field] = value
+                elif isinstance(value, str) and self.remaining - overhead >= MIN_TRUNCATED_TOKENS:
+                    shortened = truncate_to_tokens(value, self.remaining - overhead)
+                    self._charge(overhead + estimate_tokens(shortened), force=True)
+                    slim[field] = shortened
+                    truncated += 1
+                else:
+                    dropped += 1
+
+        result['packing'] = self._stats(omitted, truncated, dropped)
+        return result
+
+    def _stats(self, omitted, truncated, dropped):
+        return {
+            'max_tokens': self.max_tokens,
+            'estimated_tokens': self.max_tokens - self.remaining,
+            'omitted': omitted,
+            'truncated_fields': truncated,
+            'dropped_fields': dropped,
+        }
+
+
+def pack_character_context(context: Dict[str, Any], max_tokens: int) -> Dict[str, Any]:
+    """
+    按 token 预算裁剪角色上下文
+
+    优先级：角色核心字段 > 关系（按强度降序）> 事件（保持已有排序）> 技能（按等级降序）> 长文本字段
+    """
+    return ContextPacker(max_tokens).pack(context, 'character', [
+        ('relationships', lambda r: -(r.get('strength') or 0)),
+        ('events', None),
+        ('skills', lambda s: -(s.get('level') or 0)),
+    ])
+
+
+def pack_location_context(context: Dict[str, Any], max_tokens: int) -> Dict[str, Any]:
+    """
+    按 token 预算裁剪地点上下文
+
+    优先级：地点核心字段 > 事件（保持已有排序）> 子地点 > 长文本字段
+    """
+    return ContextPacker(max_tokens).pack(context, 'location', [
+        ('events', None),
+        ('child_locations', None),
+    ])
@@ -0,0 +1,164 @@
+"""
+混合排序，综合文本相关度、时间衰减、重要性和关系图距离对候选事件重新打分
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.db.ids import canonical_id
+from src.models import EventCharacter, Relationship
+from src.models.sql_utils import EVENT_RECENCY_HALF_LIFE
+
+# 各项信号的默认权重
+DEFAULT_WEIGHTS = {
+    'text': 0.4,
+    'recency': 0.2,
+    'importance': 0.2,
+    'proximity': 0.2,
+}
+
+# 关系强度缺失时按该值计算
+DEFAULT_RELATIONSHIP_STRENGTH = 50
+
+
+def resolve_weights(weights: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    用调用方给出的权重覆盖默认权重
+
+    Args:
+        weights: 部分或全部信号的权重，未给出的信号使用默认值
+
+    Returns:
+        dict: 完整的权重表
+    """
+    resolved = dict(DEFAULT_WEIGHTS)
+    if not weights:
+        return resolved
+    invalid = [name for name in weights if name not in DEFAULT_WEIGHTS]
+    if invalid:
+        raise ValueError(f"无效的排序权重: {', '.join(invalid)}，可选值: {', '.join(DEFAULT_WEIGHTS)}")
+    for name, value in weights.items():
+        if value is None or value < 0:
+            raise ValueError(f"排序权重 {name} 必须是非负数")
+        resolved[name] = float(value)
+    return resolved
+
+
+class HybridRanker:
+    """
+    候选事件的混合排序器
+
+    与检索方式无关：任何检索器给出的候选事件都可以交给 rerank，
+    每项信号归一化到 [0, 1] 后按权重线性组合，整批候选一次性向量化计算：
+
+        text       文本得分除以本批最高分
+        recency    0.5 ^ (距今秒数 / half_life)
+        importance importance / 100，缺失按 1 计
+        proximity  参与角色与查询角色在关系图上的最近程度，
+                   自身为1，每经过一条关系边乘以 strength / 100，最多 max_hops 跳
+    """
+
+    def __init__(self, half_life: float = EVENT_RECENCY_HALF_LIFE, max_hops: int = 2):
+        self.half_life = half_life
+        self.max_hops = max_hops
+
+    @staticmethod
+    def score(text: np.ndarray, age_seconds: np.ndarray, importance: np.ndarray,
+              proximity: np.ndarray, weights: Dict[str, float], half_life: float) -> np.ndarray:
+        """
+        计算一批候选的综合得分
+
+        Args:
+            text: 原始文本得分
+            age_seconds: 距今秒数，未知时为 inf
+            importance: 重要性 (1-100)
+            proximity: 关系图接近程度 [0, 1]
+            weights: 完整的权重表
+            half_life: 时间衰减半衰期（秒）
+
+        Returns:
+            np.ndarray: 综合得分
+        """
+        top = text.max(initial=0.0)
+        text_signal = text / top if top > 0 else np.zeros_like(text)
+        recency_signal = np.power(0.5, np.maximum(age_seconds, 0.0) / half_life)
+        importance_signal = np.clip(importance, 0.0, 100.0) / 100.0
+        return (weights['text'] * text_signal
+                + weights['recency'] * recency_signal
+                + weights['importance'] * importance_signal
+                + weights['proximity'] * proximity)
+
+    async def proximity_map(self, character_id: str) -> Dict[str, float]:
+        """
+        从查询角色出发在关系图上逐层扩展，计算到各角色的接近程度
+
+        Returns:
+            dict: 角色ID -> 接近程度，未出现的角色视为0
+        """
+        character_id = canonical_id(character_id)
+        closeness = {character_id: 1.0}
+        frontier = [character_id]
+        for _ in range(self.max_hops):
+            if not frontier:
+                break
+            next_frontier = []
+            for edge in await Relationship.aget_edges(frontier):
+                strength = edge.get('strength') or DEFAULT_RELATIONSHIP_STRENGTH
+                for source, target in ((edge['character_id_1'], edge['character_id_2']),
+                                       (edge['character_id_2'], edge['character_id_1'])):
+                    if source not in closeness:
+                        continue
+                    value = closeness[source] * strength / 100.0
+                    if value > closeness.get(target, 0.0):
+                        if target not in closeness:
+                            next_frontier.append(target)
+                        closeness[target] = value
+            frontier = next_frontier
+        return closeness
+
+    async def rerank(self, events: List[Dict[str, Any]],
+                     character_id: Optional[str] = None,
+                     weights: Optional[Dict[str, float]] = None,
+                     text_key: str = 'relevance',
+                     limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        对候选事件重新打分排序
+
+        Args:
+            events: 候选事件，需包含 event_id、timestamp、importance，文本得分在 text_key 中
+            character_id: 查询角色ID，提供时启用关系图接近程度信号
+            weights: 各项信号的权重，未给出的使用 DEFAULT_WEIGHTS
+            text_key: 文本得分所在的键
+            limit: 最多返回的数量
+
+        Returns:
+            list: 附带 score 综合得分、按其降序排列的事件
+        """
+        weights = resolve_weights(weights)
+        if not events:
+            return []
+
+        now = datetime.now()
+        text = np.array([float(e.get(text_key) or 0.0) for e in events])
+        age_seconds = np.array([
+            (now - e['timestamp']).total_seconds() if isinstance(e.get('timestamp'), datetime) else np.inf
+            for e in events
+        ])
+        importance = np.array([float(e.get('importance') or 1) for e in events])
+
+        proximity = np.zeros(len(events))
+        if character_id and weights['proximity'] > 0:
+            closeness = await self.proximity_map(character_id)
+            participants = await EventCharacter.aget_participants([e['event_id'] for e in events])
+            best = {}
+            for row in participants:
+                value = closeness.get(row['character_id'], 0.0)
+                best[row['event_id']] = max(best.get(row['event_id'], 0.0), value)
+            proximity = np.array([best.get(e['event_id'], 0.0) for e in events])
+
+        scores = self.score(text, age_seconds, importance, proximity, weights, self.half_life)
+        order = np.argsort(-scores, kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        return [{**events[i], 'score': float(scores[i])} for i in order]
@@ -0,0 +1,537 @@
+"""
+进程内关系图，基于 CSR 邻接数组回答多跳邻域、路径和共同关系查询
+"""
+import heapq
+import math
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from src.db.ids import canonical_id
+from src.models import Character, Relationship
+from src.memory.graph_analytics import GraphAnalytics
+from src.memory.ranking import DEFAULT_RELATIONSHIP_STRENGTH
+from src.memory.search_engine import _SyncedIndexEngine
+
+# 多跳查询允许的最大跳数
+MAX_HOPS = 6
+
+# 路径查询方式
+PATH_MODES = ('strongest', 'shortest')
+
+
+class RelationshipGraph:
+    """
+    无向多重关系图
+
+    角色ID和关系类型都被驻留为连续整数编号，边按 relationship_id 保存。
+    查询时使用压缩稀疏行（CSR）邻接数组：indptr[u]:indptr[u+1] 是节点 u
+    的所有邻接槽位，每条边在两个端点各占一个槽位。写入只修改边表并标记
+    CSR 过期，下一次查询时用一次 argsort 整体重建。
+
+    strength 缺失的边按 DEFAULT_RELATIONSHIP_STRENGTH 计。
+    """
+
+    def __init__(self):
+        # CSR 每重建一次加1，派生计算据此判断是否需要更新
+        self.version = 0
+        # 每次清空加1，清空后节点编号重新分配
+        self.generation = -1
+        self.clear()
+
+    def clear(self):
+        """清空关系图"""
+        self.generation += 1
+        self._ids: List[str] = []
+        self._nodes: Dict[str, int] = {}
+        self._type_names: List[str] = []
+        self._types: Dict[str, int] = {}
+        # relationship_id -> (端点1编号, 端点2编号, 类型编号, 强度)
+        self._edges: Dict[str, tuple] = {}
+        self._compiled = False
+
+    def __len__(self):
+        return len(self._edges)
+
+    def _intern_node(self, character_id):
+        node = self._nodes.get(character_id)
+        if node is None:
+            node = len(self._ids)
+            self._ids.append(character_id)
+            self._nodes[character_id] = node
+        return node
+
+    def _intern_type(self, relationship_type):
+        code = self._types.get(relationship_type)
+        if code is None:
+            code = len(self._type_names)
+            self._type_names.append(relationship_type)
+            self._types[relationship_type] = code
+        return code
+
+    def add(self, row: Dict[str, Any]):
+        """加入或替换一条关系"""
+        strength = row.get('strength')
+        self._edges[row['relationship_id']] = (
+            self._intern_node(row['character_id_1']),
+            self._intern_node(row['character_id_2']),
+            self._intern_type(row.get('relationship_type')),
+            float(strength if strength is not None else DEFAULT_RELATIONSHIP_STRENGTH),
+        )
+        self._compiled = False
+
+    def get(self, relationship_id: str) -> Optional[Dict[str, Any]]:
+        """一条关系的端点、类型和强度，不存在时返回 None"""
+        edge = self._edges.get(relationship_id)
+        if edge is None:
+            return None
+        u, v, code, strength = edge
+        return {
+            'relationship_id': relationship_id,
+            'character_id_1': self._ids[u],
+            'character_id_2': self._ids[v],
+            'relationship_type': self._type_names[code],
+            'strength': strength,
+        }
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """所有关系，格式同 get"""
+        return [self.get(relationship_id) for relationship_id in self._edges]
+
+    def remove(self, relationship_id: str):
+        """删除一条关系，不存在时忽略"""
+        if self._edges.pop(relationship_id, None) is not None:
+            self._compiled = False
+
+    def remove_node(self, character_id: str):
+        """删除一个角色的所有关系（角色被删除时数据库会级联删除这些行）"""
+        node = self._nodes.get(character_id)
+        if node is None:
+            return
+        stale = [key for key, (u, v, _, _) in self._edges.items() if node in (u, v)]
+        for key in stale:
+            del self._edges[key]
+        if stale:
+            self._compiled = False
+
+    @property
+    def ids(self) -> List[str]:
+        """节点编号 -> 角色ID；编号只增不减，已删除角色的编号保留为孤立节点"""
+        return self._ids
+
+    @property
+    def type_names(self) -> List[str]:
+        """类型编号 -> 关系类型"""
+        return self._type_names
+
+    def node(self, character_id: str) -> Optional[int]:
+        """角色ID对应的节点编号，不在图中时返回 None"""
+        return self._nodes.get(character_id)
+
+    def compile(self) -> 'RelationshipGraph':
+        """
+        确保 CSR 数组与边表一致
+
+        之后可直接读取 indptr、indices、strengths、type_codes：
+        节点 u 的邻接槽位为 indptr[u]:indptr[u+1]，每个槽位给出邻居编号、
+        关系强度和类型编号。
+        """
+        self._compile()
+        return self
+
+    def _compile(self):
+        """由边表重建 CSR 数组"""
+        if self._compiled:
+            return
+        size = len(self._ids)
+        keys = list(self._edges)
+        if keys:
+            u, v, types, strengths = (np.array(column) for column in zip(*self._edges.values()))
+        else:
+            u = v = types = np.zeros(0, dtype=np.int64)
+            strengths = np.zeros(0)
+        edge_index = np.arange(len(keys))
+        sources = np.concatenate([u, v]).astype(np.int64)
+        targets = np.concatenate([v, u]).astype(np.int64)
+        slots = np.concatenate([edge_index, edge_index])
+        order = np.argsort(sources, kind='stable')
+
+        self.indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=size), out=self.indptr[1:])
+        self.indices = targets[order]
+        self.strengths = strengths[slots[order]]
+        self.type_codes = types[slots[order]].astype(np.int64)
+        self.edge_slots = slots[order]
+        self.edge_keys = keys
+        # 遍历时逐个访问元素，Python 列表比 NumPy 标量快得多
+        self._indptr_list = self.indptr.tolist()
+        self._indices_list = self.indices.tolist()
+        self._strength_list = self.strengths.tolist()
+        self._type_list = self.type_codes.tolist()
+        self._slot_list = self.edge_slots.tolist()
+        self._compiled = True
+        self.version += 1
+
+    def _type_filter(self, relationship_types: Optional[Iterable[str]]):
+        if not relationship_types:
+            return None
+        return {self._types[name] for name in relationship_types if name in self._types}
+
+    def _neighbors(self, node, type_filter, min_strength):
+        """遍历节点的邻接槽位，产出 (邻居, 槽位)"""
+        for slot in range(self._indptr_list[node], self._indptr_list[node + 1]):
+            if type_filter is not None and self._type_list[slot] not in type_filter:
+                continue
+            if min_strength is not None and self._strength_list[slot] < min_strength:
+                continue
+            yield self._indices_list[slot], slot
+
+    def _edge(self, slot, source):
+        """把一个邻接槽位转换为输出用的边信息"""
+        return {
+            'relationship_id': self.edge_keys[self._slot_list[slot]],
+            'from': self._ids[source],
+            'to': self._ids[self._indices_list[slot]],
+            'relationship_type': self._type_names[self._type_list[slot]],
+            'strength': self._strength_list[slot],
+        }
+
+    def _path_edges(self, parents, node):
+        """沿 parents（节点 -> (前驱, 槽位)）回溯出从起点到 node 的边"""
+        edges = []
+        while parents.get(node) is not None:
+            previous, slot = parents[node]
+            edges.append(self._edge(slot, previous))
+            node = previous
+        edges.reverse()
+        return edges
+
+    def k_hop(self, character_id: str, k: int = 2,
+              relationship_types: Optional[Iterable[str]] = None,
+              min_strength: Optional[float] = None,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        广度优先求 k 跳以内的邻域
+
+        Returns:
+            list: [{"character_id", "hops", "strength", "path"}]，按跳数升序、
+                路径强度（各边 strength/100 之积）降序；path 为从起点出发的边
+        """
+        self._compile()
+        start = self._nodes.get(character_id)
+        if start is None:
+            return []
+        type_filter = self._type_filter(relationship_types)
+        hops = {start: 0}
+        closeness = {start: 1.0}
+        parents = {start: None}
+        frontier = [start]
+        for depth in range(1, k + 1):
+            next_frontier = []
+            for node in frontier:
+                for neighbor, slot in self._neighbors(node, type_filter, min_strength):
+                    value = closeness[node] * self._strength_list[slot] / 100.0
+                    if neighbor not in hops:
+                        hops[neighbor] = depth
+                        next_frontier.append(neighbor)
+                    elif hops[neighbor] != depth or value <= closeness[neighbor]:
+                        continue
+                    # 同一层内保留最强的那条路径
+                    closeness[neighbor] = value
+                    parents[neighbor] = (node, slot)
+            frontier = next_frontier
+
+        found = sorted((node for node in hops if node != start), key=lambda n: (hops[n], -closeness[n]))
+        if limit is not None:
+            found = found[:limit]
+        return [
+            {
+                'character_id': self._ids[node],
+                'hops': hops[node],
+                'strength': closeness[node],
+                'path': self._path_edges(parents, node),
+            }
+            for node in found
+        ]
+
+    def path(self, character_id_1: str, character_id_2: str, mode: str = 'strongest',
+             relationship_types: Optional[Iterable[str]] = None,
+             min_strength: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        求两个角色之间的路径
+
+        shortest 为跳数最少的路径（广度优先）；strongest 为各边 strength/100
+        之积最大的路径，即以 -log(strength/100) 为边权的 Dijkstra 最短路。
+
+        Returns:
+            dict: {"hops", "strength", "path"}，不连通时返回 None
+        """
+        if mode not in PATH_MODES:
+            raise ValueError(f"无效的路径查询方式: {mode}，可选值: {', '.join(PATH_MODES)}")
+        self._compile()
+        start = self._nodes.get(character_id_1)
+        goal = self._nodes.get(character_id_2)
+        if start is None or goal is None:
+            return None
+        type_filter = self._type_filter(relationship_types)
+        parents = {start: None}
+
+        if mode == 'shortest':
+            queue = deque([start])
+            while queue and goal not in parents:
+                node = queue.popleft()
+                for neighbor, slot in self._neighbors(node, type_filter, min_strength):
+                    if neighbor not in parents:
+                        parents[neighbor] = (node, slot)
+                        queue.append(neighbor)
+        else:
+            costs = {start: 0.0}
+            heap = [(0.0, start)]
+            done = set()
+            while heap:
+                cost, node = heapq.heappop(heap)
+                if node in done:
+                    continue
+                if node == goal:
+                    break
+                done.add(node)
+                for neighbor, slot in self._neighbors(node, type_filter, min_strength):
+                    candidate = cost - math.log(self._strength_list[slot] / 100.0)
+                    if candidate < costs.get(neighbor, math.inf):
+                        costs[neighbor] = candidate
+                        parents[neighbor] = (node, slot)
+                        heapq.heappush(heap, (candidate, neighbor))
+
+        if goal not in parents:
+            return None
+        edges = self._path_edges(parents, goal)
+        return {
+            'hops': len(edges),
+            'strength': math.prod(edge['strength'] / 100.0 for edge in edges),
+            'path': edges,
+        }
+
+    def common_connections(self, character_id_1: str, character_id_2: str,
+                           relationship_types: Optional[Iterable[str]] = None,
+                           min_strength: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        求与两个角色都有直接关系的角色
+
+        Returns:
+            list: [{"character_id", "relationship_1", "relationship_2"}]，
+                两个角色与该角色之间各取最强的一条关系，按两条关系强度之积降序
+        """
+        self._compile()
+        first = self._nodes.get(character_id_1)
+        second = self._nodes.get(character_id_2)
+        if first is None or second is None:
+            return []
+        type_filter = self._type_filter(relationship_types)
+
+        def strongest_links(node):
+            links = {}
+            for neighbor, slot in self._neighbors(node, type_filter, min_strength):
+                if neighbor not in links or self._strength_list[slot] > self._strength_list[links[neighbor]]:
+                    links[neighbor] = slot
+            return links
+
+        links_1 = strongest_links(first)
+        links_2 = strongest_links(second)
+        shared = (links_1.keys() & links_2.keys()) - {first, second}
+        ordered = sorted(
+            shared,
+            key=lambda n: -self._strength_list[links_1[n]] * self._strength_list[links_2[n]]
+        )
+        return [
+            {
+                'character_id': self._ids[node],
+                'relationship_1': self._edge(links_1[node], first),
+                'relationship_2': self._edge(links_2[node], second),
+            }
+            for node in ordered
+        ]
+
+
+class _NameTable(dict):
+    """角色ID -> 名字"""
+
+    def remove(self, key):
+        self.pop(key, None)
+
+
+class RelationshipGraphEngine(_SyncedIndexEngine):
+    """
+    与数据库同步的关系图
+
+    服务器启动时全量加载 relationships 表和角色名字，之后直接用写入通知携带的数据
+    增量同步，查询完全在内存中完成，不执行任何 SQL。图中的角色ID是规范化的写法，
+    查询参数先经 canonical_id 转换。图分析结果由 analytics 缓存，
+    关系变化后在下一次分析查询时增量更新。
+    """
+
+    entities = {
+        'relationships': (Relationship, 'relationship_id'),
+        'characters': (Character, 'character_id'),
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.analytics = GraphAnalytics(self.graph)
+
+    def _new_index(self, entity):
+        return RelationshipGraph() if entity == 'relationships' else _NameTable()
+
+    def _index_rows(self, entity, rows):
+        if entity == 'relationships':
+            for row in rows:
+                self.indexes[entity].add(row)
+        else:
+            self.indexes[entity].update((row['character_id'], row.get('name')) for row in rows)
+
+    def _get_row(self, entity, key):
+        if entity == 'relationships':
+            return self.graph.get(key)
+        names = self.indexes[entity]
+        return {'character_id': key, 'name': names[key]} if key in names else None
+
+    def _iter_rows(self, entity):
+        if entity == 'relationships':
+            return self.graph.rows()
+        return [{'character_id': key, 'name': name} for key, name in self.indexes[entity].items()]
+
+    def _apply(self, entity, key, deleted, fields):
+        super()._apply(entity, key, deleted, fields)
+        # 删除角色时数据库级联删除其关系，不会产生关系表的写入通知
+        if entity == 'characters' and deleted:
+            self.graph.remove_node(key)
+
+    @property
+    def graph(self) -> RelationshipGraph:
+        return self.indexes['relationships']
+
+    def _name_edges(self, edges):
+        """为边的两端补上角色名字"""
+        names = self.indexes['characters']
+        for edge in edges:
+            edge['from_name'] = names.get(edge['from'])
+            edge['to_name'] = names.get(edge['to'])
+        return edges
+
+    async def k_hop(self, character_id: str, k: int = 2,
+                    relationship_types: Optional[List[str]] = None,
+                    min_strength: Optional[float] = None,
+                    limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """k 跳邻域，参数和返回值同 RelationshipGraph.k_hop，结果附带角色名字"""
+        await self.ensure_built()
+        character_id = canonical_id(character_id)
+        result = self.graph.k_hop(character_id, k, relationship_types, min_strength, limit)
+        names = self.indexes['characters']
+        for item in result:
+            item['name'] = names.get(item['character_id'])
+            self._name_edges(item['path'])
+        return result
+
+    async def path(self, character_id_1: str, character_id_2: str, mode: str = 'strongest',
+                   relationship_types: Optional[List[str]] = None,
+                   min_strength: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """两个角色之间的路径，参数和返回值同 RelationshipGraph.path，边附带角色名字"""
+        await self.ensure_built()
+        character_id_1, character_id_2 = canonical_id(character_id_1), canonical_id(character_id_2)
+        result = self.graph.path(character_id_1, character_id_2, mode, relationship_types, min_strength)
+        if result is not None:
+            self._name_edges(result['path'])
+        return result
+
+    async def common_connections(self, character_id_1: str, character_id_2: str,
+                                 relationship_types: Optional[List[str]] = None,
+                                 min_strength: Optional[float] = None) -> List[Dict[str, Any]]:
+        """共同关系，参数和返回值同 RelationshipGraph.common_connections，结果附带角色名字"""
+        await self.ensure_built()
+        character_id_1, character_id_2 = canonical_id(character_id_1), canonical_id(character_id_2)
+        result = self.graph.common_connections(character_id_1, character_id_2, relationship_types, min_strength)
+        names = self.indexes['characters']
+        for item in result:
+            item['name'] = names.get(item['character_id'])
+            self._name_edges([item['relationship_1'], item['relationship_2']])
+        return result
+
+    def _describe(self, node, **metrics):
+        """节点编号 -> 带名字的角色条目"""
+        return {'character_id': self.graph.ids[node], 'name': self.indexes['characters'].get(self.graph.ids[node]), **metrics}
+
+    async def world_stats(self, top_n: int = 10) -> Dict[str, Any]:
+        """
+        关系图整体统计
+
+        Args:
+            top_n: 各排行榜和社群列表的长度，也是每个社群列出的成员数
+
+        Returns:
+            dict: 角色数、关系数、密度、各类型关系数、加权度和 PageRank 排行、
+                社群列表（按大小降序，成员按 PageRank 降序）及模块度
+        """
+        await self.ensure_built()
+        analytics = self.analytics
+        analytics.update()
+        communities = analytics.communities()
+        return {
+            'characters': len(self.indexes['characters']),
+            'connected_characters': int(analytics.active.sum()),
+            'relationships': len(self.graph),
+            'density': analytics.density(),
+            'relationship_types': analytics.type_counts(),
+            'top_by_weighted_degree': [
+                self._describe(node, weighted_degree=float(analytics.weighted_degree[node]),
+                               degree=int(analytics.degree[node]))
+                for node in analytics.top('weighted_degree', top_n)
+            ],
+            'top_by_pagerank': [
+                self._describe(node, pagerank=analytics.node_metrics(node)['pagerank'])
+                for node in analytics.top('pagerank', top_n)
+            ],
+            'community_count': len(communities),
+            'modularity': analytics.modularity(),
+            'communities': [
+                {
+                    'community': number,
+                    'size': len(members),
+                    'members': [self._describe(node) for node in analytics.top('pagerank', top_n, members)],
+                }
+                for number, members in list(communities.items())[:top_n]
+            ],
+        }
+
+    async def influence(self, character_id: str, member_limit: int = 10) -> Optional[Dict[str, Any]]:
+        """
+        单个角色的影响力指标
+
+        Args:
+            character_id: 角色ID
+            member_limit: 列出的同社群成员数
+
+        Returns:
+            dict: 度、加权度、PageRank 及其排名、所在社群及其主要成员，角色不存在时返回 None
+        """
+        await self.ensure_built()
+        character_id = canonical_id(character_id)
+        if character_id not in self.indexes['characters']:
+            return None
+        analytics = self.analytics
+        analytics.update()
+        node = self.graph.node(character_id)
+        if node is None or not analytics.active[node]:
+            return {
+                'character_id': character_id, 'name': self.indexes['characters'][character_id],
+                'degree': 0, 'weighted_degree': 0.0, 'pagerank': 0.0, 'pagerank_rank': None,
+                'community': None,
+            }
+        metrics = analytics.node_metrics(node)
+        result = self._describe(node, **metrics)
+        members = analytics.communities()[metrics['community']]
+        result['community_size'] = len(members)
+        result['community_members'] = [
+            self._describe(member) for member in analytics.top('pagerank', member_limit + 1, members)
+            if member != node
+        ][:member_limit]
+        return result
@@ -0,0 +1,340 @@
+"""
+记忆检索引擎，按相关度检索角色、地点和事件
+
+FullTextSearchEngine 使用 MySQL FULLTEXT (ngram) 索引；
+BM25SearchEngine 和 SemanticSearchEngine 在进程内维护倒排索引/向量索引，检索不访问数据库。
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Any, List
+
+from src.models import Character, Location, Event, hooks
+from src.memory.bm25 import BM25Index
+from src.memory.embedding import Embedder, HashingEmbedder
+from src.memory.vector_index import VectorIndex
+
+
+class FullTextSearchEngine:
+    """
+    全文检索引擎
+
+    检索走 FULLTEXT 索引而不是逐行 LIKE 扫描，成本不随数据量线性增长，
+    结果附带 relevance 相关度并按其降序排列。三类实体的检索并发执行。
+    """
+
+    name = 'fulltext'
+
+    async def search(self, query: str,
+                     search_characters: bool = True,
+                     search_locations: bool = True,
+                     search_events: bool = True,
+                     limit: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        检索记忆知识库
+
+        Args:
+            query: 搜索关键词
+            search_characters: 是否搜索角色
+            search_locations: 是否搜索地点
+            search_events: 是否搜索事件
+            limit: 每类结果的最大数量
+
+        Returns:
+            dict: {"characters"?, "locations"?, "events"?}
+        """
+        searches = {}
+        if search_characters:
+            searches["characters"] = Character.asearch(query, limit)
+        if search_locations:
+            searches["locations"] = Location.asearch(query, limit)
+        if search_events:
+            searches["events"] = Event.asearch_events(query, limit)
+
+        values = await asyncio.gather(*searches.values())
+        return dict(zip(searches.keys(), values))
+
+
+class _SyncedIndexEngine(ABC):
+    """
+    进程内索引引擎的公共部分：全量加载与增量同步
+
+    服务器启动时调用 build 从数据库全量加载各实体建立索引（未调用时在首次检索时加载），
+    之后通过 src.models.hooks 接收写入通知，直接用通知携带的数据更新索引：删除立即移除，
+    新建按通知中的整行数据加入，修改把字段合并到索引中保存的行后重新索引。
+    检索完全在内存中完成，不访问数据库。
+
+    子类定义 entities 并实现 _new_index、_index_rows、_get_row 和 _iter_rows，
+    缺少任一方法的子类在实例化时即报错。
+    """
+
+    # 事件全量加载时每页读取的行数
+    load_page_size = 1000
+
+    # 表名 -> (模型, 主键列)
+    entities: Dict[str, Any] = {}
+
+    # 删除一行时由外键 ON DELETE SET NULL 连带置空的列：表名 -> [(受影响的表, 列)]
+    set_null_cascades = {
+        'locations': [('events', 'location_id'), ('locations', 'parent_location_id')],
+    }
+
+    # 通知中以字符串给出、数据库中为 DATETIME/TIMESTAMP 的列
+    datetime_columns = ('timestamp',)
+
+    def __init__(self):
+        self.indexes = {entity: self._new_index(entity) for entity in self.entities}
+        # 全量加载期间收到的写入通知，加载完成后重放，避免加载读到的旧行覆盖新的写入
+        self._pending = None
+        self._built = False
+        # 收到不带数据的写入通知后置位，下一次检索前全量重新加载
+        self._stale = False
+        self._lock = asyncio.Lock()
+        hooks.subscribe(self._on_change)
+
+    @abstractmethod
+    def _new_index(self, entity):
+        """创建实体的空索引"""
+
+    @abstractmethod
+    def _index_rows(self, entity, rows):
+        """把一批行加入（或替换到）实体的索引中"""
+
+    @abstractmethod
+    def _get_row(self, entity, key):
+        """索引中保存的行，不存在时返回 None"""
+
+    @abstractmethod
+    def _iter_rows(self, entity):
+        """索引中保存的所有行"""
+
+    def _on_change(self, entity, key, deleted, fields=None):
+        """数据变更回调，用通知携带的数据更新索引，不访问数据库"""
+        if self._pending is not None:
+            self._pending.append((entity, key, deleted, fields))
+        self._apply(entity, key, deleted, fields)
+
+    def _apply(self, entity, key, deleted, fields):
+        """把一次写入应用到索引，重复应用结果相同"""
+        if entity in self.indexes:
+            _, key_column = self.entities[entity]
+            if deleted:
+                self.indexes[entity].remove(key)
+            elif fields is None:
+                self._stale = True
+            else:
+                row = self._get_row(entity, key)
+                # 索引中没有的行只接受带主键的整行数据（新建），忽略对不存在的行的修改
+                if row is not None or key_column in fields:
+                    self._index_rows(entity, [self._coerce({**(row or {}), **fields, key_column: key})])
+        if deleted:
+            for table, column in self.set_null_cascades.get(entity, ()):
+                if table in self.indexes:
+                    stale = [row for row in self._iter_rows(table) if row.get(column) == key]
+                    self._index_rows(table, [{**row, column: None} for row in stale])
+
+    def _coerce(self, row):
+        """把通知中字符串形式的时间转换为 datetime，与从数据库读出的行一致"""
+        for column in self.datetime_columns:
+            value = row.get(column)
+            if isinstance(value, str):
+                try:
+                    row[column] = datetime.fromisoformat(value)
+                except ValueError:
+                    pass
+        return row
+
+    async def _load_all(self, entity):
+        """全量读取一张表的所有行"""
+        model, _ = self.entities[entity]
+        if model is not Event:
+            return await model.aget_all()
+        rows = []
+        after = None
+        while True:
+            page = await Event.aget_page(limit=self.load_page_size, after=after)
+            rows.extend(page)
+            if len(page) < self.load_page_size:
+                return rows
+            after = (page[-1]['timestamp'], page[-1]['event_id'])
+
+    async def build(self):
+        """从数据库全量重建索引，服务器启动时调用"""
+        async with self._lock:
+            await self._rebuild()
+
+    async def _rebuild(self):
+        self._stale = False
+        for entity in self.entities:
+            self._pending = []
+            try:
+                rows = await self._load_all(entity)
+            finally:
+                pending, self._pending = self._pending, None
+            self.indexes[entity].clear()
+            self._index_rows(entity, rows)
+            for change in pending:
+                self._apply(*change)
+        self._built = True
+
+    async def ensure_built(self):
+        """尚未建立索引时全量加载，已建立时直接返回"""
+        if self._built and not self._stale:
+            return
+        async with self._lock:
+            if not self._built or self._stale:
+                await self._rebuild()
+
+
+class BM25SearchEngine(_SyncedIndexEngine):
+    """
+    进程内 BM25 检索引擎
+
+    对角色、地点和事件的 search_columns 建立 CJK n-gram 倒排索引，
+    索引同时保存整行数据，命中后无需回表。
+    """
+
+    name = 'bm25'
+
+    entities = {
+        'characters': (Character, 'character_id'),
+        'locations': (Location, 'location_id'),
+        'events': (Event, 'event_id'),
+    }
+
+    def _new_index(self, entity):
+        return BM25Index()
+
+    def _index_rows(self, entity, rows):
+        model, key_column = self.entities[entity]
+        for row in rows:
+            text = "\n".join(str(row[column]) for column in model.search_columns if row.get(column))
+            self.indexes[entity].add(row[key_column], text, row)
+
+    def _get_row(self, entity, key):
+        return self.indexes[entity].get(key)
+
+    def _iter_rows(self, entity):
+        return self.indexes[entity].docs()
+
+    def _search_index(self, entity, query, limit):
+        index = self.indexes[entity]
+        return [
+            {**index.get(doc_id), 'relevance': score}
+            for doc_id, score in index.search(query, limit)
+        ]
+
+    async def search(self, query: str,
+                     search_characters: bool = True,
+                     search_locations: bool = True,
+                     search_events: bool = True,
+                     limit: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        检索记忆知识库，参数和返回值同 FullTextSearchEngine.search
+
+        Returns:
+            dict: {"characters"?, "locations"?, "events"?}，relevance 为 BM25 得分
+        """
+        await self.ensure_built()
+        result = {}
+        if search_characters:
+            result["characters"] = self._search_index('characters', query, limit)
+        if search_locations:
+            result["locations"] = self._search_index('locations', query, limit)
+        if search_events:
+            result["events"] = self._search_index('events', query, limit)
+        return result
+
+
+class _VectorStore:
+    """一个实体的向量索引及对应的行数据"""
+
+    def __init__(self, index: VectorIndex):
+        self.index = index
+        self.rows: Dict[Any, Dict[str, Any]] = {}
+
+    def remove(self, key):
+        self.index.remove(key)
+        self.rows.pop(key, None)
+
+    def clear(self):
+        self.index.clear()
+        self.rows.clear()
+
+
+class SemanticSearchEngine(_SyncedIndexEngine):
+    """
+    进程内语义检索引擎
+
+    用本地 Embedder 把事件的标题、描述和角色的背景故事向量化，存入 NumPy 向量索引，
+    按余弦相似度检索，可以召回与查询用词不同但内容相近的记忆。
+    """
+
+    name = 'semantic'
+
+    entities = {
+        'characters': (Character, 'character_id'),
+        'events': (Event, 'event_id'),
+    }
+
+    # 参与向量化的列
+    text_columns = {
+        'characters': ('name', 'backstory'),
+        'events': ('title', 'description'),
+    }
+
+    def __init__(self, embedder: Embedder = None, ivf_threshold: int = 100_000, nprobe: int = 8):
+        self.embedder = embedder or HashingEmbedder()
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        super().__init__()
+
+    def _new_index(self, entity):
+        return _VectorStore(VectorIndex(self.embedder.dim, self.ivf_threshold, self.nprobe))
+
+    def _index_rows(self, entity, rows):
+        if not rows:
+            return
+        _, key_column = self.entities[entity]
+        columns = self.text_columns[entity]
+        texts = ["\n".join(str(row[column]) for column in columns if row.get(column)) for row in rows]
+        keys = [row[key_column] for row in rows]
+        store = self.indexes[entity]
+        store.index.add_many(keys, self.embedder.embed(texts))
+        store.rows.update(zip(keys, rows))
+
+    def _get_row(self, entity, key):
+        return self.indexes[entity].rows.get(key)
+
+    def _iter_rows(self, entity):
+        return list(self.indexes[entity].rows.values())
+
+    async def search(self, query: str,
+                     search_characters: bool = True,
+                     search_events: bool = True,
+                     limit: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        按语义相似度检索角色和事件
+
+        Args:
+            query: 查询文本
+            search_characters: 是否搜索角色
+            search_events: 是否搜索事件
+            limit: 每类结果的最大数量
+
+        Returns:
+            dict: {"characters"?, "events"?}，similarity 为余弦相似度
+        """
+        await self.ensure_built()
+        query_vector = self.embedder.embed([query])
+        result = {}
+        for entity, enabled in (('characters', search_characters), ('events', search_events)):
+            if not enabled:
+                continue
+            store = self.indexes[entity]
+            hits = store.index.search(query_vector, limit)[0]
+            result[entity] = [
+                {**store.rows[key], 'similarity': score}
+                for key, score in hits if score > 0
+            ]
+        return result
@@ -0,0 +1,267 @@
+"""
+角色和地点上下文的物化快照，数据变更时按依赖关系增量失效
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from src.db.ids import canonical_id
+from src.models import hooks
+
+# 依赖键中表示"该表任意一行"的通配主键
+ANY = '*'
+
+# 会改变事件在列表中先后顺序或时间窗口归属的字段
+EVENT_ORDERING_FIELDS = {'timestamp', 'importance'}
+
+# 依赖键：(表名或派生集合名, 主键)
+#   ('characters', C)               角色行
+#   ('character_relationships', C)  C 参与的关系集合（新增关系时失效）
+#   ('character_skills', C)         C 的技能集合
+#   ('event_characters', C)         C 参与的事件集合
+#   ('location_children', L)        L 的子地点集合（新增或移入子地点时失效）
+#   ('location_events', L)          发生在 L 的事件集合（新增或移入事件时失效）
+#   ('region_events', ANY)          任意地点子树的事件集合（新增或移入事件、地点改变上级或被删除时失效）
+#   ('events', ANY)                 任意事件的排序字段被修改（仅事件窗口已满或带时间窗口的快照依赖）
+Dependency = Tuple[str, Hashable]
+
+
+def character_dependencies(character_id: str, context: Dict[str, Any],
+                           windowed: bool) -> set:
+    """
+    从组装好的角色上下文推导其依赖键
+
+    Args:
+        character_id: 角色ID
+        context: 角色上下文
+        windowed: 事件列表是否可能被排序字段的修改改变（窗口已满或带时间窗口）
+    """
+    # 变更通知中的键已规范化，依赖键也要用同样的写法
+    character_id = canonical_id(character_id)
+    deps = {('characters', character_id)}
+    if 'relationships' in context:
+        deps.add(('character_relationships', character_id))
+        for r in context['relationships']:
+            deps.add(('relationships', r['relationship_id']))
+            # 关系中带有对方角色的名字
+            deps.add(('characters', r['character_id_1']))
+            deps.add(('characters', r['character_id_2']))
+    if 'skills' in context:
+        deps.add(('character_skills', character_id))
+        deps.update(('skills', s['skill_id']) for s in context['skills'])
+    if 'events' in context:
+        deps.add(('event_characters', character_id))
+        for e in context['events']:
+            deps.add(('events', e['event_id']))
+            if e.get('location_id'):
+                deps.add(('locations', e['location_id']))
+        if windowed:
+            deps.add(('events', ANY))
+    return deps
+
+
+def location_dependencies(location_id: str, context: Dict[str, Any],
+                          windowed: bool, subtree: bool = False) -> set:
+    """
+    从组装好的地点上下文推导其依赖键
+
+    Args:
+        location_id: 地点ID
+        context: 地点上下文
+        windowed: 事件列表是否可能被排序字段的修改改变
+        subtree: 事件列表是否来自整棵地点子树
+    """
+    location_id = canonical_id(location_id)
+    deps = {('locations', location_id), ('location_children', location_id)}
+    deps.update(('locations', c['location_id']) for c in context.get('child_locations', ()))
+    if 'events' in context:
+        # 变更通知里只有事件的直接地点，无法判断它属于哪些区域，子树事件只能按通配失效
+        deps.add(('region_events', ANY) if subtree else ('location_events', location_id))
+        deps.update(('events', e['event_id']) for e in context['events'])
+        if windowed:
+            deps.add(('events', ANY))
+    return deps
+
+
+def affected_dependencies(entity: str, key: Hashable, deleted: bool,
+                          fields: Optional[Dict[str, Any]]) -> Iterable[Dependency]:
+    """
+    把一次数据变更通知翻译为受影响的依赖键
+
+    Args:
+        entity, key, deleted, fields: 同 hooks 监听函数的参数
+    """
+    fields = fields or {}
+    if key is not None:
+        yield (entity, key)
+
+    if entity == 'relationships':
+        for column in ('character_id_1', 'character_id_2'):
+            if fields.get(column):
+                yield ('character_relationships', fields[column])
+    elif entity == 'event_characters':
+        # 键为 None 时（删除事件的所有参与者）只知道 event_id
+        if fields.get('event_id'):
+            yield ('events', fields['event_id'])
+    elif entity == 'locations':
+        if fields.get('parent_location_id'):
+            yield ('location_children', fields['parent_location_id'])
+        # 地点被删除时其事件经外键置空 location_id，不会有事件的变更通知
+        if deleted or 'parent_location_id' in fields:
+            yield ('region_events', ANY)
+    elif entity == 'events':
+        if fields.get('location_id'):
+            yield ('location_events', fields['location_id'])
+            yield ('region_events', ANY)
+        # 新建时 fields 为包含主键的整行，新事件还没有参与者，也只会通过
+        # location_events 影响地点快照；修改排序字段则可能让窗口外的事件进入窗口
+        created = 'event_id' in fields
+        if not deleted and not created and (not fields or EVENT_ORDERING_FIELDS & fields.keys()):
+            yield ('events', ANY)
+
+
+class ContextSnapshotStore:
+    """
+    上下文快照存储
+
+    以 (类型, 实体ID, 组装参数) 为键保存组装好的上下文，命中时读路径只有一次字典查找。
+    每份快照在写入时登记它所依赖的行和集合（见 character_dependencies /
+    location_dependencies），通过 src.models.hooks 收到变更通知后只失效依赖了
+    被修改数据的快照，下次读取时再按需重建。
+
+    与 EntityCache 相同，回填时需带上组装前取得的 epoch，期间发生过失效则放弃回填，
+    避免旧数据覆盖刚失效的快照。ttl 用于兜底绕过本进程的写入。
+    """
+
+    def __init__(self, maxsize=256, ttl=300.0):
+        self.maxsize = max(0, maxsize)
+        self.ttl = ttl if ttl and ttl > 0 else None
+        # 快照键 -> (上下文, 依赖键集合, 过期时间)
+        self._entries = OrderedDict()
+        # 依赖键 -> 依赖它的快照键集合
+        self._dependents = {}
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        hooks.subscribe(self.on_change)
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    @property
+    def epoch(self):
+        """当前失效计数，组装上下文前获取，回填时传回"""
+        return self._epoch
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """
+        读取快照
+
+        Returns:
+            dict: 快照的浅拷贝，未命中、已失效或已过期时返回 None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            context, _, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(context)
+
+    def put(self, key: Hashable, context: Dict[str, Any], dependencies: Iterable[Dependency], epoch: int):
+        """
+        保存快照
+
+        Args:
+            key: 快照键
+            context: 组装好的上下文，保存后不应再被修改
+            dependencies: 依赖键
+            epoch: 组装前取得的 epoch
+        """
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        dependencies = frozenset(dependencies)
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            self._drop(key)
+            self._entries[key] = (dict(context), dependencies, expires_at)
+            for dependency in dependencies:
+                self._dependents.setdefault(dependency, set()).add(key)
+            self.rebuilds += 1
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        """移除一份快照及其依赖登记，调用方需持有锁"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        for dependency in entry[1]:
+            dependents = self._dependents.get(dependency)
+            if dependents is not None:
+                dependents.discard(key)
+                if not dependents:
+                    del self._dependents[dependency]
+        return True
+
+    def invalidate(self, dependencies: Iterable[Dependency]):
+        """失效依赖了任一给定依赖键的快照"""
+        with self._lock:
+            self._epoch += 1
+            for dependency in dependencies:
+                for key in list(self._dependents.get(dependency, ())):
+                    if self._drop(key):
+                        self.invalidations += 1
+
+    def clear(self):
+        """清空所有快照"""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._dependents.clear()
+
+    def on_change(self, entity, key, deleted, fields=None):
+        """数据变更回调"""
+        self.invalidate(affected_dependencies(entity, key, deleted, fields))
+
+    def get_stats(self):
+        """
+        获取快照统计
+
+        Returns:
+            dict: 容量、快照数、命中率及各项计数
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'size': len(self._entries),
+                'dependencies': len(self._dependents),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'rebuilds': self.rebuilds,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,273 @@
+"""
+基于 NumPy 的内存向量索引，支持增量增删和可选的 IVF 分区检索
+"""
+import asyncio
+import logging
+import math
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndex:
+    """
+    内积向量索引
+
+    向量按行存放在一个预分配的连续矩阵中，删除时用最后一行填补空位，
+    检索是一次 (q, dim) × (dim, n) 的矩阵乘法加 argpartition 取 top-k。
+
+    向量数达到 ivf_threshold 后用 k-means 把向量划分为约 sqrt(n) 个分区（IVF），
+    检索时只扫描与查询最接近的 nprobe 个分区，以少量召回率换取亚线性的扫描量。
+    分区在向量数翻倍时重新训练，期间新增的向量直接归入最近的分区。
+
+    k-means 的代价与向量数成正比，在事件循环中调用时交给线程池执行，训练期间
+    继续使用旧的质心（首次训练完成前为精确扫描）检索，训练完成后再切换；
+    没有运行中的事件循环时（如脚本中使用）同步训练。
+    """
+
+    def __init__(self, dim: int, ivf_threshold: int = 100_000, nprobe: int = 8,
+                 kmeans_iterations: int = 10, seed: int = 0):
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.kmeans_iterations = kmeans_iterations
+        self._rng = np.random.default_rng(seed)
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._ids: List[Hashable] = []
+        self._rows: Dict[Hashable, int] = {}
+        # IVF 状态：质心矩阵及每行所属分区
+        self._centroids = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._trained_size = 0
+        # 每个分区包含的行号，写入后失效，检索时按需重建
+        self._lists = None
+        # 后台训练：进行中的训练任务、训练开始后写入过的ID，以及用于丢弃过期训练结果的代数
+        self._training: Optional[asyncio.Future] = None
+        self._touched = set()
+        self._generation = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def _reserve(self, size):
+        """保证矩阵容量至少为 size 行，按倍数扩容"""
+        capacity = self._vectors.shape[0]
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 64)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:len(self._ids)] = self._vectors[:len(self._ids)]
+        self._vectors = vectors
+        assignments = np.zeros(capacity, dtype=np.int32)
+        assignments[:len(self._ids)] = self._assignments[:len(self._ids)]
+        self._assignments = assignments
+
+    def add(self, key: Hashable, vector: np.ndarray):
+        """加入或替换一个向量"""
+        self.add_many([key], np.asarray(vector, dtype=np.float32).reshape(1, -1))
+
+    def add_many(self, keys: List[Hashable], vectors: np.ndarray):
+        """
+        批量加入或替换向量
+
+        Args:
+            keys: 向量ID列表
+            vectors: 形状为 (len(keys), dim) 的矩阵
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        new_rows = []
+        for key, vector in zip(keys, vectors):
+            row = self._rows.get(key)
+            if row is None:
+                row = len(self._ids)
+                self._reserve(row + 1)
+                self._ids.append(key)
+                self._rows[key] = row
+            self._vectors[row] = vector
+            new_rows.append(row)
+        self._lists = None
+        if self._training is not None:
+            self._touched.update(keys)
+
+        if self._centroids is not None and new_rows:
+            rows = np.array(new_rows)
+            self._assignments[rows] = self._nearest_centroids(self._vectors[rows], 1)[:, 0]
+        self._maybe_train()
+
+    def remove(self, key: Hashable):
+        """删除一个向量，不存在时忽略"""
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self._ids) - 1
+        if row != last:
+            moved = self._ids[last]
+            self._vectors[row] = self._vectors[last]
+            self._assignments[row] = self._assignments[last]
+            self._ids[row] = moved
+            self._rows[moved] = row
+        self._ids.pop()
+        self._lists = None
+
+    def clear(self):
+        """清空索引"""
+        self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._ids = []
+        self._rows = {}
+        self._centroids = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._trained_size = 0
+        self._lists = None
+        self._training = None
+        self._touched = set()
+        self._generation += 1
+
+    @property
+    def training(self) -> Optional[asyncio.Future]:
+        """进行中的后台训练任务，没有时为 None"""
+        return self._training
+
+    def _nearest_centroids(self, vectors, count):
+        scores = vectors @ self._centroids.T
+        count = min(count, scores.shape[1])
+        return np.argpartition(-scores, count - 1, axis=1)[:, :count]
+
+    def _maybe_train(self):
+        size = len(self._ids)
+        if size < self.ivf_threshold:
+            if self._centroids is not None or self._training is not None:
+                self._centroids = None
+                self._training = None
+                self._generation += 1
+            return
+        if self._training is not None:
+            return
+        if self._centroids is None or size >= 2 * self._trained_size:
+            self._train()
+
+    def _train(self):
+        """对当前向量的副本训练 IVF 分区，有运行中的事件循环时在线程池中执行"""
+        size = len(self._ids)
+        data = self._vectors[:size].copy()
+        ids = list(self._ids)
+        seed = int(self._rng.integers(2 ** 32))
+        generation = self._generation
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._install(ids, *self._kmeans(data, seed))
+            return
+        self._touched = set()
+        self._training = loop.run_in_executor(None, self._kmeans, data, seed)
+        self._training.add_done_callback(lambda future: self._finish_training(future, ids, generation))
+
+    def _kmeans(self, data, seed):
+        """
+        球面 k-means，只读取传入的副本，可以在其他线程中执行
+
+        Returns:
+            tuple: (质心矩阵, 每行所属分区)
+        """
+        rng = np.random.default_rng(seed)
+        size = len(data)
+        nlist = max(1, int(math.sqrt(size)))
+        centroids = data[rng.choice(size, nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            assignments = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, data)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # 空分区保留原质心
+            nonempty = norms[:, 0] > 0
+            centroids[nonempty] = sums[nonempty] / norms[nonempty]
+        return centroids, np.argmax(data @ centroids.T, axis=1).astype(np.int32)
+
+    def _finish_training(self, future, ids, generation):
+        """后台训练完成后在事件循环中切换到新的质心"""
+        if generation != self._generation or future is not self._training:
+            return
+        self._training = None
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.error(f"向量索引分区训练失败: {future.exception()}")
+            return
+        self._install(ids, *future.result())
+        self._maybe_train()
+
+    def _install(self, ids, centroids, assignments):
+        """
+        启用训练得到的质心
+
+        训练开始后未被修改的向量沿用训练时的分区，新增或替换过的向量重新归入最近的分区。
+        """
+        trained = dict(zip(ids, assignments.tolist()))
+        touched, self._touched = self._touched, set()
+        stale = []
+        for row, key in enumerate(self._ids):
+            partition = None if key in touched else trained.get(key)
+            if partition is None:
+                stale.append(row)
+            else:
+                self._assignments[row] = partition
+        self._centroids = centroids
+        if stale:
+            rows = np.array(stale)
+            self._assignments[rows] = self._nearest_centroids(self._vectors[rows], 1)[:, 0]
+        self._trained_size = len(ids)
+        self._lists = None
+
+    def _inverted_lists(self):
+        """按分区分组的行号列表"""
+        if self._lists is None:
+            assignments = self._assignments[:len(self._ids)]
+            order = np.argsort(assignments, kind='stable')
+            bounds = np.searchsorted(assignments[order], np.arange(1, len(self._centroids)))
+            self._lists = np.split(order, bounds)
+        return self._lists
+
+    def search(self, queries: np.ndarray, limit: int = 5) -> List[List[Tuple[Hashable, float]]]:
+        """
+        批量检索内积最大的向量
+
+        Args:
+            queries: 形状为 (q, dim) 的查询矩阵
+            limit: 每个查询最多返回的数量
+
+        Returns:
+            list: 每个查询一个 [(key, score)] 列表，按得分降序
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        size = len(self._ids)
+        if not size or limit <= 0:
+            return [[] for _ in range(len(queries))]
+
+        if self._centroids is None:
+            return self._top_k(queries @ self._vectors[:size].T, np.arange(size), limit)
+
+        # IVF：每个查询只扫描最近的 nprobe 个分区内的向量
+        probes = self._nearest_centroids(queries, self.nprobe)
+        inverted_lists = self._inverted_lists()
+        results = []
+        for query, lists in zip(queries, probes):
+            candidates = np.concatenate([inverted_lists[p] for p in lists])
+            scores = (self._vectors[candidates] @ query)[np.newaxis, :]
+            results.extend(self._top_k(scores, candidates, limit))
+        return results
+
+    def _top_k(self, scores, rows, limit):
+        """从 (q, m) 得分矩阵中取每行的 top-k，rows 为列对应的向量行号"""
+        count = min(limit, scores.shape[1])
+        if count == 0:
+            return [[] for _ in range(len(scores))]
+        top = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+        results = []
+        for query_scores, columns in zip(scores, top):
+            columns = columns[np.argsort(-query_scores[columns])]
+            results.append([(self._ids[rows[c]], float(query_scores[c])) for c in columns])
+        return results
@@ -8,4 +8,5 @@ from .character_skill import CharacterSkill
 from .location import Location
 from .relationship import Relationship
 from .event import Event
+from .event_region import EventRegion
 from .event_character import EventCharacter
\ No newline at end of file
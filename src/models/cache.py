@@ -0,0 +1,164 @@
+"""
+实体缓存模块，为 get_by_id 提供带容量上限和过期时间的读穿透缓存
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from config.database import CACHE_CONFIG
+from src.db.ids import canonical_id
+from src.models import hooks
+
+# 删除某行时由外键 ON DELETE CASCADE / SET NULL 连带改变的缓存行：
+# 表名 -> [(受影响的表, 引用该表主键的列)]
+CASCADES = {
+    'characters': [
+        ('relationships', 'character_id_1'),
+        ('relationships', 'character_id_2'),
+    ],
+    'locations': [
+        ('events', 'location_id'),
+        ('locations', 'parent_location_id'),
+    ],
+}
+
+
+class EntityCache:
+    """
+    线程安全的 LRU + TTL 实体缓存
+
+    键为 (表名, 规范化的主键)，值为查询得到的行，大写或旧写法的ID与查询结果中的
+    写法命中同一个条目。通过 src.models.hooks 接收写入通知并失效
+    对应条目，删除时按 CASCADES 一并失效被外键连带修改的行。
+
+    为避免"读到旧值 → 写入并失效 → 旧值回填"的竞争，回填时需带上读取前取得的
+    epoch，期间发生过任何失效则放弃回填。
+    """
+
+    def __init__(self, maxsize=1024, ttl=300.0):
+        self.maxsize = max(0, maxsize)
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    @property
+    def epoch(self):
+        """当前失效计数，读取数据库前获取，回填时传回"""
+        return self._epoch
+
+    def get(self, table, key):
+        """
+        读取缓存
+
+        Returns:
+            dict: 缓存行的副本，未命中或已过期时返回 None
+        """
+        if not self.enabled:
+            return None
+        key = canonical_id(key)
+        with self._lock:
+            entry = self._entries.get((table, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            row, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[(table, key)]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end((table, key))
+            self.hits += 1
+            return dict(row)
+
+    def put(self, table, key, row, epoch):
+        """
+        回填缓存
+
+        Args:
+            table (str): 表名
+            key: 主键
+            row (dict): 查询得到的行
+            epoch (int): 读取数据库前取得的 epoch
+        """
+        if not self.enabled:
+            return
+        key = canonical_id(key)
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            self._entries[(table, key)] = (dict(row), expires_at)
+            self._entries.move_to_end((table, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, table, key):
+        """失效一个条目"""
+        key = canonical_id(key)
+        with self._lock:
+            self._epoch += 1
+            if self._entries.pop((table, key), None) is not None:
+                self.invalidations += 1
+
+    def invalidate_referencing(self, table, column, key):
+        """失效 table 中 column 等于 key 的所有条目"""
+        key = canonical_id(key)
+        with self._lock:
+            self._epoch += 1
+            stale = [
+                cache_key for cache_key, (row, _) in self._entries.items()
+                if cache_key[0] == table and row.get(column) == key
+            ]
+            for cache_key in stale:
+                del self._entries[cache_key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def on_change(self, entity, key, deleted, fields=None):
+        """数据变更回调"""
+        self.invalidate(entity, key)
+        if deleted:
+            for table, column in CASCADES.get(entity, ()):
+                self.invalidate_referencing(table, column, key)
+
+    def get_stats(self):
+        """
+        获取缓存统计
+
+        Returns:
+            dict: 容量、条目数、命中率及各项计数
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+
+entity_cache = EntityCache(**CACHE_CONFIG)
+hooks.subscribe(entity_cache.on_change)
@@ -1,11 +1,28 @@
 """
 角色模型类，用于管理角色的CRUD操作
 """
-from src.db import db
+from src.db import db, adb
+from src.db.ids import canonical_id, encode_id, encode_ids
+from src.models import hooks
+from src.models.cache import entity_cache
+from src.models.sql_utils import build_keyset_clause, build_patch_query, build_text_search
 
 class Character:
     """角色模型类"""
     
+    # 允许通过 update 修改的字段
+    valid_attributes = [
+        'name', 'played_by', 'age', 'gender', 'occupation', 
+        'appearance', 'voice_tone', 'voice_style', 'mannerisms', 
+        'current_goal', 'backstory', 'notes'
+    ]
+    
+    # keyset 分页的排序列
+    page_order = [('character_id', False)]
+    
+    # 与 FULLTEXT 索引 ft_characters_search 的列一致
+    search_columns = ['name', 'occupation', 'backstory']
+    
     def __init__(self, character_id=None, name=None, played_by=None, age=None, gender=None,
                  occupation=None, appearance=None, voice_tone=None, voice_style=None,
                  mannerisms=None, current_goal=None, backstory=None, notes=None):
@@ -23,6 +40,35 @@ class Character:
         self.backstory = backstory
         self.notes = notes
     
+    _insert_query = """
+    INSERT INTO characters (
+        character_id, name, played_by, age, gender, occupation, 
+        appearance, voice_tone, voice_style, mannerisms, 
+        current_goal, backstory, notes
+    ) VALUES (
+        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+    )
+    """
+    
+    @classmethod
+    def _insert_params(cls, character_data):
+        """按插入语句的列顺序构造参数"""
+        return (
+            encode_id(character_data.get('character_id')),
+            character_data.get('name'),
+            character_data.get('played_by'),
+            character_data.get('age'),
+            character_data.get('gender'),
+            character_data.get('occupation'),
+            character_data.get('appearance'),
+            character_data.get('voice_tone'),
+            character_data.get('voice_style'),
+            character_data.get('mannerisms'),
+            character_data.get('current_goal'),
+            character_data.get('backstory'),
+            character_data.get('notes')
+        )
+    
     @classmethod
     def create(cls, character_data):
         """
@@ -49,57 +95,136 @@ class Character:
         Returns:
             str: 角色ID
         """
-        query = """
-        INSERT INTO characters (
-            character_id, name, played_by, age, gender, occupation, 
-            appearance, voice_tone, voice_style, mannerisms, 
-            current_goal, backstory, notes
-        ) VALUES (
-            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-        )
+        try:
+            db.execute_update(cls._insert_query, cls._insert_params(character_data))
+            hooks.notify('characters', character_data.get('character_id'), fields=character_data)
+            return canonical_id(character_data.get('character_id'))
+        except Exception as e:
+            print(f"创建角色失败: {e}")
+            raise
+    
+    @classmethod
+    async def acreate(cls, character_data):
+        """create 的异步版本"""
+        try:
+            await adb.execute_update(cls._insert_query, cls._insert_params(character_data))
+            hooks.notify('characters', character_data.get('character_id'), fields=character_data)
+            return canonical_id(character_data.get('character_id'))
+        except Exception as e:
+            print(f"创建角色失败: {e}")
+            raise
+    
+    @classmethod
+    def create_many(cls, characters_data, chunk_size=1000):
         """
+        批量创建角色，使用多行 INSERT 按块执行，整批在一个事务中提交，失败时全部回滚
         
-        params = (
-            character_data.get('character_id'),
-            character_data.get('name'),
-            character_data.get('played_by'),
-            character_data.get('age'),
-            character_data.get('gender'),
-            character_data.get('occupation'),
-            character_data.get('appearance'),
-            character_data.get('voice_tone'),
-            character_data.get('voice_style'),
-            character_data.get('mannerisms'),
-            character_data.get('current_goal'),
-            character_data.get('backstory'),
-            character_data.get('notes')
-        )
-        
+        Args:
+            characters_data (list): 角色数据列表，每项格式同 create
+            chunk_size (int): 每条 INSERT 语句的行数
+            
+        Returns:
+            list: 角色ID列表
+        """
         try:
-            db.execute_update(query, params)
-            return character_data.get('character_id')
+            with db.transaction() as session:
+                session.execute_many(cls._insert_query, [cls._insert_params(d) for d in characters_data], chunk_size)
+                for d in characters_data:
+                    hooks.notify('characters', d.get('character_id'), session=session, fields=d)
+            return [canonical_id(d.get('character_id')) for d in characters_data]
         except Exception as e:
-            print(f"创建角色失败: {e}")
+            print(f"批量创建角色失败: {e}")
             raise
     
     @classmethod
-    def get_by_id(cls, character_id):
+    async def acreate_many(cls, characters_data, chunk_size=1000):
+        """create_many 的异步版本"""
+        try:
+            async with adb.transaction() as session:
+                await session.execute_many(cls._insert_query, [cls._insert_params(d) for d in characters_data], chunk_size)
+                for d in characters_data:
+                    hooks.notify('characters', d.get('character_id'), session=session, fields=d)
+            return [canonical_id(d.get('character_id')) for d in characters_data]
+        except Exception as e:
+            print(f"批量创建角色失败: {e}")
+            raise
+    
+    @classmethod
+    def get_by_id(cls, character_id, session=None, for_update=False):
         """
         根据ID获取角色
         
+        不在事务中时优先读取实体缓存，事务内的读取总是访问数据库。
+        
         Args:
             character_id (str): 角色ID
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
+            for_update (bool): 是否加行锁 (SELECT ... FOR UPDATE)，仅在事务中有意义
             
         Returns:
             dict: 角色数据
         """
+        if session is None:
+            cached = entity_cache.get('characters', character_id)
+            if cached is not None:
+                return cached
+        epoch = entity_cache.epoch
+        query = "SELECT * FROM characters WHERE character_id = %s"
+        if for_update:
+            query += " FOR UPDATE"
+        result = (session or db).execute_query(query, (encode_id(character_id),))
+        
+        if result:
+            if session is None:
+                entity_cache.put('characters', character_id, result[0], epoch)
+            return result[0]
+        return None
+    
+    @classmethod
+    async def aget_by_id(cls, character_id, session=None, for_update=False):
+        """get_by_id 的异步版本"""
+        if session is None:
+            cached = entity_cache.get('characters', character_id)
+            if cached is not None:
+                return cached
+        epoch = entity_cache.epoch
         query = "SELECT * FROM characters WHERE character_id = %s"
-        result = db.execute_query(query, (character_id,))
+        if for_update:
+            query += " FOR UPDATE"
+        result = await (session or adb).execute_query(query, (encode_id(character_id),))
         
         if result:
+            if session is None:
+                entity_cache.put('characters', character_id, result[0], epoch)
             return result[0]
         return None
     
+    @classmethod
+    def get_by_ids(cls, character_ids):
+        """
+        根据一组ID批量获取角色
+        
+        Args:
+            character_ids (list): 角色ID列表
+            
+        Returns:
+            list: 角色数据列表，不存在的ID不会出现在结果中
+        """
+        if not character_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(character_ids))
+        query = f"SELECT * FROM characters WHERE character_id IN ({placeholders})"
+        return db.execute_query(query, encode_ids(character_ids))
+    
+    @classmethod
+    async def aget_by_ids(cls, character_ids):
+        """get_by_ids 的异步版本"""
+        if not character_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(character_ids))
+        query = f"SELECT * FROM characters WHERE character_id IN ({placeholders})"
+        return await adb.execute_query(query, encode_ids(character_ids))
+    
     @classmethod
     def get_all(cls):
         """
@@ -112,7 +237,75 @@ class Character:
         return db.execute_query(query)
     
     @classmethod
-    def update(cls, character_id, attribute, value):
+    async def aget_all(cls):
+        """get_all 的异步版本"""
+        query = "SELECT * FROM characters"
+        return await adb.execute_query(query)
+    
+    @classmethod
+    def _page_query(cls, limit, after):
+        """构造按主键 keyset 分页的查询"""
+        condition, params, order_clause = build_keyset_clause(cls.page_order, after)
+        where = f"WHERE {condition}" if condition else ""
+        return f"SELECT * FROM characters {where} {order_clause} LIMIT %s", params + (int(limit),)
+    
+    @classmethod
+    def get_page(cls, limit, after=None):
+        """
+        按 character_id 顺序分页获取角色
+        
+        Args:
+            limit (int): 本页最多返回的数量
+            after (tuple, optional): 上一页最后一行在 page_order 各列上的值，None 表示第一页
+            
+        Returns:
+            list: 角色列表
+        """
+        query, params = cls._page_query(limit, after)
+        return db.execute_query(query, params)
+    
+    @classmethod
+    async def aget_page(cls, limit, after=None):
+        """get_page 的异步版本"""
+        query, params = cls._page_query(limit, after)
+        return await adb.execute_query(query, params)
+    
+    @classmethod
+    def _search_query(cls, search_term, limit):
+        """构造全文检索语句，结果按相关度降序"""
+        score_sql, score_params, where_sql, where_params = build_text_search(cls.search_columns, search_term)
+        query = f"""
+        SELECT *, {score_sql} AS relevance
+        FROM characters
+        WHERE {where_sql}
+        ORDER BY relevance DESC
+        LIMIT %s
+        """
+        return query, score_params + where_params + (limit,)
+    
+    @classmethod
+    def search(cls, search_term, limit=5):
+        """
+        使用全文索引搜索角色
+        
+        Args:
+            search_term (str): 搜索关键词
+            limit (int): 最多返回的数量
+            
+        Returns:
+            list: 匹配的角色列表，附带 relevance 相关度，按相关度降序
+        """
+        query, params = cls._search_query(search_term, limit)
+        return db.execute_query(query, params)
+    
+    @classmethod
+    async def asearch(cls, search_term, limit=5):
+        """search 的异步版本"""
+        query, params = cls._search_query(search_term, limit)
+        return await adb.execute_query(query, params)
+    
+    @classmethod
+    def update(cls, character_id, attribute, value, session=None):
         """
         更新角色属性
         
@@ -120,21 +313,59 @@ class Character:
             character_id (str): 角色ID
             attribute (str): 属性名
             value: 属性值
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
             
         Returns:
             int: 受影响的行数
         """
-        valid_attributes = [
-            'name', 'played_by', 'age', 'gender', 'occupation', 
-            'appearance', 'voice_tone', 'voice_style', 'mannerisms', 
-            'current_goal', 'backstory', 'notes'
-        ]
+        if attribute not in cls.valid_attributes:
+            raise ValueError(f"无效的角色属性: {attribute}")
         
-        if attribute not in valid_attributes:
+        query = f"UPDATE characters SET {attribute} = %s WHERE character_id = %s"
+        rowcount = (session or db).execute_update(query, (value, encode_id(character_id)))
+        hooks.notify('characters', character_id, session=session, fields={attribute: value})
+        return rowcount
+    
+    @classmethod
+    async def aupdate(cls, character_id, attribute, value, session=None):
+        """update 的异步版本"""
+        if attribute not in cls.valid_attributes:
             raise ValueError(f"无效的角色属性: {attribute}")
         
         query = f"UPDATE characters SET {attribute} = %s WHERE character_id = %s"
-        return db.execute_update(query, (value, character_id))
+        rowcount = await (session or adb).execute_update(query, (value, encode_id(character_id)))
+        hooks.notify('characters', character_id, session=session, fields={attribute: value})
+        return rowcount
+    
+    @classmethod
+    def patch(cls, character_id, fields, session=None):
+        """
+        用一条 UPDATE 语句同时更新角色的多个属性
+        
+        Args:
+            character_id (str): 角色ID
+            fields (dict): 属性名到新值的映射，属性名必须在 valid_attributes 中
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
+            
+        Returns:
+            int: 受影响的行数
+        """
+        query, params = build_patch_query(
+            'characters', 'character_id', character_id, fields, cls.valid_attributes, '角色'
+        )
+        rowcount = (session or db).execute_update(query, params)
+        hooks.notify('characters', character_id, session=session, fields=fields)
+        return rowcount
+    
+    @classmethod
+    async def apatch(cls, character_id, fields, session=None):
+        """patch 的异步版本"""
+        query, params = build_patch_query(
+            'characters', 'character_id', character_id, fields, cls.valid_attributes, '角色'
+        )
+        rowcount = await (session or adb).execute_update(query, params)
+        hooks.notify('characters', character_id, session=session, fields=fields)
+        return rowcount
     
     @classmethod
     def delete(cls, character_id):
@@ -148,4 +379,14 @@ class Character:
             int: 受影响的行数
         """
         query = "DELETE FROM characters WHERE character_id = %s"
-        return db.execute_update(query, (character_id,))
\ No newline at end of file
+        rowcount = db.execute_update(query, (encode_id(character_id),))
+        hooks.notify('characters', character_id, deleted=True)
+        return rowcount
+    
+    @classmethod
+    async def adelete(cls, character_id):
+        """delete 的异步版本"""
+        query = "DELETE FROM characters WHERE character_id = %s"
+        rowcount = await adb.execute_update(query, (encode_id(character_id),))
+        hooks.notify('characters', character_id, deleted=True)
+        return rowcount
\ No newline at end of file
@@ -1,7 +1,9 @@
 """
 角色-技能关联模型类，用于管理角色和技能之间的关系
 """
-from src.db import db
+from src.db import db, adb
+from src.db.ids import encode_id, encode_ids
+from src.models import hooks
 
 class CharacterSkill:
     """角色-技能关联模型类"""
@@ -31,7 +33,24 @@ class CharacterSkill:
         """
         
         try:
-            relation_id = db.execute_insert(query, (character_id, skill_id, level))
+            relation_id = db.execute_insert(query, (encode_id(character_id), encode_id(skill_id), level))
+            hooks.notify('character_skills', character_id, fields={'skill_id': skill_id, 'level': level})
+            return relation_id
+        except Exception as e:
+            print(f"为角色添加技能失败: {e}")
+            raise
+    
+    @classmethod
+    async def aadd_character_skill(cls, character_id, skill_id, level=1):
+        """add_character_skill 的异步版本"""
+        query = """
+        INSERT INTO character_skills (character_id, skill_id, level) 
+        VALUES (%s, %s, %s)
+        """
+        
+        try:
+            relation_id = await adb.execute_insert(query, (encode_id(character_id), encode_id(skill_id), level))
+            hooks.notify('character_skills', character_id, fields={'skill_id': skill_id, 'level': level})
             return relation_id
         except Exception as e:
             print(f"为角色添加技能失败: {e}")
@@ -55,7 +74,19 @@ class CharacterSkill:
         WHERE cs.character_id = %s
         """
         
-        return db.execute_query(query, (character_id,))
+        return db.execute_query(query, (encode_id(character_id),))
+    
+    @classmethod
+    async def aget_character_skills(cls, character_id):
+        """get_character_skills 的异步版本"""
+        query = """
+        SELECT cs.*, s.name, s.description 
+        FROM character_skills cs 
+        JOIN skills s ON cs.skill_id = s.skill_id 
+        WHERE cs.character_id = %s
+        """
+        
+        return await adb.execute_query(query, (encode_id(character_id),))
     
     @classmethod
     def update_character_skill_level(cls, character_id, skill_id, level):
@@ -76,7 +107,22 @@ class CharacterSkill:
         WHERE character_id = %s AND skill_id = %s
         """
         
-        return db.execute_update(query, (level, character_id, skill_id))
+        rowcount = db.execute_update(query, (level, encode_id(character_id), encode_id(skill_id)))
+        hooks.notify('character_skills', character_id, fields={'skill_id': skill_id, 'level': level})
+        return rowcount
+    
+    @classmethod
+    async def aupdate_character_skill_level(cls, character_id, skill_id, level):
+        """update_character_skill_level 的异步版本"""
+        query = """
+        UPDATE character_skills 
+        SET level = %s 
+        WHERE character_id = %s AND skill_id = %s
+        """
+        
+        rowcount = await adb.execute_update(query, (level, encode_id(character_id), encode_id(skill_id)))
+        hooks.notify('character_skills', character_id, fields={'skill_id': skill_id, 'level': level})
+        return rowcount
     
     @classmethod
     def remove_character_skill(cls, character_id, skill_id):
@@ -95,7 +141,21 @@ class CharacterSkill:
         WHERE character_id = %s AND skill_id = %s
         """
         
-        return db.execute_update(query, (character_id, skill_id))
+        rowcount = db.execute_update(query, encode_ids((character_id, skill_id)))
+        hooks.notify('character_skills', character_id, deleted=True, fields={'skill_id': skill_id})
+        return rowcount
+    
+    @classmethod
+    async def aremove_character_skill(cls, character_id, skill_id):
+        """remove_character_skill 的异步版本"""
+        query = """
+        DELETE FROM character_skills 
+        WHERE character_id = %s AND skill_id = %s
+        """
+        
+        rowcount = await adb.execute_update(query, encode_ids((character_id, skill_id)))
+        hooks.notify('character_skills', character_id, deleted=True, fields={'skill_id': skill_id})
+        return rowcount
     
     @classmethod
     def get_characters_with_skill(cls, skill_id):
@@ -115,4 +175,16 @@ class CharacterSkill:
         WHERE cs.skill_id = %s
         """
         
-        return db.execute_query(query, (skill_id,))
\ No newline at end of file
+        return db.execute_query(query, (encode_id(skill_id),))
+    
+    @classmethod
+    async def aget_characters_with_skill(cls, skill_id):
+        """get_characters_with_skill 的异步版本"""
+        query = """
+        SELECT cs.*, c.name, c.played_by
+        FROM character_skills cs
+        JOIN characters c ON cs.character_id = c.character_id
+        WHERE cs.skill_id = %s
+        """
+        
+        return await adb.execute_query(query, (encode_id(skill_id),))
\ No newline at end of file
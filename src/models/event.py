@@ -2,11 +2,35 @@
 事件模型类，用于管理游戏世界中发生的事件
 """
 from datetime import datetime
-from src.db import db
+from src.db import db, adb
+from src.db.ids import canonical_id, encode_field, encode_id, encode_ids
+from src.models import hooks
+from src.models.cache import entity_cache
+from src.models.event_region import EventRegion
+from src.models.sql_utils import (
+    EVENT_KEYSET_ORDERINGS, build_patch_query, build_event_order_clause, build_keyset_clause,
+    build_time_window_clause, build_text_search
+)
 
 class Event:
     """事件模型类"""
     
+    # 允许通过 update 修改的字段
+    valid_attributes = [
+        'title', 'description', 'location_id', 
+        'timestamp', 'event_type', 'importance'
+    ]
+    
+    # 与 FULLTEXT 索引 ft_events_search 的列一致
+    search_columns = ['title', 'description']
+    
+    # keyset 分页的排序列：按排序方式区分，全文检索按相关度
+    page_orderings = EVENT_KEYSET_ORDERINGS
+    search_page_order = [('relevance', True), ('timestamp', True), ('event_id', True)]
+    
+    # 排序列中可能为 NULL 的列
+    nullable_columns = ('timestamp', 'importance')
+    
     def __init__(self, event_id=None, title=None, description=None, location_id=None,
                 timestamp=None, event_type=None, importance=None):
         self.event_id = event_id
@@ -17,6 +41,30 @@ class Event:
         self.event_type = event_type
         self.importance = importance
     
+    _insert_query = """
+    INSERT INTO events (
+        event_id, title, description, location_id, 
+        timestamp, event_type, importance
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """
+    
+    @classmethod
+    def _insert_params(cls, event_data):
+        """按插入语句的列顺序构造参数"""
+        # 如果没有提供时间戳，使用当前时间
+        if 'timestamp' not in event_data or not event_data['timestamp']:
+            event_data['timestamp'] = datetime.now()
+        
+        return (
+            encode_id(event_data.get('event_id')),
+            event_data.get('title'),
+            event_data.get('description'),
+            encode_id(event_data.get('location_id')),
+            event_data.get('timestamp'),
+            event_data.get('event_type'),
+            event_data.get('importance')
+        )
+    
     @classmethod
     def create(cls, event_data):
         """
@@ -37,102 +85,290 @@ class Event:
         Returns:
             str: 事件ID
         """
-        query = """
-        INSERT INTO events (
-            event_id, title, description, location_id, 
-            timestamp, event_type, importance
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+        try:
+            # 事件行和区域事件索引在同一事务中写入
+            with db.transaction() as session:
+                session.execute_update(cls._insert_query, cls._insert_params(event_data))
+                EventRegion.reindex_events([event_data.get('event_id')], session)
+            hooks.notify('events', event_data.get('event_id'), fields=event_data)
+            return canonical_id(event_data.get('event_id'))
+        except Exception as e:
+            print(f"创建事件失败: {e}")
+            raise
+    
+    @classmethod
+    async def acreate(cls, event_data):
+        """create 的异步版本"""
+        try:
+            # 事件行和区域事件索引在同一事务中写入
+            async with adb.transaction() as session:
+                await session.execute_update(cls._insert_query, cls._insert_params(event_data))
+                await EventRegion.areindex_events([event_data.get('event_id')], session)
+            hooks.notify('events', event_data.get('event_id'), fields=event_data)
+            return canonical_id(event_data.get('event_id'))
+        except Exception as e:
+            print(f"创建事件失败: {e}")
+            raise
+    
+    @classmethod
+    def create_many(cls, events_data, chunk_size=1000):
         """
+        批量创建事件，使用多行 INSERT 按块执行，全部插入后再批量写入区域事件索引，
+        整批在一个事务中提交，失败时全部回滚
         
-        # 如果没有提供时间戳，使用当前时间
-        if 'timestamp' not in event_data or not event_data['timestamp']:
-            event_data['timestamp'] = datetime.now()
+        Args:
+            events_data (list): 事件数据列表，每项格式同 create
+            chunk_size (int): 每条 INSERT 语句的行数
             
-        params = (
-            event_data.get('event_id'),
-            event_data.get('title'),
-            event_data.get('description'),
-            event_data.get('location_id'),
-            event_data.get('timestamp'),
-            event_data.get('event_type'),
-            event_data.get('importance')
-        )
-        
+        Returns:
+            list: 事件ID列表
+        """
         try:
-            db.execute_update(query, params)
-            return event_data.get('event_id')
+            with db.transaction() as session:
+                session.execute_many(cls._insert_query, [cls._insert_params(d) for d in events_data], chunk_size)
+                EventRegion.reindex_events([d.get('event_id') for d in events_data], session)
+                for d in events_data:
+                    hooks.notify('events', d.get('event_id'), session=session, fields=d)
+            return [canonical_id(d.get('event_id')) for d in events_data]
         except Exception as e:
-            print(f"创建事件失败: {e}")
+            print(f"批量创建事件失败: {e}")
             raise
     
     @classmethod
-    def get_by_id(cls, event_id):
+    async def acreate_many(cls, events_data, chunk_size=1000):
+        """create_many 的异步版本"""
+        try:
+            async with adb.transaction() as session:
+                await session.execute_many(cls._insert_query, [cls._insert_params(d) for d in events_data], chunk_size)
+                await EventRegion.areindex_events([d.get('event_id') for d in events_data], session)
+                for d in events_data:
+                    hooks.notify('events', d.get('event_id'), session=session, fields=d)
+            return [canonical_id(d.get('event_id')) for d in events_data]
+        except Exception as e:
+            print(f"批量创建事件失败: {e}")
+            raise
+    
+    @classmethod
+    def get_by_id(cls, event_id, session=None, for_update=False):
         """
         根据ID获取事件
         
+        不在事务中时优先读取实体缓存，事务内的读取总是访问数据库。
+        
         Args:
             event_id (str): 事件ID
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
+            for_update (bool): 是否加行锁 (SELECT ... FOR UPDATE)，仅在事务中有意义
             
         Returns:
             dict: 事件数据
         """
+        if session is None:
+            cached = entity_cache.get('events', event_id)
+            if cached is not None:
+                return cached
+        epoch = entity_cache.epoch
+        query = "SELECT * FROM events WHERE event_id = %s"
+        if for_update:
+            query += " FOR UPDATE"
+        result = (session or db).execute_query(query, (encode_id(event_id),))
+        
+        if result:
+            if session is None:
+                entity_cache.put('events', event_id, result[0], epoch)
+            return result[0]
+        return None
+    
+    @classmethod
+    async def aget_by_id(cls, event_id, session=None, for_update=False):
+        """get_by_id 的异步版本"""
+        if session is None:
+            cached = entity_cache.get('events', event_id)
+            if cached is not None:
+                return cached
+        epoch = entity_cache.epoch
         query = "SELECT * FROM events WHERE event_id = %s"
-        result = db.execute_query(query, (event_id,))
+        if for_update:
+            query += " FOR UPDATE"
+        result = await (session or adb).execute_query(query, (encode_id(event_id),))
         
         if result:
+            if session is None:
+                entity_cache.put('events', event_id, result[0], epoch)
             return result[0]
         return None
     
     @classmethod
-    def get_all(cls, limit=100, offset=0):
+    def get_by_ids(cls, event_ids):
         """
-        获取所有事件，默认按时间戳降序排列
+        根据一组ID批量获取事件
         
         Args:
-            limit (int): 返回的最大事件数量
-            offset (int): 分页偏移量
+            event_ids (list): 事件ID列表
+            
+        Returns:
+            list: 事件数据列表，不存在的ID不会出现在结果中
+        """
+        if not event_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(event_ids))
+        query = f"SELECT * FROM events WHERE event_id IN ({placeholders})"
+        return db.execute_query(query, encode_ids(event_ids))
+    
+    @classmethod
+    async def aget_by_ids(cls, event_ids):
+        """get_by_ids 的异步版本"""
+        if not event_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(event_ids))
+        query = f"SELECT * FROM events WHERE event_id IN ({placeholders})"
+        return await adb.execute_query(query, encode_ids(event_ids))
+    
+    @classmethod
+    def _page_query(cls, limit, after):
+        """构造按时间倒序 keyset 分页的查询，走 timestamp 索引"""
+        condition, params, order_clause = build_keyset_clause(
+            cls.page_orderings['recency'], after, nullable=cls.nullable_columns
+        )
+        where = f"WHERE {condition}" if condition else ""
+        return f"SELECT * FROM events {where} {order_clause} LIMIT %s", params + (int(limit),)
+    
+    @classmethod
+    def get_page(cls, limit=100, after=None):
+        """
+        分页获取所有事件，按时间戳降序排列
+        
+        Args:
+            limit (int): 本页最多返回的事件数量
+            after (tuple, optional): 上一页最后一个事件的 (timestamp, event_id)，None 表示第一页
             
         Returns:
             list: 事件列表
         """
-        query = "SELECT * FROM events ORDER BY timestamp DESC LIMIT %s OFFSET %s"
-        return db.execute_query(query, (limit, offset))
+        query, params = cls._page_query(limit, after)
+        return db.execute_query(query, params)
     
     @classmethod
-    def get_events_by_location(cls, location_id):
+    async def aget_page(cls, limit=100, after=None):
+        """get_page 的异步版本"""
+        query, params = cls._page_query(limit, after)
+        return await adb.execute_query(query, params)
+    
+    @classmethod
+    def _order_clause(cls, order_by, after, alias='e'):
         """
-        获取指定地点的所有事件
+        事件列表的排序和 keyset 分页条件
+        
+        'recency' 和 'importance' 以 event_id 结尾保证顺序唯一，可以分页；
+        'combined' 不支持分页。
+        
+        Returns:
+            tuple: (分页条件或 None, 条件参数, order_clause, 排序参数)
+        """
+        if order_by in cls.page_orderings:
+            condition, params, order_clause = build_keyset_clause(
+                cls.page_orderings[order_by], after, alias, cls.nullable_columns
+            )
+            return condition, params, order_clause, ()
+        if after is not None:
+            raise ValueError(f"事件排序方式 {order_by} 不支持分页，可选值: {', '.join(cls.page_orderings)}")
+        order_clause, order_params = build_event_order_clause(order_by, alias)
+        return None, (), order_clause, order_params
+    
+    @classmethod
+    def _events_by_location_query(cls, location_id, limit, order_by, since, until, after=None):
+        """构造地点事件的查询语句，排序、时间窗口、分页和数量限制都下推到SQL"""
+        conditions, params = build_time_window_clause(since, until)
+        keyset, keyset_params, order_clause, order_params = cls._order_clause(order_by, after)
+        if keyset:
+            conditions.append(keyset)
+        where = " AND ".join(["e.location_id = %s"] + conditions)
+        query = f"SELECT e.* FROM events e WHERE {where} {order_clause}"
+        params = (encode_id(location_id),) + params + keyset_params + order_params
+        if limit is not None:
+            query += " LIMIT %s"
+            params += (int(limit),)
+        return query, params
+    
+    @classmethod
+    def get_events_by_location(cls, location_id, limit=None, order_by='recency',
+                               since=None, until=None, after=None):
+        """
+        获取指定地点的事件
         
         Args:
             location_id (str): 地点ID
+            limit (int, optional): 最多返回的事件数量，None 表示不限
+            order_by (str): 排序方式 ('recency', 'importance' 或 'combined')
+            since (datetime/str, optional): 只返回该时间及之后的事件
+            until (datetime/str, optional): 只返回该时间及之前的事件
+            after (tuple, optional): 上一页最后一个事件在 page_orderings[order_by] 各列上的值，
+                None 表示第一页；'combined' 不支持分页
             
         Returns:
             list: 事件列表
         """
-        query = "SELECT * FROM events WHERE location_id = %s ORDER BY timestamp DESC"
-        return db.execute_query(query, (location_id,))
+        query, params = cls._events_by_location_query(location_id, limit, order_by, since, until, after)
+        return db.execute_query(query, params)
     
     @classmethod
-    def search_events(cls, search_term):
+    async def aget_events_by_location(cls, location_id, limit=None, order_by='recency',
+                                      since=None, until=None, after=None):
+        """get_events_by_location 的异步版本"""
+        query, params = cls._events_by_location_query(location_id, limit, order_by, since, until, after)
+        return await adb.execute_query(query, params)
+    
+    @classmethod
+    def _search_query(cls, search_term, limit, after=None):
         """
-        搜索事件（标题和描述）
+        构造全文检索语句，结果按相关度降序，相关度相同时较新的事件在前
+        
+        相关度是计算列，没有索引可用：每一页都要对全部匹配的事件重新计算 MATCH 并排序，
+        翻页的代价随匹配数而不是页码增长
+        """
+        score_sql, score_params, where_sql, where_params = build_text_search(cls.search_columns, search_term)
+        keyset, keyset_params, order_clause = build_keyset_clause(
+            cls.search_page_order, after, 'matched', cls.nullable_columns
+        )
+        query = f"""
+        SELECT * FROM (
+            SELECT *, {score_sql} AS relevance
+            FROM events 
+            WHERE {where_sql}
+        ) matched
+        {f"WHERE {keyset}" if keyset else ""}
+        {order_clause}
+        """
+        params = score_params + where_params + keyset_params
+        if limit is not None:
+            query += " LIMIT %s"
+            params += (int(limit),)
+        return query, params
+    
+    @classmethod
+    def search_events(cls, search_term, limit=None, after=None):
+        """
+        使用全文索引搜索事件（标题和描述）
         
         Args:
             search_term (str): 搜索关键词
+            limit (int, optional): 最多返回的数量，None 表示不限
+            after (tuple, optional): 上一页最后一个事件的 (relevance, timestamp, event_id)，None 表示第一页
             
         Returns:
-            list: 匹配的事件列表
+            list: 匹配的事件列表，附带 relevance 相关度，按相关度降序
         """
-        search_pattern = f"%{search_term}%"
-        query = """
-        SELECT * FROM events 
-        WHERE title LIKE %s OR description LIKE %s 
-        ORDER BY timestamp DESC
-        """
-        return db.execute_query(query, (search_pattern, search_pattern))
+        query, params = cls._search_query(search_term, limit, after)
+        return db.execute_query(query, params)
     
     @classmethod
-    def update(cls, event_id, attribute, value):
+    async def asearch_events(cls, search_term, limit=None, after=None):
+        """search_events 的异步版本"""
+        query, params = cls._search_query(search_term, limit, after)
+        return await adb.execute_query(query, params)
+    
+    @classmethod
+    def update(cls, event_id, attribute, value, session=None):
         """
         更新事件属性
         
@@ -140,20 +376,85 @@ class Event:
             event_id (str): 事件ID
             attribute (str): 属性名
             value: 属性值
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
             
         Returns:
             int: 受影响的行数
         """
-        valid_attributes = [
-            'title', 'description', 'location_id', 
-            'timestamp', 'event_type', 'importance'
-        ]
+        if attribute not in cls.valid_attributes:
+            raise ValueError(f"无效的事件属性: {attribute}")
+        
+        if session is None and attribute in EventRegion.indexed_fields:
+            # 区域事件索引要与事件行在同一事务中更新
+            with db.transaction() as session:
+                return cls.update(event_id, attribute, value, session)
         
-        if attribute not in valid_attributes:
+        query = f"UPDATE events SET {attribute} = %s WHERE event_id = %s"
+        rowcount = (session or db).execute_update(query, (encode_field(attribute, value), encode_id(event_id)))
+        if attribute in EventRegion.indexed_fields:
+            EventRegion.reindex_events([event_id], session)
+        hooks.notify('events', event_id, session=session, fields={attribute: value})
+        return rowcount
+    
+    @classmethod
+    async def aupdate(cls, event_id, attribute, value, session=None):
+        """update 的异步版本"""
+        if attribute not in cls.valid_attributes:
             raise ValueError(f"无效的事件属性: {attribute}")
         
+        if session is None and attribute in EventRegion.indexed_fields:
+            # 区域事件索引要与事件行在同一事务中更新
+            async with adb.transaction() as session:
+                return await cls.aupdate(event_id, attribute, value, session)
+        
         query = f"UPDATE events SET {attribute} = %s WHERE event_id = %s"
-        return db.execute_update(query, (value, event_id))
+        rowcount = await (session or adb).execute_update(query, (encode_field(attribute, value), encode_id(event_id)))
+        if attribute in EventRegion.indexed_fields:
+            await EventRegion.areindex_events([event_id], session)
+        hooks.notify('events', event_id, session=session, fields={attribute: value})
+        return rowcount
+    
+    @classmethod
+    def patch(cls, event_id, fields, session=None):
+        """
+        用一条 UPDATE 语句同时更新事件的多个属性
+        
+        Args:
+            event_id (str): 事件ID
+            fields (dict): 属性名到新值的映射，属性名必须在 valid_attributes 中
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
+            
+        Returns:
+            int: 受影响的行数
+        """
+        query, params = build_patch_query(
+            'events', 'event_id', event_id, fields, cls.valid_attributes, '事件'
+        )
+        if session is None and EventRegion.indexed_fields & fields.keys():
+            # 区域事件索引要与事件行在同一事务中更新
+            with db.transaction() as session:
+                return cls.patch(event_id, fields, session)
+        rowcount = (session or db).execute_update(query, params)
+        if EventRegion.indexed_fields & fields.keys():
+            EventRegion.reindex_events([event_id], session)
+        hooks.notify('events', event_id, session=session, fields=fields)
+        return rowcount
+    
+    @classmethod
+    async def apatch(cls, event_id, fields, session=None):
+        """patch 的异步版本"""
+        query, params = build_patch_query(
+            'events', 'event_id', event_id, fields, cls.valid_attributes, '事件'
+        )
+        if session is None and EventRegion.indexed_fields & fields.keys():
+            # 区域事件索引要与事件行在同一事务中更新
+            async with adb.transaction() as session:
+                return await cls.apatch(event_id, fields, session)
+        rowcount = await (session or adb).execute_update(query, params)
+        if EventRegion.indexed_fields & fields.keys():
+            await EventRegion.areindex_events([event_id], session)
+        hooks.notify('events', event_id, session=session, fields=fields)
+        return rowcount
     
     @classmethod
     def delete(cls, event_id):
@@ -167,4 +468,14 @@ class Event:
             int: 受影响的行数
         """
         query = "DELETE FROM events WHERE event_id = %s"
-        return db.execute_update(query, (event_id,))
\ No newline at end of file
+        rowcount = db.execute_update(query, (encode_id(event_id),))
+        hooks.notify('events', event_id, deleted=True)
+        return rowcount
+    
+    @classmethod
+    async def adelete(cls, event_id):
+        """delete 的异步版本"""
+        query = "DELETE FROM events WHERE event_id = %s"
+        rowcount = await adb.execute_update(query, (encode_id(event_id),))
+        hooks.notify('events', event_id, deleted=True)
+        return rowcount
\ No newline at end of file
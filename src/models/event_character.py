@@ -1,7 +1,10 @@
 """
 事件-角色关联模型类，用于管理事件和角色之间的关系
 """
-from src.db import db
+from src.db import db, adb
+from src.db.ids import encode_id, encode_ids
+from src.models import hooks
+from src.models.sql_utils import build_event_order_clause, build_time_window_clause
 
 class EventCharacter:
     """事件-角色关联模型类"""
@@ -31,12 +34,91 @@ class EventCharacter:
         """
         
         try:
-            relation_id = db.execute_insert(query, (event_id, character_id, role_in_event))
+            relation_id = db.execute_insert(query, (encode_id(event_id), encode_id(character_id), role_in_event))
+            hooks.notify('event_characters', character_id, fields={'event_id': event_id})
             return relation_id
         except Exception as e:
             print(f"添加角色到事件失败: {e}")
             raise
     
+    @classmethod
+    async def aadd_character_to_event(cls, event_id, character_id, role_in_event=None):
+        """add_character_to_event 的异步版本"""
+        query = """
+        INSERT INTO event_characters (event_id, character_id, role_in_event) 
+        VALUES (%s, %s, %s)
+        """
+        
+        try:
+            relation_id = await adb.execute_insert(query, (encode_id(event_id), encode_id(character_id), role_in_event))
+            hooks.notify('event_characters', character_id, fields={'event_id': event_id})
+            return relation_id
+        except Exception as e:
+            print(f"添加角色到事件失败: {e}")
+            raise
+    
+    @classmethod
+    def add_characters_to_events(cls, participants, chunk_size=1000):
+        """
+        批量向事件添加角色，使用多行 INSERT 按块执行，整批在一个事务中提交，失败时全部回滚
+        
+        Args:
+            participants (list): 参与记录列表
+                [
+                    {
+                        'event_id': str,
+                        'character_id': str,
+                        'role_in_event': str (可选)
+                    }
+                ]
+            chunk_size (int): 每条 INSERT 语句的行数
+            
+        Returns:
+            int: 插入的行数
+        """
+        query = """
+        INSERT INTO event_characters (event_id, character_id, role_in_event) 
+        VALUES (%s, %s, %s)
+        """
+        params = [
+            (encode_id(p.get('event_id')), encode_id(p.get('character_id')), p.get('role_in_event'))
+            for p in participants
+        ]
+        
+        try:
+            with db.transaction() as session:
+                rowcount = session.execute_many(query, params, chunk_size)
+                for p in participants:
+                    hooks.notify('event_characters', p.get('character_id'), session=session,
+                                 fields={'event_id': p.get('event_id')})
+            return rowcount
+        except Exception as e:
+            print(f"批量添加角色到事件失败: {e}")
+            raise
+    
+    @classmethod
+    async def aadd_characters_to_events(cls, participants, chunk_size=1000):
+        """add_characters_to_events 的异步版本"""
+        query = """
+        INSERT INTO event_characters (event_id, character_id, role_in_event) 
+        VALUES (%s, %s, %s)
+        """
+        params = [
+            (encode_id(p.get('event_id')), encode_id(p.get('character_id')), p.get('role_in_event'))
+            for p in participants
+        ]
+        
+        try:
+            async with adb.transaction() as session:
+                rowcount = await session.execute_many(query, params, chunk_size)
+                for p in participants:
+                    hooks.notify('event_characters', p.get('character_id'), session=session,
+                                 fields={'event_id': p.get('event_id')})
+            return rowcount
+        except Exception as e:
+            print(f"批量添加角色到事件失败: {e}")
+            raise
+    
     @classmethod
     def get_characters_in_event(cls, event_id):
         """
@@ -55,28 +137,130 @@ class EventCharacter:
         WHERE ec.event_id = %s
         """
         
-        return db.execute_query(query, (event_id,))
+        return db.execute_query(query, (encode_id(event_id),))
     
     @classmethod
-    def get_events_involving_character(cls, character_id):
+    async def aget_characters_in_event(cls, event_id):
+        """get_characters_in_event 的异步版本"""
+        query = """
+        SELECT ec.*, c.name, c.played_by 
+        FROM event_characters ec 
+        JOIN characters c ON ec.character_id = c.character_id 
+        WHERE ec.event_id = %s
+        """
+        
+        return await adb.execute_query(query, (encode_id(event_id),))
+    
+    @classmethod
+    def get_participants(cls, event_ids):
         """
-        获取包含特定角色的所有事件
+        批量获取一组事件的参与角色ID
         
         Args:
-            character_id (str): 角色ID
+            event_ids (list): 事件ID列表
             
         Returns:
-            list: 事件列表
+            list: [{'event_id', 'character_id'}]
         """
-        query = """
+        if not event_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(event_ids))
+        query = f"SELECT event_id, character_id FROM event_characters WHERE event_id IN ({placeholders})"
+        return db.execute_query(query, encode_ids(event_ids))
+    
+    @classmethod
+    async def aget_participants(cls, event_ids):
+        """get_participants 的异步版本"""
+        if not event_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(event_ids))
+        query = f"SELECT event_id, character_id FROM event_characters WHERE event_id IN ({placeholders})"
+        return await adb.execute_query(query, encode_ids(event_ids))
+    
+    @classmethod
+    def _events_involving_character_query(cls, character_id, limit, order_by, since, until):
+        """构造角色相关事件的查询语句，排序、时间窗口和数量限制都下推到SQL"""
+        conditions, params = build_time_window_clause(since, until)
+        order_clause, order_params = build_event_order_clause(order_by)
+        where = " AND ".join(["ec.character_id = %s"] + conditions)
+        query = f"""
         SELECT e.*, ec.role_in_event 
         FROM events e 
         JOIN event_characters ec ON e.event_id = ec.event_id 
-        WHERE ec.character_id = %s 
-        ORDER BY e.timestamp DESC
+        WHERE {where} 
+        {order_clause}
         """
+        params = (encode_id(character_id),) + params + order_params
+        if limit is not None:
+            query += " LIMIT %s"
+            params += (int(limit),)
+        return query, params
+    
+    @classmethod
+    def get_events_involving_character(cls, character_id, limit=None, order_by='recency',
+                                       since=None, until=None):
+        """
+        获取包含特定角色的事件
         
-        return db.execute_query(query, (character_id,))
+        Args:
+            character_id (str): 角色ID
+            limit (int, optional): 最多返回的事件数量，None 表示不限
+            order_by (str): 排序方式 ('recency', 'importance' 或 'combined')
+            since (datetime/str, optional): 只返回该时间及之后的事件
+            until (datetime/str, optional): 只返回该时间及之前的事件
+            
+        Returns:
+            list: 事件列表
+        """
+        query, params = cls._events_involving_character_query(
+            character_id, limit, order_by, since, until
+        )
+        return db.execute_query(query, params)
+    
+    @classmethod
+    async def aget_events_involving_character(cls, character_id, limit=None, order_by='recency',
+                                              since=None, until=None):
+        """get_events_involving_character 的异步版本"""
+        query, params = cls._events_involving_character_query(
+            character_id, limit, order_by, since, until
+        )
+        return await adb.execute_query(query, params)
+    
+    @classmethod
+    def get_shared_events(cls, character_id_1, character_id_2, limit=5):
+        """
+        获取两个角色共同参与的事件
+        
+        Args:
+            character_id_1 (str): 角色1 ID
+            character_id_2 (str): 角色2 ID
+            limit (int): 最多返回的事件数量
+            
+        Returns:
+            list: 事件列表，按时间倒序
+        """
+        query = """
+        SELECT e.* FROM events e
+        JOIN event_characters ec1 ON e.event_id = ec1.event_id
+        JOIN event_characters ec2 ON e.event_id = ec2.event_id
+        WHERE ec1.character_id = %s AND ec2.character_id = %s
+        ORDER BY e.timestamp DESC
+        LIMIT %s
+        """
+        return db.execute_query(query, (encode_id(character_id_1), encode_id(character_id_2), limit))
+    
+    @classmethod
+    async def aget_shared_events(cls, character_id_1, character_id_2, limit=5):
+        """get_shared_events 的异步版本"""
+        query = """
+        SELECT e.* FROM events e
+        JOIN event_characters ec1 ON e.event_id = ec1.event_id
+        JOIN event_characters ec2 ON e.event_id = ec2.event_id
+        WHERE ec1.character_id = %s AND ec2.character_id = %s
+        ORDER BY e.timestamp DESC
+        LIMIT %s
+        """
+        return await adb.execute_query(query, (encode_id(character_id_1), encode_id(character_id_2), limit))
     
     @classmethod
     def update_character_role_in_event(cls, event_id, character_id, role_in_event):
@@ -97,7 +281,22 @@ class EventCharacter:
         WHERE event_id = %s AND character_id = %s
         """
         
-        return db.execute_update(query, (role_in_event, event_id, character_id))
+        rowcount = db.execute_update(query, (role_in_event, encode_id(event_id), encode_id(character_id)))
+        hooks.notify('event_characters', character_id, fields={'event_id': event_id, 'role_in_event': role_in_event})
+        return rowcount
+    
+    @classmethod
+    async def aupdate_character_role_in_event(cls, event_id, character_id, role_in_event):
+        """update_character_role_in_event 的异步版本"""
+        query = """
+        UPDATE event_characters 
+        SET role_in_event = %s 
+        WHERE event_id = %s AND character_id = %s
+        """
+        
+        rowcount = await adb.execute_update(query, (role_in_event, encode_id(event_id), encode_id(character_id)))
+        hooks.notify('event_characters', character_id, fields={'event_id': event_id, 'role_in_event': role_in_event})
+        return rowcount
     
     @classmethod
     def remove_character_from_event(cls, event_id, character_id):
@@ -116,7 +315,21 @@ class EventCharacter:
         WHERE event_id = %s AND character_id = %s
         """
         
-        return db.execute_update(query, (event_id, character_id))
+        rowcount = db.execute_update(query, encode_ids((event_id, character_id)))
+        hooks.notify('event_characters', character_id, deleted=True, fields={'event_id': event_id})
+        return rowcount
+    
+    @classmethod
+    async def aremove_character_from_event(cls, event_id, character_id):
+        """remove_character_from_event 的异步版本"""
+        query = """
+        DELETE FROM event_characters 
+        WHERE event_id = %s AND character_id = %s
+        """
+        
+        rowcount = await adb.execute_update(query, encode_ids((event_id, character_id)))
+        hooks.notify('event_characters', character_id, deleted=True, fields={'event_id': event_id})
+        return rowcount
     
     @classmethod
     def delete_all_characters_from_event(cls, event_id):
@@ -130,4 +343,16 @@ class EventCharacter:
             int: 受影响的行数
         """
         query = "DELETE FROM event_characters WHERE event_id = %s"
-        return db.execute_update(query, (event_id,))
\ No newline at end of file
+        rowcount = db.execute_update(query, (encode_id(event_id),))
+        # 受影响的角色未知，键为 None，由监听方按 event_id 处理
+        hooks.notify('event_characters', None, deleted=True, fields={'event_id': event_id})
+        return rowcount
+    
+    @classmethod
+    async def adelete_all_characters_from_event(cls, event_id):
+        """delete_all_characters_from_event 的异步版本"""
+        query = "DELETE FROM event_characters WHERE event_id = %s"
+        rowcount = await adb.execute_update(query, (encode_id(event_id),))
+        # 受影响的角色未知，键为 None，由监听方按 event_id 处理
+        hooks.notify('event_characters', None, deleted=True, fields={'event_id': event_id})
+        return rowcount
\ No newline at end of file
@@ -0,0 +1,222 @@
+"""
+区域事件索引，把每个事件登记到其地点及所有上级地点下，用于查询整棵地点子树中的事件
+"""
+from itertools import batched
+from src.db import db, adb
+from src.db.ids import encode_id, encode_ids
+from src.models.sql_utils import (
+    LOCATION_HIERARCHY_DEPTH, build_event_order_clause, build_time_window_clause
+)
+
+class EventRegion:
+    """
+    区域事件索引模型类
+    
+    event_regions 表为每个事件在其地点自身及每一级上级地点（区域）下各存一行，
+    冗余存储事件的 timestamp 和 importance，并建有 (region_id, timestamp) 和
+    (region_id, importance, timestamp) 索引。按时间或重要性取区域内前 k 个事件
+    因此是一次索引范围扫描，读取的行数只与 k 有关，与地点树的深度、下级地点的数量
+    和区域内的事件总数无关。
+    
+    索引在写入时维护：
+        事件创建，或修改 location_id/timestamp/importance 时重建该事件的行
+        地点修改 parent_location_id 或被删除时重建其子树内所有事件的行
+        事件被删除时由外键级联删除
+    """
+    
+    # 会改变事件索引行的事件字段
+    indexed_fields = {'location_id', 'timestamp', 'importance'}
+    
+    # 每条重建语句处理的事件数
+    chunk_size = 1000
+    
+    @classmethod
+    def _index_query(cls, event_filter=None):
+        """
+        构造写入索引行的语句：递归 CTE 沿 parent_location_id 向上展开事件地点的所有上级
+        
+        depth 为事件地点相对区域的层数（地点自身为0）。parent_location_id 意外成环时
+        同一区域会被展开多次，INSERT IGNORE 只保留第一行。
+        """
+        where = f" AND {event_filter}" if event_filter else ""
+        return f"""
+        INSERT IGNORE INTO event_regions (region_id, event_id, depth, timestamp, importance)
+        WITH RECURSIVE chain (event_id, region_id, depth) AS (
+            SELECT event_id, location_id, 0 FROM events
+            WHERE location_id IS NOT NULL{where}
+            UNION ALL
+            SELECT c.event_id, l.parent_location_id, c.depth + 1
+            FROM chain c
+            JOIN locations l ON l.location_id = c.region_id
+            WHERE l.parent_location_id IS NOT NULL AND c.depth < %s
+        )
+        SELECT c.region_id, c.event_id, c.depth, e.timestamp, e.importance
+        FROM chain c
+        JOIN events e ON e.event_id = c.event_id
+        """
+    
+    @classmethod
+    def _reindex_statements(cls, event_ids):
+        """按块生成删除旧索引行和写入新索引行的语句"""
+        for chunk in batched(dict.fromkeys(encode_ids(event_ids)), cls.chunk_size):
+            placeholders = ", ".join(["%s"] * len(chunk))
+            yield f"DELETE FROM event_regions WHERE event_id IN ({placeholders})", chunk
+            yield (
+                cls._index_query(f"event_id IN ({placeholders})"),
+                chunk + (LOCATION_HIERARCHY_DEPTH,)
+            )
+    
+    @classmethod
+    def reindex_events(cls, event_ids, session=None):
+        """
+        重建一组事件的索引行
+        
+        Args:
+            event_ids (list): 事件ID列表，已删除或没有地点的事件只会被移出索引
+            session (Session, optional): 事务会话，不提供时在新事务中执行
+        
+        Returns:
+            int: 写入的索引行数
+        """
+        if session is None:
+            with db.transaction() as session:
+                return cls.reindex_events(event_ids, session)
+        written = 0
+        for index, (query, params) in enumerate(cls._reindex_statements(event_ids)):
+            rowcount = session.execute_update(query, params)
+            if index % 2:
+                written += rowcount
+        return written
+    
+    @classmethod
+    async def areindex_events(cls, event_ids, session=None):
+        """reindex_events 的异步版本"""
+        if session is None:
+            async with adb.transaction() as session:
+                return await cls.areindex_events(event_ids, session)
+        written = 0
+        for index, (query, params) in enumerate(cls._reindex_statements(event_ids)):
+            rowcount = await session.execute_update(query, params)
+            if index % 2:
+                written += rowcount
+        return written
+    
+    _region_event_ids_query = "SELECT event_id FROM event_regions WHERE region_id = %s"
+    
+    @classmethod
+    def get_region_event_ids(cls, location_id, session=None):
+        """
+        获取地点子树内所有事件的ID
+        
+        Args:
+            location_id (str): 地点ID
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
+        
+        Returns:
+            list: 事件ID列表
+        """
+        rows = (session or db).execute_query(cls._region_event_ids_query, (encode_id(location_id),))
+        return [row['event_id'] for row in rows]
+    
+    @classmethod
+    async def aget_region_event_ids(cls, location_id, session=None):
+        """get_region_event_ids 的异步版本"""
+        rows = await (session or adb).execute_query(cls._region_event_ids_query, (encode_id(location_id),))
+        return [row['event_id'] for row in rows]
+    
+    @classmethod
+    def reindex_region(cls, location_id, session=None):
+        """
+        重建地点子树内所有事件的索引行，在地点修改上级后调用
+        
+        Args:
+            location_id (str): 地点ID
+            session (Session, optional): 事务会话，不提供时在新事务中执行
+        
+        Returns:
+            int: 写入的索引行数
+        """
+        if session is None:
+            with db.transaction() as session:
+                return cls.reindex_region(location_id, session)
+        return cls.reindex_events(cls.get_region_event_ids(location_id, session), session)
+    
+    @classmethod
+    async def areindex_region(cls, location_id, session=None):
+        """reindex_region 的异步版本"""
+        if session is None:
+            async with adb.transaction() as session:
+                return await cls.areindex_region(location_id, session)
+        return await cls.areindex_events(await cls.aget_region_event_ids(location_id, session), session)
+    
+    @classmethod
+    def rebuild(cls):
+        """
+        清空并重建整个索引，用于修复绕过模型层写入造成的不一致
+        
+        Returns:
+            int: 写入的索引行数
+        """
+        with db.transaction() as session:
+            session.execute_update("DELETE FROM event_regions")
+            return session.execute_update(cls._index_query(), (LOCATION_HIERARCHY_DEPTH,))
+    
+    @classmethod
+    async def arebuild(cls):
+        """rebuild 的异步版本"""
+        async with adb.transaction() as session:
+            await session.execute_update("DELETE FROM event_regions")
+            return await session.execute_update(cls._index_query(), (LOCATION_HIERARCHY_DEPTH,))
+    
+    @classmethod
+    def _region_events_query(cls, location_id, limit, order_by, since, until, max_depth):
+        """构造区域事件查询，过滤和排序都在索引列上完成"""
+        conditions, window_params = build_time_window_clause(since, until, alias='r')
+        conditions = ["r.region_id = %s"] + conditions
+        params = (encode_id(location_id),) + window_params
+        if max_depth is not None:
+            conditions.append("r.depth <= %s")
+            params += (int(max_depth),)
+        order_clause, order_params = build_event_order_clause(order_by, alias='r')
+        query = f"""
+        SELECT e.*, r.depth AS location_depth
+        FROM event_regions r
+        JOIN events e ON e.event_id = r.event_id
+        WHERE {' AND '.join(conditions)}
+        {order_clause}
+        """
+        params += order_params
+        if limit is not None:
+            query += " LIMIT %s"
+            params += (int(limit),)
+        return query, params
+    
+    @classmethod
+    def get_region_events(cls, location_id, limit=None, order_by='recency',
+                          since=None, until=None, max_depth=None):
+        """
+        获取发生在地点自身及其所有下级地点的事件
+        
+        'recency' 和 'importance' 排序直接走区域索引，只读取前 limit 行；
+        'combined' 的得分随当前时间变化，需要对区域内的全部事件排序。
+        
+        Args:
+            location_id (str): 地点ID
+            limit (int, optional): 最多返回的事件数量，None 表示不限
+            order_by (str): 排序方式 ('recency', 'importance' 或 'combined')
+            since (datetime/str, optional): 只返回该时间及之后的事件
+            until (datetime/str, optional): 只返回该时间及之前的事件
+            max_depth (int, optional): 最多向下的层数，None 表示不限
+        
+        Returns:
+            list: 事件列表，location_depth 为事件地点相对该地点的层数（自身为0）
+        """
+        query, params = cls._region_events_query(location_id, limit, order_by, since, until, max_depth)
+        return db.execute_query(query, params)
+    
+    @classmethod
+    async def aget_region_events(cls, location_id, limit=None, order_by='recency',
+                                 since=None, until=None, max_depth=None):
+        """get_region_events 的异步版本"""
+        query, params = cls._region_events_query(location_id, limit, order_by, since, until, max_depth)
+        return await adb.execute_query(query, params)
@@ -0,0 +1,59 @@
+"""
+数据变更通知，供内存中的索引、缓存等派生数据跟随数据库同步更新
+"""
+from src.db.ids import canonical_fields, canonical_id
+
+# 已注册的监听函数，签名为 listener(entity, key, deleted, fields)
+_listeners = []
+
+
+def subscribe(listener):
+    """
+    注册数据变更监听函数
+
+    监听函数在写入语句成功后同步调用，应当只做轻量的标记工作（如记录脏键），
+    不要在其中访问数据库。
+
+    Args:
+        listener (callable): listener(entity, key, deleted, fields)
+            entity 为表名，key 为主键，deleted 表示该行已被删除，
+            fields 为本次写入的字段（新建时为整行数据），未知时为 None；
+            key 和 fields 中的ID已规范为查询结果中的写法（见 src.db.ids.canonical_id）
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def unsubscribe(listener):
+    """取消注册数据变更监听函数"""
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def notify(entity, key, deleted=False, session=None, fields=None):
+    """
+    通知某一行数据发生了变化
+
+    Args:
+        entity (str): 表名
+        key: 主键
+        deleted (bool): 该行是否已被删除
+        session (Session, optional): 写入所在的事务会话，提供时推迟到事务提交后再通知
+        fields (dict, optional): 本次写入的字段
+    """
+    # 调用方传入的可能是大写或旧写法的ID，监听者按查询结果中的写法建立索引
+    key = canonical_id(key)
+    if fields is not None:
+        fields = canonical_fields(fields)
+    if session is not None:
+        session.after_commit(lambda: _dispatch(entity, key, deleted, fields))
+    else:
+        _dispatch(entity, key, deleted, fields)
+
+
+def _dispatch(entity, key, deleted, fields):
+    for listener in list(_listeners):
+        try:
+            listener(entity, key, deleted, fields)
+        except Exception as e:
+            print(f"数据变更回调失败: {e}")
@@ -1,11 +1,30 @@
 """
 地点模型类，用于管理地点的CRUD操作
 """
-from src.db import db
+from src.db import db, adb
+from src.db.ids import canonical_id, encode_field, encode_id, encode_ids
+from src.models import hooks
+from src.models.cache import entity_cache
+from src.models.event_region import EventRegion
+from src.models.sql_utils import (
+    LOCATION_HIERARCHY_DEPTH, build_keyset_clause, build_patch_query, build_text_search
+)
 
 class Location:
     """地点模型类"""
     
+    # 允许通过 update 修改的字段
+    valid_attributes = ['name', 'description', 'location_type', 'parent_location_id']
+    
+    # keyset 分页的排序列
+    page_order = [('location_id', False)]
+    
+    # 层级查询的最大深度，同时保证 parent_location_id 意外成环时递归查询也能终止
+    max_hierarchy_depth = LOCATION_HIERARCHY_DEPTH
+    
+    # 与 FULLTEXT 索引 ft_locations_search 的列一致
+    search_columns = ['name', 'description']
+    
     def __init__(self, location_id=None, name=None, description=None, 
                 location_type=None, parent_location_id=None):
         self.location_id = location_id
@@ -38,38 +57,121 @@ class Location:
         """
         
         params = (
-            location_data.get('location_id'),
+            encode_id(location_data.get('location_id')),
             location_data.get('name'),
             location_data.get('description'),
             location_data.get('location_type'),
-            location_data.get('parent_location_id')
+            encode_id(location_data.get('parent_location_id'))
         )
         
         try:
             db.execute_update(query, params)
-            return location_data.get('location_id')
+            hooks.notify('locations', location_data.get('location_id'), fields=location_data)
+            return canonical_id(location_data.get('location_id'))
         except Exception as e:
             print(f"创建地点失败: {e}")
             raise
     
     @classmethod
-    def get_by_id(cls, location_id):
+    async def acreate(cls, location_data):
+        """create 的异步版本"""
+        query = """
+        INSERT INTO locations (location_id, name, description, location_type, parent_location_id) 
+        VALUES (%s, %s, %s, %s, %s)
+        """
+        
+        params = (
+            encode_id(location_data.get('location_id')),
+            location_data.get('name'),
+            location_data.get('description'),
+            location_data.get('location_type'),
+            encode_id(location_data.get('parent_location_id'))
+        )
+        
+        try:
+            await adb.execute_update(query, params)
+            hooks.notify('locations', location_data.get('location_id'), fields=location_data)
+            return canonical_id(location_data.get('location_id'))
+        except Exception as e:
+            print(f"创建地点失败: {e}")
+            raise
+    
+    @classmethod
+    def get_by_id(cls, location_id, session=None, for_update=False):
         """
         根据ID获取地点
         
+        不在事务中时优先读取实体缓存，事务内的读取总是访问数据库。
+        
         Args:
             location_id (str): 地点ID
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
+            for_update (bool): 是否加行锁 (SELECT ... FOR UPDATE)，仅在事务中有意义
             
         Returns:
             dict: 地点数据
         """
+        if session is None:
+            cached = entity_cache.get('locations', location_id)
+            if cached is not None:
+                return cached
+        epoch = entity_cache.epoch
         query = "SELECT * FROM locations WHERE location_id = %s"
-        result = db.execute_query(query, (location_id,))
+        if for_update:
+            query += " FOR UPDATE"
+        result = (session or db).execute_query(query, (encode_id(location_id),))
         
         if result:
+            if session is None:
+                entity_cache.put('locations', location_id, result[0], epoch)
             return result[0]
         return None
     
+    @classmethod
+    async def aget_by_id(cls, location_id, session=None, for_update=False):
+        """get_by_id 的异步版本"""
+        if session is None:
+            cached = entity_cache.get('locations', location_id)
+            if cached is not None:
+                return cached
+        epoch = entity_cache.epoch
+        query = "SELECT * FROM locations WHERE location_id = %s"
+        if for_update:
+            query += " FOR UPDATE"
+        result = await (session or adb).execute_query(query, (encode_id(location_id),))
+        
+        if result:
+            if session is None:
+                entity_cache.put('locations', location_id, result[0], epoch)
+            return result[0]
+        return None
+    
+    @classmethod
+    def get_by_ids(cls, location_ids):
+        """
+        根据一组ID批量获取地点
+        
+        Args:
+            location_ids (list): 地点ID列表
+            
+        Returns:
+            list: 地点数据列表，不存在的ID不会出现在结果中
+        """
+        if not location_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(location_ids))
+        query = f"SELECT * FROM locations WHERE location_id IN ({placeholders})"
+        return db.execute_query(query, encode_ids(location_ids))
+    
+    @classmethod
+    async def aget_by_ids(cls, location_ids):
+        """get_by_ids 的异步版本"""
+        if not location_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(location_ids))
+        query = f"SELECT * FROM locations WHERE location_id IN ({placeholders})"
+        return await adb.execute_query(query, encode_ids(location_ids))
+    
     @classmethod
     def get_all(cls):
         """
@@ -81,6 +183,74 @@ class Location:
         query = "SELECT * FROM locations"
         return db.execute_query(query)
     
+    @classmethod
+    async def aget_all(cls):
+        """get_all 的异步版本"""
+        query = "SELECT * FROM locations"
+        return await adb.execute_query(query)
+    
+    @classmethod
+    def _page_query(cls, limit, after):
+        """构造按主键 keyset 分页的查询"""
+        condition, params, order_clause = build_keyset_clause(cls.page_order, after)
+        where = f"WHERE {condition}" if condition else ""
+        return f"SELECT * FROM locations {where} {order_clause} LIMIT %s", params + (int(limit),)
+    
+    @classmethod
+    def get_page(cls, limit, after=None):
+        """
+        按 location_id 顺序分页获取地点
+        
+        Args:
+            limit (int): 本页最多返回的数量
+            after (tuple, optional): 上一页最后一行在 page_order 各列上的值，None 表示第一页
+            
+        Returns:
+            list: 地点列表
+        """
+        query, params = cls._page_query(limit, after)
+        return db.execute_query(query, params)
+    
+    @classmethod
+    async def aget_page(cls, limit, after=None):
+        """get_page 的异步版本"""
+        query, params = cls._page_query(limit, after)
+        return await adb.execute_query(query, params)
+    
+    @classmethod
+    def _search_query(cls, search_term, limit):
+        """构造全文检索语句，结果按相关度降序"""
+        score_sql, score_params, where_sql, where_params = build_text_search(cls.search_columns, search_term)
+        query = f"""
+        SELECT *, {score_sql} AS relevance
+        FROM locations
+        WHERE {where_sql}
+        ORDER BY relevance DESC
+        LIMIT %s
+        """
+        return query, score_params + where_params + (limit,)
+    
+    @classmethod
+    def search(cls, search_term, limit=5):
+        """
+        使用全文索引搜索地点
+        
+        Args:
+            search_term (str): 搜索关键词
+            limit (int): 最多返回的数量
+            
+        Returns:
+            list: 匹配的地点列表，附带 relevance 相关度，按相关度降序
+        """
+        query, params = cls._search_query(search_term, limit)
+        return db.execute_query(query, params)
+    
+    @classmethod
+    async def asearch(cls, search_term, limit=5):
+        """search 的异步版本"""
+        query, params = cls._search_query(search_term, limit)
+        return await adb.execute_query(query, params)
+    
     @classmethod
     def get_child_locations(cls, parent_location_id):
         """
@@ -93,10 +263,130 @@ class Location:
             list: 子地点列表
         """
         query = "SELECT * FROM locations WHERE parent_location_id = %s"
-        return db.execute_query(query, (parent_location_id,))
+        return db.execute_query(query, (encode_id(parent_location_id),))
     
     @classmethod
-    def update(cls, location_id, attribute, value):
+    async def aget_child_locations(cls, parent_location_id):
+        """get_child_locations 的异步版本"""
+        query = "SELECT * FROM locations WHERE parent_location_id = %s"
+        return await adb.execute_query(query, (encode_id(parent_location_id),))
+    
+    @classmethod
+    def _ancestors_query(cls, location_id):
+        """构造祖先查询：递归 CTE 沿 parent_location_id 向上，一条语句返回整条路径"""
+        query = """
+        WITH RECURSIVE ancestors (location_id, parent_location_id, depth) AS (
+            SELECT location_id, parent_location_id, 0 FROM locations WHERE location_id = %s
+            UNION ALL
+            SELECT l.location_id, l.parent_location_id, a.depth + 1
+            FROM locations l
+            JOIN ancestors a ON l.location_id = a.parent_location_id
+            WHERE a.depth < %s
+        )
+        SELECT l.*, a.depth FROM ancestors a
+        JOIN locations l ON l.location_id = a.location_id
+        WHERE a.depth > 0
+        ORDER BY a.depth
+        """
+        return query, (encode_id(location_id), cls.max_hierarchy_depth)
+    
+    @classmethod
+    def get_ancestors(cls, location_id, session=None):
+        """
+        获取地点的所有上级地点
+        
+        Args:
+            location_id (str): 地点ID
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
+            
+        Returns:
+            list: 从父地点到顶层地点的列表，depth 为相隔的层数（父地点为1）
+        """
+        query, params = cls._ancestors_query(location_id)
+        return (session or db).execute_query(query, params)
+    
+    @classmethod
+    async def aget_ancestors(cls, location_id, session=None):
+        """get_ancestors 的异步版本"""
+        query, params = cls._ancestors_query(location_id)
+        return await (session or adb).execute_query(query, params)
+    
+    @classmethod
+    def _subtree_cte(cls, max_depth):
+        """递归 CTE：地点自身（depth 0）及其 max_depth 层以内的所有下级地点，走 parent_location_id 上的索引"""
+        depth = cls.max_hierarchy_depth if max_depth is None else min(int(max_depth), cls.max_hierarchy_depth)
+        cte = """
+        WITH RECURSIVE subtree (location_id, depth) AS (
+            SELECT location_id, 0 FROM locations WHERE location_id = %s
+            UNION ALL
+            SELECT l.location_id, s.depth + 1
+            FROM locations l
+            JOIN subtree s ON l.parent_location_id = s.location_id
+            WHERE s.depth < %s
+        )
+        """
+        return cte, (depth,)
+    
+    @classmethod
+    def _descendants_query(cls, location_id, max_depth):
+        """构造下级地点查询"""
+        cte, (depth,) = cls._subtree_cte(max_depth)
+        query = cte + """
+        SELECT l.*, s.depth FROM subtree s
+        JOIN locations l ON l.location_id = s.location_id
+        WHERE s.depth > 0
+        ORDER BY s.depth, l.name
+        """
+        return query, (encode_id(location_id), depth)
+    
+    @classmethod
+    def get_descendants(cls, location_id, max_depth=None):
+        """
+        获取地点的所有下级地点（不只是直接子地点）
+        
+        Args:
+            location_id (str): 地点ID
+            max_depth (int, optional): 最多向下的层数，None 表示不限
+            
+        Returns:
+            list: 下级地点列表，按层级和名称排序，depth 为相隔的层数（子地点为1）
+        """
+        query, params = cls._descendants_query(location_id, max_depth)
+        return db.execute_query(query, params)
+    
+    @classmethod
+    async def aget_descendants(cls, location_id, max_depth=None):
+        """get_descendants 的异步版本"""
+        query, params = cls._descendants_query(location_id, max_depth)
+        return await adb.execute_query(query, params)
+    
+    @classmethod
+    def get_subtree_events(cls, location_id, limit=None, order_by='recency',
+                           since=None, until=None, max_depth=None):
+        """
+        获取发生在地点自身及其所有下级地点的事件，通过区域事件索引查询（见 EventRegion）
+        
+        Args:
+            location_id (str): 地点ID
+            limit (int, optional): 最多返回的事件数量，None 表示不限
+            order_by (str): 排序方式 ('recency', 'importance' 或 'combined')
+            since (datetime/str, optional): 只返回该时间及之后的事件
+            until (datetime/str, optional): 只返回该时间及之前的事件
+            max_depth (int, optional): 最多向下的层数，None 表示不限
+            
+        Returns:
+            list: 事件列表，location_depth 为事件地点相对该地点的层数（自身为0）
+        """
+        return EventRegion.get_region_events(location_id, limit, order_by, since, until, max_depth)
+    
+    @classmethod
+    async def aget_subtree_events(cls, location_id, limit=None, order_by='recency',
+                                  since=None, until=None, max_depth=None):
+        """get_subtree_events 的异步版本"""
+        return await EventRegion.aget_region_events(location_id, limit, order_by, since, until, max_depth)
+    
+    @classmethod
+    def update(cls, location_id, attribute, value, session=None):
         """
         更新地点属性
         
@@ -104,17 +394,85 @@ class Location:
             location_id (str): 地点ID
             attribute (str): 属性名
             value: 属性值
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
             
         Returns:
             int: 受影响的行数
         """
-        valid_attributes = ['name', 'description', 'location_type', 'parent_location_id']
+        if attribute not in cls.valid_attributes:
+            raise ValueError(f"无效的地点属性: {attribute}")
+        
+        if session is None and attribute == 'parent_location_id':
+            # 修改上级时子树内事件的区域索引要在同一事务中重建
+            with db.transaction() as session:
+                return cls.update(location_id, attribute, value, session)
         
-        if attribute not in valid_attributes:
+        query = f"UPDATE locations SET {attribute} = %s WHERE location_id = %s"
+        rowcount = (session or db).execute_update(query, (encode_field(attribute, value), encode_id(location_id)))
+        if attribute == 'parent_location_id':
+            EventRegion.reindex_region(location_id, session)
+        hooks.notify('locations', location_id, session=session, fields={attribute: value})
+        return rowcount
+    
+    @classmethod
+    async def aupdate(cls, location_id, attribute, value, session=None):
+        """update 的异步版本"""
+        if attribute not in cls.valid_attributes:
             raise ValueError(f"无效的地点属性: {attribute}")
         
+        if session is None and attribute == 'parent_location_id':
+            # 修改上级时子树内事件的区域索引要在同一事务中重建
+            async with adb.transaction() as session:
+                return await cls.aupdate(location_id, attribute, value, session)
+        
         query = f"UPDATE locations SET {attribute} = %s WHERE location_id = %s"
-        return db.execute_update(query, (value, location_id))
+        rowcount = await (session or adb).execute_update(query, (encode_field(attribute, value), encode_id(location_id)))
+        if attribute == 'parent_location_id':
+            await EventRegion.areindex_region(location_id, session)
+        hooks.notify('locations', location_id, session=session, fields={attribute: value})
+        return rowcount
+    
+    @classmethod
+    def patch(cls, location_id, fields, session=None):
+        """
+        用一条 UPDATE 语句同时更新地点的多个属性
+        
+        Args:
+            location_id (str): 地点ID
+            fields (dict): 属性名到新值的映射，属性名必须在 valid_attributes 中
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
+            
+        Returns:
+            int: 受影响的行数
+        """
+        query, params = build_patch_query(
+            'locations', 'location_id', location_id, fields, cls.valid_attributes, '地点'
+        )
+        if session is None and 'parent_location_id' in fields:
+            # 修改上级时子树内事件的区域索引要在同一事务中重建
+            with db.transaction() as session:
+                return cls.patch(location_id, fields, session)
+        rowcount = (session or db).execute_update(query, params)
+        if 'parent_location_id' in fields:
+            EventRegion.reindex_region(location_id, session)
+        hooks.notify('locations', location_id, session=session, fields=fields)
+        return rowcount
+    
+    @classmethod
+    async def apatch(cls, location_id, fields, session=None):
+        """patch 的异步版本"""
+        query, params = build_patch_query(
+            'locations', 'location_id', location_id, fields, cls.valid_attributes, '地点'
+        )
+        if session is None and 'parent_location_id' in fields:
+            # 修改上级时子树内事件的区域索引要在同一事务中重建
+            async with adb.transaction() as session:
+                return await cls.apatch(location_id, fields, session)
+        rowcount = await (session or adb).execute_update(query, params)
+        if 'parent_location_id' in fields:
+            await EventRegion.areindex_region(location_id, session)
+        hooks.notify('locations', location_id, session=session, fields=fields)
+        return rowcount
     
     @classmethod
     def delete(cls, location_id):
@@ -128,4 +486,22 @@ class Location:
             int: 受影响的行数
         """
         query = "DELETE FROM locations WHERE location_id = %s"
-        return db.execute_update(query, (location_id,))
\ No newline at end of file
+        # 子树内的事件失去了该地点及其上级这些区域，删除前记下它们，删除后在同一事务中重建
+        with db.transaction() as session:
+            event_ids = EventRegion.get_region_event_ids(location_id, session)
+            rowcount = session.execute_update(query, (encode_id(location_id),))
+            EventRegion.reindex_events(event_ids, session)
+        hooks.notify('locations', location_id, deleted=True)
+        return rowcount
+    
+    @classmethod
+    async def adelete(cls, location_id):
+        """delete 的异步版本"""
+        query = "DELETE FROM locations WHERE location_id = %s"
+        # 子树内的事件失去了该地点及其上级这些区域，删除前记下它们，删除后在同一事务中重建
+        async with adb.transaction() as session:
+            event_ids = await EventRegion.aget_region_event_ids(location_id, session)
+            rowcount = await session.execute_update(query, (encode_id(location_id),))
+            await EventRegion.areindex_events(event_ids, session)
+        hooks.notify('locations', location_id, deleted=True)
+        return rowcount
\ No newline at end of file
@@ -1,11 +1,18 @@
 """
 关系模型类，用于管理角色之间的关系
 """
-from src.db import db
+from src.db import db, adb
+from src.db.ids import canonical_id, encode_id, encode_ids
+from src.models import hooks
+from src.models.cache import entity_cache
+from src.models.sql_utils import build_patch_query
 
 class Relationship:
     """关系模型类"""
     
+    # 允许通过 update 修改的字段
+    valid_attributes = ['relationship_type', 'strength', 'description']
+    
     def __init__(self, relationship_id=None, character_id_1=None, character_id_2=None, 
                 relationship_type=None, strength=None, description=None):
         self.relationship_id = relationship_id
@@ -15,6 +22,52 @@ class Relationship:
         self.strength = strength
         self.description = description
     
+    _insert_query = """
+    INSERT INTO relationships (
+        relationship_id, character_id_1, character_id_2, 
+        relationship_type, strength, description
+    ) VALUES (%s, %s, %s, %s, %s, %s)
+    """
+    
+    @staticmethod
+    def canonical_pair(character_id_1, character_id_2):
+        """
+        返回两个角色ID的规范顺序（较小的在前）
+        
+        关系是无向的，存储时总是按规范顺序写入 character_id_1 和 character_id_2，
+        唯一索引 uq_relationships_pair 保证同一对角色只有一条关系，
+        两个角色之间的查询因此只需一次点查。大小按存储的 BINARY(16) 值比较，
+        与ID字符串的大小写和写法无关。
+        """
+        if character_id_2 is not None and (
+            character_id_1 is None or encode_id(character_id_2) < encode_id(character_id_1)
+        ):
+            return character_id_2, character_id_1
+        return character_id_1, character_id_2
+    
+    @classmethod
+    def _canonicalize(cls, relationship_data):
+        """返回角色对按规范顺序排列的关系数据副本"""
+        character_id_1, character_id_2 = cls.canonical_pair(
+            relationship_data.get('character_id_1'), relationship_data.get('character_id_2')
+        )
+        return {**relationship_data, 'character_id_1': character_id_1, 'character_id_2': character_id_2}
+    
+    @classmethod
+    def _insert_params(cls, relationship_data):
+        """按插入语句的列顺序构造参数，角色对按规范顺序写入"""
+        character_id_1, character_id_2 = cls.canonical_pair(
+            relationship_data.get('character_id_1'), relationship_data.get('character_id_2')
+        )
+        return (
+            encode_id(relationship_data.get('relationship_id')),
+            encode_id(character_id_1),
+            encode_id(character_id_2),
+            relationship_data.get('relationship_type'),
+            relationship_data.get('strength'),
+            relationship_data.get('description')
+        )
+    
     @classmethod
     def create(cls, relationship_data):
         """
@@ -34,47 +87,166 @@ class Relationship:
         Returns:
             str: 关系ID
         """
-        query = """
-        INSERT INTO relationships (
-            relationship_id, character_id_1, character_id_2, 
-            relationship_type, strength, description
-        ) VALUES (%s, %s, %s, %s, %s, %s)
+        try:
+            db.execute_update(cls._insert_query, cls._insert_params(relationship_data))
+            hooks.notify('relationships', relationship_data.get('relationship_id'), fields=cls._canonicalize(relationship_data))
+            return canonical_id(relationship_data.get('relationship_id'))
+        except Exception as e:
+            print(f"创建关系失败: {e}")
+            raise
+    
+    @classmethod
+    async def acreate(cls, relationship_data):
+        """create 的异步版本"""
+        try:
+            await adb.execute_update(cls._insert_query, cls._insert_params(relationship_data))
+            hooks.notify('relationships', relationship_data.get('relationship_id'), fields=cls._canonicalize(relationship_data))
+            return canonical_id(relationship_data.get('relationship_id'))
+        except Exception as e:
+            print(f"创建关系失败: {e}")
+            raise
+    
+    @classmethod
+    def create_many(cls, relationships_data, chunk_size=1000):
         """
+        批量创建关系，使用多行 INSERT 按块执行，整批在一个事务中提交，失败时全部回滚
         
-        params = (
-            relationship_data.get('relationship_id'),
-            relationship_data.get('character_id_1'),
-            relationship_data.get('character_id_2'),
-            relationship_data.get('relationship_type'),
-            relationship_data.get('strength'),
-            relationship_data.get('description')
-        )
-        
+        Args:
+            relationships_data (list): 关系数据列表，每项格式同 create
+            chunk_size (int): 每条 INSERT 语句的行数
+            
+        Returns:
+            list: 关系ID列表
+        """
         try:
-            db.execute_update(query, params)
-            return relationship_data.get('relationship_id')
+            with db.transaction() as session:
+                session.execute_many(cls._insert_query, [cls._insert_params(d) for d in relationships_data], chunk_size)
+                for d in relationships_data:
+                    hooks.notify('relationships', d.get('relationship_id'), session=session, fields=cls._canonicalize(d))
+            return [canonical_id(d.get('relationship_id')) for d in relationships_data]
         except Exception as e:
-            print(f"创建关系失败: {e}")
+            print(f"批量创建关系失败: {e}")
+            raise
+    
+    @classmethod
+    async def acreate_many(cls, relationships_data, chunk_size=1000):
+        """create_many 的异步版本"""
+        try:
+            async with adb.transaction() as session:
+                await session.execute_many(cls._insert_query, [cls._insert_params(d) for d in relationships_data], chunk_size)
+                for d in relationships_data:
+                    hooks.notify('relationships', d.get('relationship_id'), session=session, fields=cls._canonicalize(d))
+            return [canonical_id(d.get('relationship_id')) for d in relationships_data]
+        except Exception as e:
+            print(f"批量创建关系失败: {e}")
             raise
     
     @classmethod
-    def get_by_id(cls, relationship_id):
+    def get_by_id(cls, relationship_id, session=None, for_update=False):
         """
         根据ID获取关系
         
+        不在事务中时优先读取实体缓存，事务内的读取总是访问数据库。
+        
         Args:
             relationship_id (str): 关系ID
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
+            for_update (bool): 是否加行锁 (SELECT ... FOR UPDATE)，仅在事务中有意义
             
         Returns:
             dict: 关系数据
         """
+        if session is None:
+            cached = entity_cache.get('relationships', relationship_id)
+            if cached is not None:
+                return cached
+        epoch = entity_cache.epoch
+        query = "SELECT * FROM relationships WHERE relationship_id = %s"
+        if for_update:
+            query += " FOR UPDATE"
+        result = (session or db).execute_query(query, (encode_id(relationship_id),))
+        
+        if result:
+            if session is None:
+                entity_cache.put('relationships', relationship_id, result[0], epoch)
+            return result[0]
+        return None
+    
+    @classmethod
+    async def aget_by_id(cls, relationship_id, session=None, for_update=False):
+        """get_by_id 的异步版本"""
+        if session is None:
+            cached = entity_cache.get('relationships', relationship_id)
+            if cached is not None:
+                return cached
+        epoch = entity_cache.epoch
         query = "SELECT * FROM relationships WHERE relationship_id = %s"
-        result = db.execute_query(query, (relationship_id,))
+        if for_update:
+            query += " FOR UPDATE"
+        result = await (session or adb).execute_query(query, (encode_id(relationship_id),))
         
         if result:
+            if session is None:
+                entity_cache.put('relationships', relationship_id, result[0], epoch)
             return result[0]
         return None
     
+    @classmethod
+    def get_by_ids(cls, relationship_ids):
+        """
+        根据一组ID批量获取关系
+        
+        Args:
+            relationship_ids (list): 关系ID列表
+        
+        Returns:
+            list: 关系数据列表，不存在的ID不会出现在结果中
+        """
+        if not relationship_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(relationship_ids))
+        query = f"SELECT * FROM relationships WHERE relationship_id IN ({placeholders})"
+        return db.execute_query(query, encode_ids(relationship_ids))
+    
+    @classmethod
+    async def aget_by_ids(cls, relationship_ids):
+        """get_by_ids 的异步版本"""
+        if not relationship_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(relationship_ids))
+        query = f"SELECT * FROM relationships WHERE relationship_id IN ({placeholders})"
+        return await adb.execute_query(query, encode_ids(relationship_ids))
+    
+    @classmethod
+    def get_all(cls):
+        """
+        获取所有关系
+        
+        Returns:
+            list: 关系列表
+        """
+        query = "SELECT * FROM relationships"
+        return db.execute_query(query)
+    
+    @classmethod
+    async def aget_all(cls):
+        """get_all 的异步版本"""
+        query = "SELECT * FROM relationships"
+        return await adb.execute_query(query)
+    
+    # 两个分支分别走 uq_relationships_pair 的前缀和 character_id_2 上的外键索引，
+    # 避免 OR 条件导致的全表扫描；第二个分支排除自身关系，以免同一行出现两次
+    _character_relationships_query = """
+    SELECT r.*, c1.name as character_1_name, c2.name as character_2_name
+    FROM (
+        SELECT * FROM relationships WHERE character_id_1 = %s
+        UNION ALL
+        SELECT * FROM relationships WHERE character_id_2 = %s AND character_id_1 <> %s
+    ) r
+    JOIN characters c1 ON r.character_id_1 = c1.character_id
+    JOIN characters c2 ON r.character_id_2 = c2.character_id
+    """
+    
     @classmethod
     def get_character_relationships(cls, character_id):
         """
@@ -86,20 +258,54 @@ class Relationship:
         Returns:
             list: 关系列表
         """
-        query = """
-        SELECT r.*, c1.name as character_1_name, c2.name as character_2_name
-        FROM relationships r
-        JOIN characters c1 ON r.character_id_1 = c1.character_id
-        JOIN characters c2 ON r.character_id_2 = c2.character_id
-        WHERE r.character_id_1 = %s OR r.character_id_2 = %s
+        return db.execute_query(cls._character_relationships_query, (encode_id(character_id),) * 3)
+    
+    @classmethod
+    async def aget_character_relationships(cls, character_id):
+        """get_character_relationships 的异步版本"""
+        return await adb.execute_query(cls._character_relationships_query, (encode_id(character_id),) * 3)
+    
+    @staticmethod
+    def _edges_query(count):
+        """构造 get_edges 的 UNION 查询，写法同 _character_relationships_query"""
+        placeholders = ", ".join(["%s"] * count)
+        return f"""
+        SELECT character_id_1, character_id_2, strength
+        FROM relationships WHERE character_id_1 IN ({placeholders})
+        UNION ALL
+        SELECT character_id_1, character_id_2, strength
+        FROM relationships WHERE character_id_2 IN ({placeholders}) AND character_id_1 NOT IN ({placeholders})
+        """
+    
+    @classmethod
+    def get_edges(cls, character_ids):
+        """
+        批量获取与一组角色相连的关系边，用于在关系图上逐层扩展
+        
+        Args:
+            character_ids (list): 角色ID列表
+            
+        Returns:
+            list: [{'character_id_1', 'character_id_2', 'strength'}]
         """
-        return db.execute_query(query, (character_id, character_id))
+        if not character_ids:
+            return []
+        return db.execute_query(cls._edges_query(len(character_ids)), encode_ids(character_ids) * 3)
+    
+    @classmethod
+    async def aget_edges(cls, character_ids):
+        """get_edges 的异步版本"""
+        if not character_ids:
+            return []
+        return await adb.execute_query(cls._edges_query(len(character_ids)), encode_ids(character_ids) * 3)
     
     @classmethod
     def get_relationship_between_characters(cls, character_id_1, character_id_2):
         """
         获取两个角色之间的关系
         
+        参数顺序不限，按规范顺序在唯一索引上点查。
+        
         Args:
             character_id_1 (str): 角色1 ID
             character_id_2 (str): 角色2 ID
@@ -107,19 +313,25 @@ class Relationship:
         Returns:
             dict: 关系数据
         """
-        query = """
-        SELECT * FROM relationships 
-        WHERE (character_id_1 = %s AND character_id_2 = %s)
-           OR (character_id_1 = %s AND character_id_2 = %s)
-        """
-        result = db.execute_query(query, (character_id_1, character_id_2, character_id_2, character_id_1))
+        query = "SELECT * FROM relationships WHERE character_id_1 = %s AND character_id_2 = %s"
+        result = db.execute_query(query, encode_ids(cls.canonical_pair(character_id_1, character_id_2)))
+        
+        if result:
+            return result[0]
+        return None
+    
+    @classmethod
+    async def aget_relationship_between_characters(cls, character_id_1, character_id_2):
+        """get_relationship_between_characters 的异步版本"""
+        query = "SELECT * FROM relationships WHERE character_id_1 = %s AND character_id_2 = %s"
+        result = await adb.execute_query(query, encode_ids(cls.canonical_pair(character_id_1, character_id_2)))
         
         if result:
             return result[0]
         return None
     
     @classmethod
-    def update_relationship(cls, relationship_id, attribute, value):
+    def update_relationship(cls, relationship_id, attribute, value, session=None):
         """
         更新关系属性
         
@@ -127,17 +339,59 @@ class Relationship:
             relationship_id (str): 关系ID
             attribute (str): 属性名
             value: 属性值
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
             
         Returns:
             int: 受影响的行数
         """
-        valid_attributes = ['relationship_type', 'strength', 'description']
+        if attribute not in cls.valid_attributes:
+            raise ValueError(f"无效的关系属性: {attribute}")
         
-        if attribute not in valid_attributes:
+        query = f"UPDATE relationships SET {attribute} = %s WHERE relationship_id = %s"
+        rowcount = (session or db).execute_update(query, (value, encode_id(relationship_id)))
+        hooks.notify('relationships', relationship_id, session=session, fields={attribute: value})
+        return rowcount
+    
+    @classmethod
+    async def aupdate_relationship(cls, relationship_id, attribute, value, session=None):
+        """update_relationship 的异步版本"""
+        if attribute not in cls.valid_attributes:
             raise ValueError(f"无效的关系属性: {attribute}")
         
         query = f"UPDATE relationships SET {attribute} = %s WHERE relationship_id = %s"
-        return db.execute_update(query, (value, relationship_id))
+        rowcount = await (session or adb).execute_update(query, (value, encode_id(relationship_id)))
+        hooks.notify('relationships', relationship_id, session=session, fields={attribute: value})
+        return rowcount
+    
+    @classmethod
+    def patch(cls, relationship_id, fields, session=None):
+        """
+        用一条 UPDATE 语句同时更新关系的多个属性
+        
+        Args:
+            relationship_id (str): 关系ID
+            fields (dict): 属性名到新值的映射，属性名必须在 valid_attributes 中
+            session (Session, optional): 事务会话，提供时在该会话的连接上执行
+            
+        Returns:
+            int: 受影响的行数
+        """
+        query, params = build_patch_query(
+            'relationships', 'relationship_id', relationship_id, fields, cls.valid_attributes, '关系'
+        )
+        rowcount = (session or db).execute_update(query, params)
+        hooks.notify('relationships', relationship_id, session=session, fields=fields)
+        return rowcount
+    
+    @classmethod
+    async def apatch(cls, relationship_id, fields, session=None):
+        """patch 的异步版本"""
+        query, params = build_patch_query(
+            'relationships', 'relationship_id', relationship_id, fields, cls.valid_attributes, '关系'
+        )
+        rowcount = await (session or adb).execute_update(query, params)
+        hooks.notify('relationships', relationship_id, session=session, fields=fields)
+        return rowcount
     
     @classmethod
     def delete(cls, relationship_id):
@@ -151,4 +405,14 @@ class Relationship:
             int: 受影响的行数
         """
         query = "DELETE FROM relationships WHERE relationship_id = %s"
-        return db.execute_update(query, (relationship_id,))
\ No newline at end of file
+        rowcount = db.execute_update(query, (encode_id(relationship_id),))
+        hooks.notify('relationships', relationship_id, deleted=True)
+        return rowcount
+    
+    @classmethod
+    async def adelete(cls, relationship_id):
+        """delete 的异步版本"""
+        query = "DELETE FROM relationships WHERE relationship_id = %s"
+        rowcount = await adb.execute_update(query, (encode_id(relationship_id),))
+        hooks.notify('relationships', relationship_id, deleted=True)
+        return rowcount
\ No newline at end of file
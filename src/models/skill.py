@@ -1,11 +1,18 @@
 """
 技能模型类，用于管理技能的CRUD操作
 """
-from src.db import db
+from src.db import db, adb
+from src.db.ids import canonical_id, encode_id
+from src.models import hooks
+from src.models.cache import entity_cache
+from src.models.sql_utils import build_keyset_clause
 
 class Skill:
     """技能模型类"""
     
+    # keyset 分页的排序列
+    page_order = [('skill_id', False)]
+    
     def __init__(self, skill_id=None, name=None, description=None):
         self.skill_id = skill_id
         self.name = name
@@ -33,14 +40,37 @@ class Skill:
         """
         
         params = (
-            skill_data.get('skill_id'),
+            encode_id(skill_data.get('skill_id')),
             skill_data.get('name'),
             skill_data.get('description')
         )
         
         try:
             db.execute_update(query, params)
-            return skill_data.get('skill_id')
+            hooks.notify('skills', skill_data.get('skill_id'), fields=skill_data)
+            return canonical_id(skill_data.get('skill_id'))
+        except Exception as e:
+            print(f"创建技能失败: {e}")
+            raise
+    
+    @classmethod
+    async def acreate(cls, skill_data):
+        """create 的异步版本"""
+        query = """
+        INSERT INTO skills (skill_id, name, description) 
+        VALUES (%s, %s, %s)
+        """
+        
+        params = (
+            encode_id(skill_data.get('skill_id')),
+            skill_data.get('name'),
+            skill_data.get('description')
+        )
+        
+        try:
+            await adb.execute_update(query, params)
+            hooks.notify('skills', skill_data.get('skill_id'), fields=skill_data)
+            return canonical_id(skill_data.get('skill_id'))
         except Exception as e:
             print(f"创建技能失败: {e}")
             raise
@@ -50,16 +80,38 @@ class Skill:
         """
         根据ID获取技能
         
+        优先读取实体缓存，未命中时查询数据库并回填。
+        
         Args:
             skill_id (str): 技能ID
             
         Returns:
             dict: 技能数据
         """
+        cached = entity_cache.get('skills', skill_id)
+        if cached is not None:
+            return cached
+        epoch = entity_cache.epoch
         query = "SELECT * FROM skills WHERE skill_id = %s"
-        result = db.execute_query(query, (skill_id,))
+        result = db.execute_query(query, (encode_id(skill_id),))
         
         if result:
+            entity_cache.put('skills', skill_id, result[0], epoch)
+            return result[0]
+        return None
+    
+    @classmethod
+    async def aget_by_id(cls, skill_id):
+        """get_by_id 的异步版本"""
+        cached = entity_cache.get('skills', skill_id)
+        if cached is not None:
+            return cached
+        epoch = entity_cache.epoch
+        query = "SELECT * FROM skills WHERE skill_id = %s"
+        result = await adb.execute_query(query, (encode_id(skill_id),))
+        
+        if result:
+            entity_cache.put('skills', skill_id, result[0], epoch)
             return result[0]
         return None
     
@@ -74,6 +126,40 @@ class Skill:
         query = "SELECT * FROM skills"
         return db.execute_query(query)
     
+    @classmethod
+    async def aget_all(cls):
+        """get_all 的异步版本"""
+        query = "SELECT * FROM skills"
+        return await adb.execute_query(query)
+    
+    @classmethod
+    def _page_query(cls, limit, after):
+        """构造按主键 keyset 分页的查询"""
+        condition, params, order_clause = build_keyset_clause(cls.page_order, after)
+        where = f"WHERE {condition}" if condition else ""
+        return f"SELECT * FROM skills {where} {order_clause} LIMIT %s", params + (int(limit),)
+    
+    @classmethod
+    def get_page(cls, limit, after=None):
+        """
+        按 skill_id 顺序分页获取技能
+        
+        Args:
+            limit (int): 本页最多返回的数量
+            after (tuple, optional): 上一页最后一行在 page_order 各列上的值，None 表示第一页
+            
+        Returns:
+            list: 技能列表
+        """
+        query, params = cls._page_query(limit, after)
+        return db.execute_query(query, params)
+    
+    @classmethod
+    async def aget_page(cls, limit, after=None):
+        """get_page 的异步版本"""
+        query, params = cls._page_query(limit, after)
+        return await adb.execute_query(query, params)
+    
     @classmethod
     def update_description(cls, skill_id, description):
         """
@@ -87,7 +173,17 @@ class Skill:
             int: 受影响的行数
         """
         query = "UPDATE skills SET description = %s WHERE skill_id = %s"
-        return db.execute_update(query, (description, skill_id))
+        rowcount = db.execute_update(query, (description, encode_id(skill_id)))
+        hooks.notify('skills', skill_id, fields={'description': description})
+        return rowcount
+    
+    @classmethod
+    async def aupdate_description(cls, skill_id, description):
+        """update_description 的异步版本"""
+        query = "UPDATE skills SET description = %s WHERE skill_id = %s"
+        rowcount = await adb.execute_update(query, (description, encode_id(skill_id)))
+        hooks.notify('skills', skill_id, fields={'description': description})
+        return rowcount
     
     @classmethod
     def delete(cls, skill_id):
@@ -101,4 +197,14 @@ class Skill:
             int: 受影响的行数
         """
         query = "DELETE FROM skills WHERE skill_id = %s"
-        return db.execute_update(query, (skill_id,))
\ No newline at end of file
+        rowcount = db.execute_update(query, (encode_id(skill_id),))
+        hooks.notify('skills', skill_id, deleted=True)
+        return rowcount
+    
+    @classmethod
+    async def adelete(cls, skill_id):
+        """delete 的异步版本"""
+        query = "DELETE FROM skills WHERE skill_id = %s"
+        rowcount = await adb.execute_update(query, (encode_id(skill_id),))
+        hooks.notify('skills', skill_id, deleted=True)
+        return rowcount
\ No newline at end of file
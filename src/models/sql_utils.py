@@ -0,0 +1,184 @@
+"""
+模型层共用的SQL构造函数
+"""
+from src.db.ids import encode_field, encode_id
+
+
+def build_patch_query(table, key_column, key, fields, valid_attributes, entity_name):
+    """
+    构造一次更新多个字段的 UPDATE 语句
+
+    Args:
+        table (str): 表名
+        key_column (str): 主键列名
+        key (str): 主键ID
+        fields (dict): 字段名到新值的映射
+        valid_attributes (list): 允许更新的字段白名单
+        entity_name (str): 实体名称，用于错误信息
+
+    Returns:
+        tuple: (query, params)
+    """
+    if not fields:
+        raise ValueError(f"未提供要更新的{entity_name}属性")
+
+    invalid = [name for name in fields if name not in valid_attributes]
+    if invalid:
+        raise ValueError(f"无效的{entity_name}属性: {', '.join(invalid)}")
+
+    # 列名只来自白名单，值全部参数化
+    assignments = ", ".join(f"{name} = %s" for name in fields)
+    query = f"UPDATE {table} SET {assignments} WHERE {key_column} = %s"
+    params = tuple(encode_field(name, value) for name, value in fields.items()) + (encode_id(key),)
+    return query, params
+
+
+# 综合排序中时间衰减的半衰期（秒）：事件每经过这么久，其时间权重减半
+EVENT_RECENCY_HALF_LIFE = 7 * 24 * 3600
+
+# 事件排序方式
+EVENT_ORDERINGS = ('recency', 'importance', 'combined')
+
+# 支持 keyset 分页的事件排序方式及其排序列，以 event_id 保证顺序唯一；
+# 'combined' 的得分随当前时间变化，无法作为稳定的分页键
+EVENT_KEYSET_ORDERINGS = {
+    'recency': [('timestamp', True), ('event_id', True)],
+    'importance': [('importance', True), ('timestamp', True), ('event_id', True)],
+}
+
+# 地点层级查询的最大深度，同时保证 parent_location_id 意外成环时递归查询也能终止
+LOCATION_HIERARCHY_DEPTH = 64
+
+
+def build_event_order_clause(order_by='recency', alias='e'):
+    """
+    构造事件列表的 ORDER BY 子句
+
+    Args:
+        order_by (str): 排序方式
+            'recency'    按时间倒序
+            'importance' 按重要性倒序，同等重要性按时间倒序
+            'combined'   按 重要性 × 时间衰减 的综合得分倒序
+        alias (str): events 表在查询中的别名
+
+    Returns:
+        tuple: (order_clause, params)
+    """
+    if order_by == 'recency':
+        return f"ORDER BY {alias}.timestamp DESC", ()
+    if order_by == 'importance':
+        return f"ORDER BY {alias}.importance DESC, {alias}.timestamp DESC", ()
+    if order_by == 'combined':
+        return (
+            f"ORDER BY COALESCE({alias}.importance, 1) "
+            f"* POW(0.5, GREATEST(TIMESTAMPDIFF(SECOND, {alias}.timestamp, NOW()), 0) / %s) DESC, "
+            f"{alias}.timestamp DESC",
+            (EVENT_RECENCY_HALF_LIFE,)
+        )
+    raise ValueError(f"无效的事件排序方式: {order_by}，可选值: {', '.join(EVENT_ORDERINGS)}")
+
+
+def build_keyset_clause(columns, after=None, alias=None, nullable=()):
+    """
+    构造 keyset 分页的过滤条件和 ORDER BY 子句
+
+    下一页从上一页最后一行之后开始，不像 OFFSET 那样需要先扫描并丢弃前面所有的行。
+    排序列有索引时按索引直接定位，第 N 页与第 1 页的代价相同；按计算列（如全文检索的
+    相关度）排序时每页仍要对全部候选行重新计算并排序，只省去了跳过前面各行的开销。
+    NULL 按 MySQL 的规则视为最小值（升序在前，降序在后）。
+
+    Args:
+        columns (list): 排序列 [(列名, 是否降序)]，各列组合必须唯一，通常以主键结尾
+        after (tuple, optional): 上一页最后一行在这些列上的值，None 表示第一页
+        alias (str, optional): 表在查询中的别名
+        nullable (tuple): 可能为 NULL 的列名
+
+    Returns:
+        tuple: (条件，第一页时为 None, params, order_clause)
+    """
+    prefix = f"{alias}." if alias else ""
+    order_clause = "ORDER BY " + ", ".join(
+        f"{prefix}{name} {'DESC' if descending else 'ASC'}" for name, descending in columns
+    )
+    if after is None:
+        return None, (), order_clause
+    if len(after) != len(columns):
+        raise ValueError("分页游标与排序列不匹配")
+
+    # 从最后一列开始向前嵌套：c1 在后 OR (c1 相等 AND (c2 在后 OR (...)))
+    condition, params = None, ()
+    for (name, descending), value in reversed(list(zip(columns, after))):
+        column = f"{prefix}{name}"
+        value = encode_field(name, value)
+        if value is None:
+            # NULL 最小：降序时没有更靠后的值，升序时所有非 NULL 值都在后
+            beyond, beyond_params = (None, ()) if descending else (f"{column} IS NOT NULL", ())
+            equal, equal_params = f"{column} IS NULL", ()
+        else:
+            beyond = f"{column} {'<' if descending else '>'} %s"
+            if descending and name in nullable:
+                beyond = f"({beyond} OR {column} IS NULL)"
+            beyond_params = (value,)
+            equal, equal_params = f"{column} = %s", (value,)
+
+        parts, part_params = [], ()
+        if beyond:
+            parts.append(beyond)
+            part_params += beyond_params
+        if condition:
+            parts.append(f"({equal} AND {condition})")
+            part_params += equal_params + params
+        condition = f"({' OR '.join(parts)})" if parts else "FALSE"
+        params = part_params
+    return condition, params, order_clause
+
+
+def build_time_window_clause(since=None, until=None, alias='e'):
+    """
+    构造事件时间窗口的过滤条件
+
+    Args:
+        since: 起始时间（包含），None 表示不限
+        until: 结束时间（包含），None 表示不限
+        alias (str): events 表在查询中的别名
+
+    Returns:
+        tuple: (条件列表, params)
+    """
+    conditions = []
+    params = ()
+    if since is not None:
+        conditions.append(f"{alias}.timestamp >= %s")
+        params += (since,)
+    if until is not None:
+        conditions.append(f"{alias}.timestamp <= %s")
+        params += (until,)
+    return conditions, params
+
+
+# 与 MySQL 的 ngram_token_size 保持一致（默认2），短于该长度的关键词无法命中 ngram 全文索引
+NGRAM_TOKEN_SIZE = 2
+
+
+def build_text_search(columns, term):
+    """
+    构造全文检索的相关度表达式和过滤条件
+
+    columns 必须与某个 FULLTEXT 索引的列完全一致。关键词短于 ngram 分词长度时
+    退化为 LIKE 匹配，此时相关度恒为0。
+
+    Args:
+        columns (list): 参与检索的列
+        term (str): 搜索关键词
+
+    Returns:
+        tuple: (score_sql, score_params, where_sql, where_params)
+    """
+    term = (term or '').strip()
+    if len(term) >= NGRAM_TOKEN_SIZE:
+        match = f"MATCH({', '.join(columns)}) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+        return match, (term,), match, (term,)
+
+    pattern = f"%{term}%"
+    where = "(" + " OR ".join(f"{column} LIKE %s" for column in columns) + ")"
+    return "0", (), where, (pattern,) * len(columns)
@@ -46,6 +46,8 @@ def create_tables():
         connection = mysql.connector.connect(**DB_CONFIG)
         cursor = connection.cursor()
         
+        # 这里是初始结构，ID列建为 VARCHAR(36)，之后由迁移 0007_binary_ids 改为 BINARY(16)
+        
         # 创建角色表
         create_characters_table = """
         CREATE TABLE IF NOT EXISTS characters (
@@ -0,0 +1,173 @@
+"""
+数据库迁移执行器，按版本号顺序执行 src/utils/migrations 下尚未应用的迁移
+"""
+import importlib
+import os
+import pkgutil
+import re
+import sys
+import logging
+import mysql.connector
+
+# 添加项目根目录到系统路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from config.database import DB_CONFIG
+from src.utils import migrations
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MIGRATION_NAME_PATTERN = re.compile(r'^(\d{4})_(\w+)$')
+
+
+def discover_migrations():
+    """
+    列出所有迁移模块
+
+    Returns:
+        list: [(version, name, module_name)]，按版本号升序
+    """
+    found = []
+    for module_info in pkgutil.iter_modules(migrations.__path__):
+        match = MIGRATION_NAME_PATTERN.match(module_info.name)
+        if match:
+            found.append((int(match.group(1)), match.group(2), module_info.name))
+    found.sort()
+
+    versions = [version for version, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"迁移版本号重复: {versions}")
+    return found
+
+
+def ensure_version_table(cursor):
+    """创建记录已应用迁移的 schema_version 表"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT PRIMARY KEY,
+        name VARCHAR(200) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """)
+
+
+def get_current_version(cursor):
+    """获取当前已应用的最高迁移版本，未应用任何迁移时返回0"""
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+
+def index_exists(cursor, table, index_name):
+    """检查当前数据库中指定表上是否已有该索引"""
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+        """,
+        (table, index_name)
+    )
+    return cursor.fetchone() is not None
+
+
+def create_index(cursor, table, index_name, columns, unique=False, fulltext=False, parser=None):
+    """
+    创建索引；索引已存在时跳过，使中途失败的迁移可以安全重跑
+
+    Args:
+        cursor: 数据库游标
+        table (str): 表名
+        index_name (str): 索引名
+        columns (list): 列名列表
+        unique (bool): 是否唯一索引
+        fulltext (bool): 是否全文索引
+        parser (str, optional): 全文索引的分词器，如 'ngram'
+    """
+    if index_exists(cursor, table, index_name):
+        logger.info(f"索引 {table}.{index_name} 已存在，跳过")
+        return
+    kind = "UNIQUE INDEX" if unique else "FULLTEXT INDEX" if fulltext else "INDEX"
+    statement = f"CREATE {kind} {index_name} ON {table} ({', '.join(columns)})"
+    if parser:
+        statement += f" WITH PARSER {parser}"
+    logger.info(f"创建索引 {table}.{index_name}...")
+    cursor.execute(statement)
+
+
+def drop_index(cursor, table, index_name):
+    """删除索引；索引不存在时跳过"""
+    if not index_exists(cursor, table, index_name):
+        return
+    logger.info(f"删除索引 {table}.{index_name}...")
+    cursor.execute(f"DROP INDEX {index_name} ON {table}")
+
+
+def run_migrations(target_version=None):
+    """
+    执行所有尚未应用的迁移
+
+    MySQL 的 DDL 会隐式提交，因此每个迁移成功后立即记录版本号；
+    迁移失败时停止执行，已成功的迁移保留，修复后重新运行即可从失败处继续。
+
+    Args:
+        target_version (int, optional): 只迁移到该版本为止
+
+    Returns:
+        bool: 是否全部成功
+    """
+    try:
+        connection = mysql.connector.connect(**DB_CONFIG)
+    except mysql.connector.Error as err:
+        logger.error(f"连接数据库失败: {err}")
+        return False
+
+    cursor = connection.cursor()
+    try:
+        ensure_version_table(cursor)
+        current = get_current_version(cursor)
+        pending = [
+            m for m in discover_migrations()
+            if m[0] > current and (target_version is None or m[0] <= target_version)
+        ]
+        if not pending:
+            logger.info(f"数据库结构已是最新版本 ({current})")
+            return True
+
+        for version, name, module_name in pending:
+            logger.info(f"执行迁移 {module_name}...")
+            module = importlib.import_module(f"{migrations.__name__}.{module_name}")
+            module.up(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                (version, name)
+            )
+            connection.commit()
+            logger.info(f"迁移 {module_name} 完成")
+        return True
+    except Exception as e:
+        logger.error(f"迁移失败: {e}")
+        try:
+            connection.rollback()
+        except mysql.connector.Error:
+            pass
+        return False
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def main():
+    """主函数，执行数据库迁移"""
+    if run_migrations():
+        logger.info("数据库迁移完成")
+    else:
+        logger.error("数据库迁移失败")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
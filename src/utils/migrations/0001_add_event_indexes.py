@@ -0,0 +1,14 @@
+"""
+为 events 表的热点查询添加索引
+
+- Event.get_page 按 timestamp 排序分页
+- Event.get_events_by_location 按 location_id 过滤并按 timestamp 排序
+- 按 event_type 过滤并按 importance 排序
+"""
+from src.utils.migrate import create_index
+
+
+def up(cursor):
+    create_index(cursor, 'events', 'idx_events_timestamp', ['timestamp'])
+    create_index(cursor, 'events', 'idx_events_location_timestamp', ['location_id', 'timestamp'])
+    create_index(cursor, 'events', 'idx_events_type_importance', ['event_type', 'importance'])
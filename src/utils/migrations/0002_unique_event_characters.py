@@ -0,0 +1,21 @@
+"""
+为 event_characters 添加 (character_id, event_id) 唯一索引
+
+EventCharacter.get_events_involving_character 先按 character_id 定位再关联 events，
+该索引同时保证同一角色不会重复登记到同一事件。建索引前先删除已有的重复记录，保留最早的一条。
+"""
+from src.utils.migrate import create_index
+
+
+def up(cursor):
+    cursor.execute("""
+    DELETE ec1 FROM event_characters ec1
+    JOIN event_characters ec2
+      ON ec1.event_id = ec2.event_id
+     AND ec1.character_id = ec2.character_id
+     AND ec1.relation_id > ec2.relation_id
+    """)
+    create_index(
+        cursor, 'event_characters', 'uq_event_characters_character_event',
+        ['character_id', 'event_id'], unique=True
+    )
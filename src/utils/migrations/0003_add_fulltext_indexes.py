@@ -0,0 +1,22 @@
+"""
+为记忆检索添加使用 ngram 分词器的 FULLTEXT 索引
+
+ngram 分词器按固定长度切分文本，中文等不以空格分词的内容也能被正确索引。
+索引列必须与 MATCH() 中的列完全一致，见 Character.search、Location.search 和 Event.search_events。
+"""
+from src.utils.migrate import create_index
+
+
+def up(cursor):
+    create_index(
+        cursor, 'characters', 'ft_characters_search',
+        ['name', 'occupation', 'backstory'], fulltext=True, parser='ngram'
+    )
+    create_index(
+        cursor, 'locations', 'ft_locations_search',
+        ['name', 'description'], fulltext=True, parser='ngram'
+    )
+    create_index(
+        cursor, 'events', 'ft_events_search',
+        ['title', 'description'], fulltext=True, parser='ngram'
+    )
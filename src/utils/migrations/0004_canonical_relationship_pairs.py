@@ -0,0 +1,42 @@
+"""
+把 relationships 的角色对改为规范顺序存储，并添加 (character_id_1, character_id_2) 唯一索引
+
+关系是无向的，Relationship 写入时总是把较小的角色ID放在 character_id_1
+（见 Relationship.canonical_pair），两个角色之间的查询因此是一次点查，
+按角色查询拆成两个分别走索引的 UNION 分支。
+
+迁移步骤：
+1. 同一对角色（不论先后顺序）有多条关系时只保留最近更新的一条
+2. 把顺序不规范的行交换 character_id_1 和 character_id_2
+3. 创建唯一索引
+"""
+from src.utils.migrate import create_index
+
+
+def up(cursor):
+    cursor.execute("""
+    DELETE r1 FROM relationships r1
+    JOIN relationships r2
+      ON LEAST(r1.character_id_1, r1.character_id_2) = LEAST(r2.character_id_1, r2.character_id_2)
+     AND GREATEST(r1.character_id_1, r1.character_id_2) = GREATEST(r2.character_id_1, r2.character_id_2)
+     AND (r1.updated_at < r2.updated_at
+          OR (r1.updated_at = r2.updated_at AND r1.relationship_id > r2.relationship_id))
+    """)
+
+    # 规范顺序以 Python 的字符串比较为准（与 Relationship.canonical_pair 一致），不依赖列的排序规则
+    cursor.execute("SELECT relationship_id, character_id_1, character_id_2 FROM relationships")
+    swapped = [
+        (character_id_2, character_id_1, relationship_id)
+        for relationship_id, character_id_1, character_id_2 in cursor.fetchall()
+        if character_id_2 < character_id_1
+    ]
+    if swapped:
+        cursor.executemany(
+            "UPDATE relationships SET character_id_1 = %s, character_id_2 = %s WHERE relationship_id = %s",
+            swapped
+        )
+
+    create_index(
+        cursor, 'relationships', 'uq_relationships_pair',
+        ['character_id_1', 'character_id_2'], unique=True
+    )
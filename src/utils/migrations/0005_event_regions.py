@@ -0,0 +1,43 @@
+"""
+创建区域事件索引表 event_regions 并回填
+
+每个事件在其地点自身及每一级上级地点下各有一行（见 src.models.event_region.EventRegion），
+冗余存储 timestamp 和 importance，按区域取最近或最重要的前 k 个事件只需一次索引范围扫描。
+回填用一条递归 CTE 为所有已有事件展开其地点的上级链。
+"""
+
+
+def up(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS event_regions (
+        region_id VARCHAR(36) NOT NULL,
+        event_id VARCHAR(36) NOT NULL,
+        depth INT NOT NULL,
+        timestamp TIMESTAMP NULL,
+        importance INT,
+        PRIMARY KEY (region_id, event_id),
+        KEY idx_event_regions_event (event_id),
+        KEY idx_event_regions_recency (region_id, timestamp),
+        KEY idx_event_regions_importance (region_id, importance, timestamp),
+        FOREIGN KEY (region_id) REFERENCES locations(location_id) ON DELETE CASCADE,
+        FOREIGN KEY (event_id) REFERENCES events(event_id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+    """)
+
+    # 中途失败后重跑时先清空已回填的部分；层数上限与 LOCATION_HIERARCHY_DEPTH 一致
+    cursor.execute("DELETE FROM event_regions")
+    cursor.execute("""
+    INSERT IGNORE INTO event_regions (region_id, event_id, depth, timestamp, importance)
+    WITH RECURSIVE chain (event_id, region_id, depth) AS (
+        SELECT event_id, location_id, 0 FROM events
+        WHERE location_id IS NOT NULL
+        UNION ALL
+        SELECT c.event_id, l.parent_location_id, c.depth + 1
+        FROM chain c
+        JOIN locations l ON l.location_id = c.region_id
+        WHERE l.parent_location_id IS NOT NULL AND c.depth < 64
+    )
+    SELECT c.region_id, c.event_id, c.depth, e.timestamp, e.importance
+    FROM chain c
+    JOIN events e ON e.event_id = c.event_id
+    """)
@@ -0,0 +1,15 @@
+"""
+为 events 添加 (location_id, importance, timestamp) 索引
+
+Event.get_events_by_location 按重要性排序并分页时，下一页的 keyset 条件和排序
+都落在这个索引上，第 N 页与第 1 页一样只读取一页的行。按时间排序使用 0001 中的
+idx_events_location_timestamp，InnoDB 二级索引末尾隐含的主键 event_id 提供了唯一的顺序。
+"""
+from src.utils.migrate import create_index
+
+
+def up(cursor):
+    create_index(
+        cursor, 'events', 'idx_events_location_importance',
+        ['location_id', 'importance', 'timestamp']
+    )
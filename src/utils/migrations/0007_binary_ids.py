@@ -0,0 +1,144 @@
+"""
+把所有ID列从 VARCHAR(36) 改为 BINARY(16)
+
+utf8mb4 的 VARCHAR(36) 主键最多占 144 字节，聚簇索引和引用它的每个二级索引都要存一份；
+随机的 UUIDv4 还让插入分散在整棵 B+ 树上，造成大量页分裂。改为 16 字节二进制后索引
+显著缩小，新ID由 src.db.ids 生成按时间递增的 UUIDv7，插入总是追加在索引末尾。
+已有的ID保留原值，只改变存储格式。
+
+迁移步骤（每一步都检查当前状态，中途失败后可以重跑）：
+1. 删除ID列上的外键，外键两端的列类型必须一致
+2. 把不是标准 UUID 写法的旧ID改写为 src.db.ids.parse_id 映射的 UUID，
+   模型层对输入的旧ID做同样的映射，旧ID仍然能找到对应的行
+3. 每张表先改为 VARBINARY(36) 保留原字符串，用 UUID_TO_BIN 就地转换，再改为 BINARY(16)
+4. 按二进制值重新规范 relationships 的角色对顺序（见 Relationship.canonical_pair）
+5. 重新创建外键
+"""
+import logging
+
+from src.db.ids import parse_id
+
+logger = logging.getLogger(__name__)
+
+# 各表的ID列 -> 是否允许 NULL
+ID_COLUMNS = {
+    'characters': {'character_id': False},
+    'locations': {'location_id': False, 'parent_location_id': True},
+    'skills': {'skill_id': False},
+    'items': {'item_id': False},
+    'relationships': {'relationship_id': False, 'character_id_1': False, 'character_id_2': False},
+    'events': {'event_id': False, 'location_id': True},
+    'character_skills': {'character_id': False, 'skill_id': False},
+    'event_characters': {'event_id': False, 'character_id': False},
+    'character_location_state': {'character_id': False, 'location_id': False},
+    'event_regions': {'region_id': False, 'event_id': False},
+}
+
+# (表, 列, 被引用的表, 被引用的列, ON DELETE)，与 init_database 和 0005_event_regions 中的定义一致
+FOREIGN_KEYS = [
+    ('locations', 'parent_location_id', 'locations', 'location_id', 'SET NULL'),
+    ('relationships', 'character_id_1', 'characters', 'character_id', 'CASCADE'),
+    ('relationships', 'character_id_2', 'characters', 'character_id', 'CASCADE'),
+    ('events', 'location_id', 'locations', 'location_id', 'SET NULL'),
+    ('character_skills', 'character_id', 'characters', 'character_id', 'CASCADE'),
+    ('character_skills', 'skill_id', 'skills', 'skill_id', 'CASCADE'),
+    ('event_characters', 'event_id', 'events', 'event_id', 'CASCADE'),
+    ('event_characters', 'character_id', 'characters', 'character_id', 'CASCADE'),
+    ('character_location_state', 'character_id', 'characters', 'character_id', 'CASCADE'),
+    ('character_location_state', 'location_id', 'locations', 'location_id', 'CASCADE'),
+    ('event_regions', 'region_id', 'locations', 'location_id', 'CASCADE'),
+    ('event_regions', 'event_id', 'events', 'event_id', 'CASCADE'),
+]
+
+
+def _foreign_key_names(cursor, table, column):
+    """列上已有的外键约束名"""
+    cursor.execute(
+        """
+        SELECT constraint_name FROM information_schema.key_column_usage
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+          AND referenced_table_name IS NOT NULL
+        """,
+        (table, column)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _column_types(cursor, table):
+    """表中各列的 data_type"""
+    cursor.execute(
+        """
+        SELECT column_name, data_type FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s
+        """,
+        (table,)
+    )
+    return {name: data_type.lower() for name, data_type in cursor.fetchall()}
+
+
+def _modify(table, columns, column_type):
+    """构造一次修改多个ID列类型的 ALTER TABLE 语句，保留各列的 NULL 约束"""
+    null = {True: "NULL", False: "NOT NULL"}
+    modifications = ", ".join(
+        f"MODIFY {column} {column_type} {null[nullable]}" for column, nullable in columns.items()
+    )
+    return f"ALTER TABLE {table} {modifications}"
+
+
+def _canonicalize_legacy_ids(cursor, table, column):
+    """把不是标准 UUID 写法的旧ID改写为 parse_id 给出的 UUID 字符串"""
+    cursor.execute(f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL AND NOT IS_UUID({column})")
+    legacy = [row[0] for row in cursor.fetchall()]
+    if legacy:
+        logger.info(f"{table}.{column}: 改写 {len(legacy)} 个旧ID")
+        cursor.executemany(
+            f"UPDATE {table} SET {column} = %s WHERE {column} = %s",
+            [(str(parse_id(value)), value) for value in legacy]
+        )
+
+
+def up(cursor):
+    for table, column, _, _, _ in FOREIGN_KEYS:
+        for name in _foreign_key_names(cursor, table, column):
+            cursor.execute(f"ALTER TABLE {table} DROP FOREIGN KEY {name}")
+
+    for table, columns in ID_COLUMNS.items():
+        types = _column_types(cursor, table)
+        text_columns = {c: n for c, n in columns.items() if types[c] in ('varchar', 'char')}
+        for column in text_columns:
+            _canonicalize_legacy_ids(cursor, table, column)
+        if text_columns:
+            cursor.execute(_modify(table, text_columns, "VARBINARY(36)"))
+
+        pending = {c: n for c, n in columns.items() if types[c] != 'binary'}
+        if not pending:
+            continue
+        logger.info(f"转换表 {table} 的ID列: {', '.join(pending)}")
+        # 已经是 16 字节的值来自中断的上一次执行，不再转换
+        assignments = ", ".join(
+            f"{column} = IF(LENGTH({column}) = 16, {column}, UUID_TO_BIN({column}))" for column in pending
+        )
+        cursor.execute(f"UPDATE {table} SET {assignments}")
+        cursor.execute(_modify(table, pending, "BINARY(16)"))
+
+    cursor.execute(
+        "SELECT relationship_id, character_id_1, character_id_2 FROM relationships "
+        "WHERE character_id_2 < character_id_1"
+    )
+    swapped = [
+        (character_id_2, character_id_1, relationship_id)
+        for relationship_id, character_id_1, character_id_2 in cursor.fetchall()
+    ]
+    if swapped:
+        cursor.executemany(
+            "UPDATE relationships SET character_id_1 = %s, character_id_2 = %s WHERE relationship_id = %s",
+            swapped
+        )
+
+    for table, column, referenced_table, referenced_column, on_delete in FOREIGN_KEYS:
+        if _foreign_key_names(cursor, table, column):
+            continue
+        cursor.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT fk_{table}_{column} FOREIGN KEY ({column}) "
+            f"REFERENCES {referenced_table}({referenced_column}) ON DELETE {on_delete}"
+        )
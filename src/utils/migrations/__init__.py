@@ -0,0 +1,6 @@
+"""
+数据库迁移脚本包
+
+每个迁移是一个以四位版本号开头的模块（如 0001_add_event_indexes.py），
+提供 up(cursor) 函数。迁移只向前执行，已发布的迁移不要修改，新的变更请新增迁移文件。
+"""
@@ -0,0 +1,488 @@
+"""
+列式二进制世界快照：字典编码的字符串、整数化的 UUID、按块压缩，内存映射读取
+
+文件布局:
+
+    MAGIC | 数据块 ... | 目录 (JSON) | 目录偏移 (u64) | 目录长度 (u32) | MAGIC
+
+每张表按行组（row group）切分，行组内每列单独编码为若干数据块：
+
+    int / float             定长数组 + NULL 标记
+    datetime / date         同上，分别存为微秒时间戳和天数
+    uuid                    全文件共享的 UUID 表中的 int32 编号，-1 为 NULL
+    str                     本行组的字典（UTF-8 拼接 + 偏移）+ int32 编码，-1 为 NULL
+    null                    整列都是 NULL，不占数据块
+
+UUID 表只存一份 16 字节的值，外键列与主键列引用同一个编号。数据块按写入时选择的
+编码器压缩（zstd > lz4 > zlib，前两者需安装 zstandard 或 lz4），编码器名记录在
+每个块的目录项中，读取时不必与写入环境相同，只需能解压该编码器。
+"""
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import uuid
+import zlib
+from datetime import date, datetime
+from itertools import batched
+import mysql.connector
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# 添加项目根目录到系统路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from config.database import DB_CONFIG
+from src.utils.migrate import ensure_version_table, get_current_version
+from src.utils.transfer import (
+    TABLES, encode_rows, insert_query, iter_batches, load_session, rebuild_derived
+)
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'NMSNAP01'
+TRAILER = struct.Struct('<QI8s')
+FORMAT_VERSION = 1
+
+# 每个行组的行数：越大压缩率越高，写入时占用的内存也越多
+DEFAULT_ROW_GROUP_SIZE = 65536
+
+# 可以用快照预热实体缓存的表及其主键，数量最多的表放在最后
+CACHED_TABLES = {
+    'characters': 'character_id',
+    'locations': 'location_id',
+    'skills': 'skill_id',
+    'relationships': 'relationship_id',
+    'events': 'event_id',
+}
+
+UUID_PATTERN = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+
+def _codec_table():
+    """当前环境可用的编码器：名称 -> (压缩函数, 解压函数(数据, 原始长度))"""
+    codecs = {
+        'none': (bytes, lambda data, size: bytes(data)),
+        'zlib': (lambda data: zlib.compress(data, 6), lambda data, size: zlib.decompress(data)),
+    }
+    if zstandard is not None:
+        codecs['zstd'] = (
+            zstandard.ZstdCompressor(level=3).compress,
+            lambda data, size: zstandard.ZstdDecompressor().decompress(data, max_output_size=size),
+        )
+    if lz4_frame is not None:
+        codecs['lz4'] = (lz4_frame.compress, lambda data, size: lz4_frame.decompress(data))
+    return codecs
+
+
+CODECS = _codec_table()
+
+
+def default_codec():
+    """可用编码器中压缩率和速度最均衡的一个，退回 zlib 时记录警告"""
+    for name in ('zstd', 'lz4', 'zlib'):
+        if name in CODECS:
+            if name == 'zlib':
+                logger.warning('未安装 zstandard 和 lz4，快照使用 zlib 压缩；安装 ".[snapshot]" 可获得更快的压缩')
+            return name
+
+
+def _column_kind(values):
+    """根据一列中非 NULL 的值决定编码方式"""
+    present = [v for v in values if v is not None]
+    if not present:
+        return 'null'
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        if all(-2 ** 63 <= v < 2 ** 63 for v in present):
+            return 'int'
+    if all(isinstance(v, float) for v in present):
+        return 'float'
+    if all(isinstance(v, datetime) and v.tzinfo is None for v in present):
+        return 'datetime'
+    if all(type(v) is date for v in present):
+        return 'date'
+    if all(isinstance(v, str) and UUID_PATTERN.match(v) for v in present):
+        return 'uuid'
+    return 'str'
+
+
+def _text(value):
+    """把无法定长编码的值转为字符串"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    return str(value)
+
+
+class SnapshotWriter:
+    """
+    快照写入器
+
+    用法:
+        with SnapshotWriter(path) as writer:
+            writer.add_table('events', columns)
+            writer.add_row_group('events', rows)
+    """
+
+    def __init__(self, path, codec=None, schema_version=0):
+        codec = codec or default_codec()
+        if codec not in CODECS:
+            raise ValueError(f"不可用的压缩方式: {codec}，可选值: {', '.join(CODECS)}")
+        self.path = path
+        self.codec = codec
+        self._compress = CODECS[codec][0]
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._uuids = {}
+        self._tables = {}
+        self._directory = {
+            'version': FORMAT_VERSION,
+            'schema_version': schema_version,
+            'created_at': datetime.now().isoformat(sep=' '),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self.path)
+
+    def _write_block(self, array):
+        """压缩并写入一个数组，返回其目录项"""
+        array = np.ascontiguousarray(array)
+        raw = array.tobytes()
+        data = self._compress(raw)
+        offset = self._file.tell()
+        self._file.write(data)
+        return {
+            'offset': offset, 'length': len(data), 'size': len(raw),
+            'dtype': array.dtype.str, 'codec': self.codec,
+        }
+
+    def _nulls(self, values):
+        mask = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+        return self._write_block(mask) if mask.any() else None
+
+    def _encode_column(self, values):
+        """编码一个行组中的一列，返回其目录项"""
+        kind = _column_kind(values)
+        spec = {'kind': kind}
+        if kind == 'int':
+            spec['values'] = self._write_block(np.array([v or 0 for v in values], dtype=np.int64))
+            spec['nulls'] = self._nulls(values)
+        elif kind == 'float':
+            spec['values'] = self._write_block(np.array([v or 0.0 for v in values], dtype=np.float64))
+            spec['nulls'] = self._nulls(values)
+        elif kind == 'datetime':
+            stamps = np.array([v or datetime(1970, 1, 1) for v in values], dtype='datetime64[us]')
+            spec['values'] = self._write_block(stamps.astype(np.int64))
+            spec['nulls'] = self._nulls(values)
+        elif kind == 'date':
+            days = np.array([v or date(1970, 1, 1) for v in values], dtype='datetime64[D]')
+            spec['values'] = self._write_block(days.astype(np.int64))
+            spec['nulls'] = self._nulls(values)
+        elif kind == 'uuid':
+            codes = [-1 if v is None else self._uuids.setdefault(v, len(self._uuids)) for v in values]
+            spec['codes'] = self._write_block(np.array(codes, dtype=np.int32))
+        elif kind == 'str':
+            dictionary = {}
+            codes = [-1 if v is None else dictionary.setdefault(_text(v), len(dictionary)) for v in values]
+            encoded = [s.encode('utf-8') for s in dictionary]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+            spec['codes'] = self._write_block(np.array(codes, dtype=np.int32))
+            spec['offsets'] = self._write_block(offsets)
+            spec['data'] = self._write_block(np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        return spec
+
+    def add_table(self, table, columns):
+        """登记一张表及其列名，空表也会出现在快照中"""
+        self._tables[table] = {'columns': list(columns), 'rows': 0, 'groups': []}
+
+    def add_row_group(self, table, rows):
+        """
+        写入一个行组
+
+        Args:
+            table (str): 已通过 add_table 登记的表名
+            rows (list): 行元组列表，列顺序与 add_table 时相同
+        """
+        if not rows:
+            return
+        entry = self._tables[table]
+        columns = list(zip(*rows))
+        entry['groups'].append({
+            'rows': len(rows),
+            'columns': [self._encode_column(values) for values in columns],
+        })
+        entry['rows'] += len(rows)
+
+    def close(self):
+        """写入 UUID 表、目录和文件尾"""
+        packed = b''.join(uuid.UUID(value).bytes for value in self._uuids)
+        self._directory['uuids'] = self._write_block(np.frombuffer(packed, dtype=np.uint8))
+        self._directory['tables'] = self._tables
+        directory = json.dumps(self._directory, ensure_ascii=False).encode('utf-8')
+        offset = self._file.tell()
+        self._file.write(directory)
+        self._file.write(TRAILER.pack(offset, len(directory), MAGIC))
+        self._file.close()
+
+
+class SnapshotReader:
+    """
+    快照读取器，以只读内存映射打开文件，按需解压各列的数据块
+
+    用法:
+        with SnapshotReader(path) as reader:
+            for rows in reader.iter_row_groups('events'):
+                ...
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("不是 NarraMind 快照文件")
+        try:
+            self._directory = self._read_directory()
+        except Exception:
+            self.close()
+            raise
+        self._uuid_table = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _read_directory(self):
+        size = len(self._map)
+        if size < len(MAGIC) + TRAILER.size or self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError("不是 NarraMind 快照文件")
+        offset, length, magic = TRAILER.unpack_from(self._map, size - TRAILER.size)
+        if magic != MAGIC:
+            raise ValueError("快照文件不完整")
+        directory = json.loads(self._map[offset:offset + length])
+        if directory.get('version') != FORMAT_VERSION:
+            raise ValueError(f"不支持的快照格式版本: {directory.get('version')}")
+        return directory
+
+    @property
+    def schema_version(self):
+        return self._directory['schema_version']
+
+    @property
+    def created_at(self):
+        return self._directory['created_at']
+
+    def tables(self):
+        """快照中的表名，按写入顺序（外键依赖顺序）"""
+        return list(self._directory['tables'])
+
+    def columns(self, table):
+        return self._directory['tables'][table]['columns']
+
+    def row_count(self, table):
+        return self._directory['tables'][table]['rows']
+
+    def _block(self, ref):
+        """解压一个数据块为 numpy 数组"""
+        codec = ref['codec']
+        if codec not in CODECS:
+            raise ValueError(f"快照使用了 {codec} 压缩，当前环境未安装对应的库")
+        with memoryview(self._map) as view:
+            data = CODECS[codec][1](view[ref['offset']:ref['offset'] + ref['length']], ref['size'])
+        return np.frombuffer(data, dtype=np.dtype(ref['dtype']))
+
+    def _uuids(self):
+        if self._uuid_table is None:
+            packed = self._block(self._directory['uuids']).reshape(-1, 16)
+            self._uuid_table = [str(uuid.UUID(bytes=row.tobytes())) for row in packed]
+        return self._uuid_table
+
+    def _with_nulls(self, spec, values):
+        if spec.get('nulls') is None:
+            return values
+        mask = self._block(spec['nulls'])
+        return [None if null else value for value, null in zip(values, mask.tolist())]
+
+    def _decode_column(self, spec, rows):
+        """解码一个行组中的一列为 Python 值列表"""
+        kind = spec['kind']
+        if kind == 'null':
+            return [None] * rows
+        if kind in ('int', 'float'):
+            return self._with_nulls(spec, self._block(spec['values']).tolist())
+        if kind == 'datetime':
+            stamps = self._block(spec['values']).astype('datetime64[us]').tolist()
+            return self._with_nulls(spec, stamps)
+        if kind == 'date':
+            days = self._block(spec['values']).astype('datetime64[D]').tolist()
+            return self._with_nulls(spec, days)
+        codes = self._block(spec['codes']).tolist()
+        if kind == 'uuid':
+            table = self._uuids()
+        else:
+            offsets = self._block(spec['offsets']).tolist()
+            data = self._block(spec['data']).tobytes()
+            table = [data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+        return [None if code < 0 else table[code] for code in codes]
+
+    def iter_row_groups(self, table):
+        """
+        逐个行组读取一张表
+
+        Yields:
+            list: 行元组列表，列顺序同 columns(table)
+        """
+        for group in self._directory['tables'][table]['groups']:
+            columns = [self._decode_column(spec, group['rows']) for spec in group['columns']]
+            yield list(zip(*columns))
+
+    def iter_rows(self, table):
+        """
+        逐行读取一张表
+
+        Yields:
+            dict: 列名到值的映射
+        """
+        columns = self.columns(table)
+        for rows in self.iter_row_groups(table):
+            for row in rows:
+                yield dict(zip(columns, row))
+
+
+def write_snapshot(path, codec=None, row_group_size=DEFAULT_ROW_GROUP_SIZE, tables=None):
+    """
+    把当前数据库中的世界写为快照
+
+    所有表在同一个一致性快照事务中读取，每次只在内存中保留一个行组。
+
+    Args:
+        path (str): 输出文件路径
+        codec (str, optional): 压缩方式 ('zstd', 'lz4', 'zlib' 或 'none')，默认取可用的最优者
+        row_group_size (int): 每个行组的行数
+        tables (list, optional): 只写入这些表，默认写入 TABLES 中的所有表
+
+    Returns:
+        dict: 各表写入的行数
+    """
+    tables = [t for t in TABLES if tables is None or t in tables]
+    counts = {}
+    connection = mysql.connector.connect(**DB_CONFIG)
+    cursor = connection.cursor()
+    try:
+        ensure_version_table(cursor)
+        schema_version = get_current_version(cursor)
+        connection.start_transaction(consistent_snapshot=True, readonly=True)
+        with SnapshotWriter(path, codec, schema_version) as writer:
+            for table in tables:
+                counts[table] = 0
+                cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+                cursor.fetchall()
+                writer.add_table(table, cursor.column_names)
+                for _, rows in iter_batches(cursor, table, row_group_size):
+                    writer.add_row_group(table, rows)
+                    counts[table] += len(rows)
+                logger.info(f"快照表 {table}: {counts[table]} 行")
+        connection.commit()
+        return counts
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def restore_snapshot(path, chunk_size=5000, truncate=False, warm=False):
+    """
+    把快照批量写入数据库
+
+    与 JSONL 导入相同，写入期间关闭本会话的外键检查，写完后统一校验；整个恢复在一个事务中
+    提交，失败时全部回滚，数据库保持恢复前的状态。提交后重建派生索引。
+
+    Args:
+        path (str): 快照文件路径
+        chunk_size (int): 每条 INSERT 语句的行数
+        truncate (bool): 写入前清空所有表；为 False 时目标表必须为空
+        warm (bool): 写入后是否用快照预热本进程的实体缓存
+
+    Returns:
+        dict: 各表写入的行数
+    """
+    counts = {}
+    with SnapshotReader(path) as reader:
+        with load_session(truncate) as (cursor, schema_version, columns_by_table):
+            if reader.schema_version > schema_version:
+                raise ValueError(
+                    f"快照的数据库结构版本 ({reader.schema_version}) 比当前数据库 ({schema_version}) 新，"
+                    f"请先升级当前环境"
+                )
+            for table in reader.tables():
+                columns = reader.columns(table)
+                query = insert_query(table, columns, columns_by_table)
+                counts[table] = 0
+                for rows in reader.iter_row_groups(table):
+                    for chunk in batched(rows, chunk_size):
+                        cursor.executemany(query, encode_rows(columns, chunk))
+                    counts[table] += len(rows)
+                logger.info(f"恢复表 {table}: {counts[table]} 行")
+
+        rebuild_derived()
+        if warm:
+            warm_caches(reader)
+    return counts
+
+
+def warm_caches(reader):
+    """
+    用快照中的行预热本进程的实体缓存，只应在数据库刚从同一快照恢复后调用
+
+    按 CACHED_TABLES 的顺序写入，缓存满后停止。
+
+    Args:
+        reader (SnapshotReader): 已打开的快照
+
+    Returns:
+        int: 写入缓存的行数
+    """
+    from src.models.cache import entity_cache
+
+    if not entity_cache.enabled:
+        return 0
+    epoch = entity_cache.epoch
+    warmed = 0
+    for table, key in CACHED_TABLES.items():
+        if table not in reader.tables():
+            continue
+        for row in reader.iter_rows(table):
+            if warmed >= entity_cache.maxsize:
+                return warmed
+            entity_cache.put(table, row[key], row, epoch)
+            warmed += 1
+    logger.info(f"实体缓存预热: {warmed} 行")
+    return warmed
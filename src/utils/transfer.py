@@ -0,0 +1,366 @@
+"""
+整个世界的流式导出和导入，格式为每行一个 JSON 对象的 JSONL
+"""
+import gzip
+import json
+import logging
+import os
+import sys
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import mysql.connector
+
+# 添加项目根目录到系统路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from config.database import DB_CONFIG
+from src.db.ids import ID_COLUMNS, decode_id, encode_id
+from src.utils.migrate import ensure_version_table, get_current_version
+
+logger = logging.getLogger(__name__)
+
+# init_database 创建的所有表，按外键依赖排序：被引用的表在前。
+# event_regions 由 events 和 locations 派生，不导出，导入后重建
+TABLES = [
+    'characters',
+    'locations',
+    'skills',
+    'items',
+    'relationships',
+    'events',
+    'character_skills',
+    'event_characters',
+    'character_location_state',
+]
+
+FORMAT_NAME = 'narramind'
+FORMAT_VERSION = 1
+
+
+def _open(path, mode):
+    """以文本方式打开导出文件，.gz 结尾时按 gzip 压缩读写"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _json_default(value):
+    """把 MySQL 返回的非 JSON 原生类型转为导入时 MySQL 可以直接接受的值"""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, (date, timedelta, Decimal)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    raise TypeError(f"无法序列化的值类型: {type(value).__name__}")
+
+
+def _convert_ids(columns, rows, convert):
+    """对每行的ID列应用 convert，没有ID列时原样返回"""
+    positions = [i for i, name in enumerate(columns) if name in ID_COLUMNS]
+    if not positions:
+        return rows
+    converted = []
+    for row in rows:
+        row = list(row)
+        for i in positions:
+            row[i] = convert(row[i])
+        converted.append(tuple(row))
+    return converted
+
+
+def iter_batches(cursor, table, fetch_size=1000):
+    """
+    按批读取一张表
+
+    使用非缓冲游标按 fetch_size 分批取回，内存占用与表的大小无关。
+    同一连接上的下一条查询必须在本生成器耗尽之后执行。ID列转换为字符串，
+    导出文件和快照与存储格式无关。
+
+    Yields:
+        tuple: (列名列表, 本批的行元组列表)
+    """
+    cursor.execute(f"SELECT * FROM {table}")
+    columns = list(cursor.column_names)
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            return
+        yield columns, _convert_ids(columns, rows, decode_id)
+
+
+def iter_rows(cursor, table, fetch_size=1000):
+    """
+    逐行读取一张表，用法同 iter_batches
+
+    Yields:
+        dict: 列名到值的映射
+    """
+    for columns, rows in iter_batches(cursor, table, fetch_size):
+        for row in rows:
+            yield dict(zip(columns, row))
+
+
+def export_world(path, tables=None, fetch_size=1000):
+    """
+    把整个世界导出为 JSONL 文件
+
+    第一行是文件头 {"format", "version", "schema_version"}，之后每行为
+    {"table": 表名, "row": {列名: 值}}，各表按外键依赖顺序依次写出。
+    所有表在同一个一致性快照事务中读取，导出期间的写入不会造成前后不一致。
+
+    Args:
+        path (str): 输出文件路径，.gz 结尾时压缩
+        tables (list, optional): 只导出这些表，默认导出 TABLES 中的所有表
+        fetch_size (int): 每次从服务器取回的行数
+
+    Returns:
+        dict: 各表导出的行数
+    """
+    tables = [t for t in TABLES if tables is None or t in tables]
+    counts = {}
+    connection = mysql.connector.connect(**DB_CONFIG)
+    cursor = connection.cursor()
+    try:
+        ensure_version_table(cursor)
+        schema_version = get_current_version(cursor)
+        connection.start_transaction(consistent_snapshot=True, readonly=True)
+
+        with _open(path, 'w') as out:
+            header = {'format': FORMAT_NAME, 'version': FORMAT_VERSION, 'schema_version': schema_version}
+            out.write(json.dumps(header) + '\n')
+            for table in tables:
+                count = 0
+                for row in iter_rows(cursor, table, fetch_size):
+                    record = {'table': table, 'row': row}
+                    out.write(json.dumps(record, ensure_ascii=False, default=_json_default) + '\n')
+                    count += 1
+                counts[table] = count
+                logger.info(f"导出表 {table}: {count} 行")
+        connection.commit()
+        return counts
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def _table_columns(cursor):
+    """当前数据库中 TABLES 各表的列名，导入时用作列名白名单"""
+    placeholders = ", ".join(["%s"] * len(TABLES))
+    cursor.execute(
+        f"""
+        SELECT table_name, column_name FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name IN ({placeholders})
+        """,
+        tuple(TABLES)
+    )
+    columns = {}
+    for table, column in cursor.fetchall():
+        columns.setdefault(table, set()).add(column)
+    return columns
+
+
+def _read_header(line, schema_version):
+    """校验文件头，导出时的结构版本不能比当前数据库新"""
+    try:
+        header = json.loads(line)
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get('format') != FORMAT_NAME:
+        raise ValueError("不是 NarraMind 导出文件")
+    if header.get('version') != FORMAT_VERSION:
+        raise ValueError(f"不支持的导出格式版本: {header.get('version')}")
+    if header.get('schema_version', 0) > schema_version:
+        raise ValueError(
+            f"导出文件的数据库结构版本 ({header['schema_version']}) 比当前数据库 ({schema_version}) 新，"
+            f"请先升级当前环境"
+        )
+
+
+def find_orphans(cursor, tables=TABLES):
+    """
+    检查外键：找出引用了不存在的行的记录
+
+    Returns:
+        list: [(表名, 列名, 被引用的表, 孤立的行数)]
+    """
+    placeholders = ", ".join(["%s"] * len(tables))
+    cursor.execute(
+        f"""
+        SELECT table_name, column_name, referenced_table_name, referenced_column_name
+        FROM information_schema.key_column_usage
+        WHERE table_schema = DATABASE() AND referenced_table_name IS NOT NULL
+          AND table_name IN ({placeholders})
+        """,
+        tuple(tables)
+    )
+    orphans = []
+    for table, column, referenced_table, referenced_column in cursor.fetchall():
+        cursor.execute(
+            f"""
+            SELECT COUNT(*) FROM {table} c
+            LEFT JOIN {referenced_table} p ON p.{referenced_column} = c.{column}
+            WHERE c.{column} IS NOT NULL AND p.{referenced_column} IS NULL
+            """
+        )
+        count = cursor.fetchone()[0]
+        if count:
+            orphans.append((table, column, referenced_table, count))
+    return orphans
+
+
+def begin_load(cursor, truncate=False):
+    """
+    准备批量写入：检查表结构，关闭本会话的外键检查，清空或确认目标表为空
+
+    清空使用 DELETE 而不是 TRUNCATE：TRUNCATE 会隐式提交，之后失败时无法回滚到写入前的状态。
+
+    Args:
+        cursor: 数据库游标
+        truncate (bool): 是否清空所有表；为 False 时目标表必须为空
+
+    Returns:
+        tuple: (当前结构版本, 各表的列名集合)
+    """
+    ensure_version_table(cursor)
+    schema_version = get_current_version(cursor)
+    columns_by_table = _table_columns(cursor)
+    missing = [t for t in TABLES if t not in columns_by_table]
+    if missing:
+        raise ValueError(f"数据库缺少表: {', '.join(missing)}，请先初始化数据库")
+
+    cursor.execute("SET SESSION foreign_key_checks = 0")
+    if truncate:
+        for table in reversed(TABLES):
+            cursor.execute(f"DELETE FROM {table}")
+    else:
+        for table in TABLES:
+            cursor.execute(f"SELECT 1 FROM {table} LIMIT 1")
+            if cursor.fetchall():
+                raise ValueError(f"表 {table} 不为空，使用 --truncate 先清空所有表")
+    return schema_version, columns_by_table
+
+
+def insert_query(table, columns, columns_by_table):
+    """构造多行 INSERT 语句，表名和列名必须在 begin_load 返回的白名单中"""
+    if table not in columns_by_table:
+        raise ValueError(f"未知的表 {table}")
+    unknown = set(columns) - columns_by_table[table]
+    if unknown:
+        raise ValueError(f"表 {table} 没有列 {', '.join(sorted(unknown))}")
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))})"
+    )
+
+
+def encode_rows(columns, rows):
+    """把待写入行中的ID列转换为存储格式"""
+    return _convert_ids(columns, rows, encode_id)
+
+
+def finish_load(cursor):
+    """恢复外键检查并统一校验外键，有孤立记录时抛出 ValueError"""
+    cursor.execute("SET SESSION foreign_key_checks = 1")
+    orphans = find_orphans(cursor)
+    for table, column, referenced_table, count in orphans:
+        logger.error(f"{table}.{column} 中有 {count} 行引用了 {referenced_table} 中不存在的记录")
+    if orphans:
+        raise ValueError("导入的数据不满足外键约束")
+
+
+@contextmanager
+def load_session(truncate=False):
+    """
+    在一个事务中批量写入：begin_load 之后交给调用方写入，finish_load 校验通过后才提交
+
+    任何一步失败（包括外键校验）都会回滚，清空的表和已写入的行一起撤销，
+    数据库保持写入前的状态。
+
+    Args:
+        truncate (bool): 是否清空所有表；为 False 时目标表必须为空
+
+    Yields:
+        tuple: (游标, 当前结构版本, 各表的列名集合)
+    """
+    connection = mysql.connector.connect(**{**DB_CONFIG, 'autocommit': False})
+    cursor = connection.cursor()
+    try:
+        schema_version, columns_by_table = begin_load(cursor, truncate)
+        yield cursor, schema_version, columns_by_table
+        finish_load(cursor)
+        connection.commit()
+    except BaseException:
+        try:
+            connection.rollback()
+        except mysql.connector.Error:
+            # 连接已断开时服务器会自行回滚未提交的事务
+            pass
+        logger.error("写入失败，已回滚，数据库保持写入前的状态")
+        raise
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def rebuild_derived():
+    """重建由其他表派生的区域事件索引"""
+    # 模型层在导入时创建连接池，只在需要时导入
+    from src.models.event_region import EventRegion
+
+    rows = EventRegion.rebuild()
+    logger.info(f"重建区域事件索引: {rows} 行")
+
+
+def import_world(path, chunk_size=1000, truncate=False):
+    """
+    从 JSONL 文件导入整个世界
+
+    逐行读取文件，同一张表的连续行按 chunk_size 合并为一条多行 INSERT，
+    内存占用与文件大小无关。导入期间关闭本会话的外键检查，表内的自引用
+    （如 locations.parent_location_id）无需排序；全部写入后再统一检查外键，
+    整个导入在一个事务中提交，失败时全部回滚。提交后重建派生的区域事件索引。
+
+    Args:
+        path (str): 导出文件路径，.gz 结尾时按 gzip 读取
+        chunk_size (int): 每条 INSERT 语句的行数
+        truncate (bool): 导入前清空所有表；为 False 时目标表必须为空
+
+    Returns:
+        dict: 各表导入的行数
+    """
+    counts = dict.fromkeys(TABLES, 0)
+    with load_session(truncate) as (cursor, schema_version, columns_by_table):
+        table, columns, query, batch = None, None, None, []
+
+        def flush():
+            if batch:
+                cursor.executemany(query, encode_rows(columns, batch))
+                counts[table] += len(batch)
+                batch.clear()
+
+        with _open(path, 'r') as source:
+            _read_header(source.readline(), schema_version)
+            for line_number, line in enumerate(source, 2):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                row_table, row = record.get('table'), record.get('row')
+                if not isinstance(row, dict):
+                    raise ValueError(f"第 {line_number} 行: 缺少行数据")
+                row_columns = tuple(row)
+                if (row_table, row_columns) != (table, columns) or len(batch) >= chunk_size:
+                    flush()
+                    if row_table != table:
+                        logger.info(f"导入表 {row_table}...")
+                    try:
+                        query = insert_query(row_table, row_columns, columns_by_table)
+                    except ValueError as e:
+                        raise ValueError(f"第 {line_number} 行: {e}")
+                    table, columns = row_table, row_columns
+                batch.append(tuple(row.values()))
+            flush()
+
+    rebuild_derived()
+    return counts
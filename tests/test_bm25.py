@@ -0,0 +1,92 @@
+"""
+src.memory.bm25 的分词和倒排索引增删
+"""
+from src.memory.bm25 import BM25Index, tokenize
+
+
+def test_tokenize_cjk_bigrams():
+    assert tokenize("王城庆典") == ["王城", "城庆", "庆典"]
+
+
+def test_tokenize_short_cjk_run_kept_whole():
+    assert tokenize("城") == ["城"]
+    assert tokenize("王城") == ["王城"]
+
+
+def test_tokenize_latin_words_lowercased():
+    assert tokenize("Hello, World 42") == ["hello", "world", "42"]
+
+
+def test_tokenize_mixed_scripts_split_at_boundary():
+    assert tokenize("艾琳Knight骑士") == ["艾琳", "knight", "骑士"]
+
+
+def test_tokenize_japanese_and_korean_are_cjk():
+    assert tokenize("カタナ") == ["カタ", "タナ"]
+    assert tokenize("한국어") == ["한국", "국어"]
+
+
+def test_tokenize_empty():
+    assert tokenize(None) == []
+    assert tokenize("") == []
+    assert tokenize("，。！") == []
+
+
+def _snapshot(index):
+    return (
+        {term: dict(postings) for term, postings in index._postings.items()},
+        dict(index._doc_lengths),
+        index._total_length,
+    )
+
+
+def test_add_and_search():
+    index = BM25Index()
+    index.add("e1", "加冕典礼在王城举行", {"id": "e1"})
+    index.add("e2", "森林里的狩猎", {"id": "e2"})
+    hits = index.search("王城", 5)
+    assert [doc_id for doc_id, _ in hits] == ["e1"]
+    assert index.get("e1") == {"id": "e1"}
+    assert len(index) == 2 and "e2" in index
+
+
+def test_remove_drops_all_postings():
+    index = BM25Index()
+    index.add("e1", "王城 王城 庆典")
+    before = _snapshot(index)
+    index.add("e2", "王城 狩猎")
+    index.remove("e2")
+    assert _snapshot(index) == before
+    index.remove("e1")
+    assert index._postings == {}
+    assert index._total_length == 0
+    assert len(index) == 0
+    assert index.search("王城", 5) == []
+
+
+def test_remove_missing_is_noop():
+    index = BM25Index()
+    index.add("e1", "王城")
+    before = _snapshot(index)
+    index.remove("missing")
+    assert _snapshot(index) == before
+
+
+def test_readd_replaces_old_terms():
+    index = BM25Index()
+    index.add("e1", "加冕典礼", {"v": 1})
+    index.add("e1", "狩猎", {"v": 2})
+    assert index.search("加冕", 5) == []
+    assert [doc_id for doc_id, _ in index.search("狩猎", 5)] == ["e1"]
+    assert index.get("e1") == {"v": 2}
+    assert index._doc_lengths == {"e1": len(tokenize("狩猎"))}
+    assert index._total_length == len(tokenize("狩猎"))
+
+
+def test_docs_and_clear():
+    index = BM25Index()
+    index.add("e1", "王城", {"id": "e1"})
+    index.add("e2", "森林", {"id": "e2"})
+    assert sorted(doc["id"] for doc in index.docs()) == ["e1", "e2"]
+    index.clear()
+    assert len(index) == 0 and index.docs() == [] and index._total_length == 0
@@ -0,0 +1,56 @@
+"""
+src.db.ids 的ID生成、规范化和存储格式转换
+"""
+import uuid
+
+from src.db.ids import (
+    LEGACY_NAMESPACE, canonical_fields, canonical_id, decode_id, decode_rows, encode_id, new_id, parse_id,
+)
+
+
+def test_new_ids_are_increasing_uuid7():
+    ids = [new_id() for _ in range(1000)]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    assert all(uuid.UUID(value).version == 7 for value in ids)
+
+
+def test_canonical_id_accepts_uppercase_and_unhyphenated():
+    value = new_id()
+    assert canonical_id(value.upper()) == value
+    assert canonical_id(value.replace('-', '')) == value
+    assert canonical_id(uuid.UUID(value)) == value
+    assert canonical_id(None) is None
+
+
+def test_legacy_ids_map_case_and_trailing_space_insensitively():
+    expected = str(uuid.uuid5(LEGACY_NAMESPACE, 'hero-1'))
+    assert canonical_id('hero-1') == canonical_id('Hero-1') == canonical_id('HERO-1  ') == expected
+    assert canonical_id(' hero-1') != expected
+
+
+def test_binary_round_trip():
+    for value in (new_id(), new_id().upper(), 'hero-1'):
+        stored = encode_id(value)
+        assert isinstance(stored, bytes) and len(stored) == 16
+        assert decode_id(stored) == canonical_id(value)
+        assert canonical_id(stored) == canonical_id(value)
+        assert encode_id(stored) is stored
+        assert parse_id(decode_id(stored)).bytes == stored
+    assert encode_id(None) is None and decode_id(None) is None
+
+
+def test_decode_rows_converts_only_id_columns():
+    character_id, location_id = new_id(), new_id()
+    rows = [{'character_id': encode_id(character_id), 'location_id': None, 'name': b'raw'},
+            {'character_id': encode_id('hero-1'), 'location_id': encode_id(location_id), 'name': b'raw'}]
+    assert decode_rows(rows) is rows
+    assert rows[0] == {'character_id': character_id, 'location_id': None, 'name': b'raw'}
+    assert rows[1]['character_id'] == canonical_id('hero-1') and rows[1]['location_id'] == location_id
+    assert decode_rows([]) == []
+
+
+def test_canonical_fields():
+    character_id = new_id()
+    fields = {'character_id': character_id.upper(), 'name': 'Hero-1'}
+    assert canonical_fields(fields) == {'character_id': character_id, 'name': 'Hero-1'}
+    assert fields['character_id'] == character_id.upper()
@@ -0,0 +1,51 @@
+"""
+src.mcp.tools.location_tools 的地点层级成环检查
+"""
+import asyncio
+
+import pytest
+
+from src.db.ids import canonical_id, new_id
+from src.mcp.tools.location_tools import LocationTools
+from src.models import Location
+
+
+@pytest.fixture
+def ancestors(monkeypatch):
+    chain = []
+
+    async def aget_ancestors(cls, location_id, session=None):
+        return [{'location_id': value} for value in chain]
+
+    monkeypatch.setattr(Location, 'aget_ancestors', classmethod(aget_ancestors))
+    return chain
+
+
+@pytest.mark.parametrize('location_id, parent_location_id', [
+    ('cave', 'CAVE'),
+    ('hero-1', 'Hero-1 '),
+    ('5f0e8a2c-0000-7000-8000-00000000000a', '5F0E8A2C-0000-7000-8000-00000000000A'),
+])
+def test_rejects_self_parent_in_other_spelling(ancestors, location_id, parent_location_id):
+    with pytest.raises(ValueError, match="自身"):
+        asyncio.run(LocationTools._check_parent(location_id, parent_location_id))
+
+
+@pytest.mark.parametrize('spelling', [str.upper, lambda value: value])
+def test_rejects_cycle_through_ancestor(ancestors, spelling):
+    location_id = new_id()
+    ancestors.append(canonical_id(location_id))
+    with pytest.raises(ValueError, match="下级地点"):
+        asyncio.run(LocationTools._check_parent(spelling(location_id), new_id()))
+
+
+def test_rejects_cycle_for_legacy_id(ancestors):
+    ancestors.append(canonical_id('cave'))
+    with pytest.raises(ValueError, match="下级地点"):
+        asyncio.run(LocationTools._check_parent('Cave', new_id()))
+
+
+def test_accepts_unrelated_parent(ancestors):
+    ancestors.append(new_id())
+    asyncio.run(LocationTools._check_parent(new_id(), new_id()))
+    asyncio.run(LocationTools._check_parent(new_id(), None))
@@ -0,0 +1,52 @@
+"""
+src.mcp.pagination 的游标编解码和每页数量
+"""
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from config.database import PAGE_CONFIG
+from src.mcp.pagination import decode_cursor, encode_cursor, make_page, page_size
+
+SCOPE = {'tool': 'list_events', 'order_by': 'recency'}
+
+
+def test_cursor_round_trip():
+    values = [datetime(2024, 5, 1, 12, 30), Decimal('7.5'), 'a', None]
+    cursor = encode_cursor(SCOPE, values)
+    assert '=' not in cursor
+    assert decode_cursor(SCOPE, cursor) == ('2024-05-01 12:30:00', 7.5, 'a', None)
+
+
+def test_empty_cursor_is_first_page():
+    assert decode_cursor(SCOPE, None) is None
+    assert decode_cursor(SCOPE, '') is None
+
+
+def test_cursor_rejected_for_other_scope():
+    cursor = encode_cursor(SCOPE, [1])
+    with pytest.raises(ValueError, match="不匹配"):
+        decode_cursor({**SCOPE, 'order_by': 'importance'}, cursor)
+
+
+@pytest.mark.parametrize('cursor', ['not-base64!', 'bm90IGpzb24', encode_cursor(SCOPE, [1])[:-3]])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(SCOPE, cursor)
+
+
+def test_page_size():
+    assert page_size() == PAGE_CONFIG['default_size']
+    assert page_size(PAGE_CONFIG['max_size'] + 1) == PAGE_CONFIG['max_size']
+    for limit in (0, -1, '10'):
+        with pytest.raises(ValueError):
+            page_size(limit)
+
+
+def test_make_page():
+    rows = [{'id': i} for i in range(4)]
+    page = make_page(rows, 3, SCOPE, [('id', False)])
+    assert page['items'] == rows[:3]
+    assert decode_cursor(SCOPE, page['next_cursor']) == (2,)
+    assert make_page(rows, 4, SCOPE, [('id', False)])['next_cursor'] is None
@@ -0,0 +1,23 @@
+"""
+src.memory.ranking 的关系图接近度
+"""
+import asyncio
+import uuid
+
+from src.memory import ranking
+from src.memory.ranking import HybridRanker
+
+
+def test_proximity_map_accepts_non_canonical_seed(monkeypatch):
+    alice, bob, carol = (str(uuid.uuid4()) for _ in range(3))
+    edges = {
+        alice: [{'character_id_1': alice, 'character_id_2': bob, 'strength': 50}],
+        bob: [{'character_id_1': bob, 'character_id_2': carol, 'strength': 50}],
+    }
+
+    async def aget_edges(character_ids):
+        return [edge for character_id in character_ids for edge in edges.get(character_id, [])]
+
+    monkeypatch.setattr(ranking.Relationship, 'aget_edges', aget_edges)
+    closeness = asyncio.run(HybridRanker().proximity_map(alice.upper()))
+    assert closeness == {alice: 1.0, bob: 0.5, carol: 0.25}
@@ -0,0 +1,36 @@
+"""
+src.memory.search_engine 中进程内索引引擎的公共部分
+"""
+import pytest
+
+from src.memory.search_engine import BM25SearchEngine, _SyncedIndexEngine
+from src.models import hooks
+
+
+def test_engine_missing_methods_fails_on_construction():
+    class Incomplete(_SyncedIndexEngine):
+        entities = {}
+
+        def _new_index(self, entity):
+            return {}
+
+        def _index_rows(self, entity, rows):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_bm25_engine_applies_hook_payloads():
+    engine = BM25SearchEngine()
+    try:
+        key = '0190a5f1-0000-7000-8000-000000000001'
+        hooks.notify('events', key, fields={'event_id': key, 'title': '加冕典礼', 'description': '王城'})
+        assert engine.indexes['events'].get(key)['title'] == '加冕典礼'
+        hooks.notify('events', key.upper(), fields={'title': '狩猎'})
+        row = engine.indexes['events'].get(key)
+        assert row['title'] == '狩猎' and row['description'] == '王城'
+        hooks.notify('events', key, deleted=True)
+        assert key not in engine.indexes['events']
+    finally:
+        hooks.unsubscribe(engine._on_change)
@@ -0,0 +1,20 @@
+"""
+src.utils.snapshot 的压缩方式选择
+"""
+import logging
+
+from src.utils import snapshot
+
+
+def test_default_codec_prefers_zstd(monkeypatch, caplog):
+    monkeypatch.setattr(snapshot, 'CODECS', {'none': None, 'zlib': None, 'lz4': None, 'zstd': None})
+    with caplog.at_level(logging.WARNING, logger=snapshot.__name__):
+        assert snapshot.default_codec() == 'zstd'
+    assert not caplog.records
+
+
+def test_default_codec_warns_on_zlib_fallback(monkeypatch, caplog):
+    monkeypatch.setattr(snapshot, 'CODECS', {'none': None, 'zlib': None})
+    with caplog.at_level(logging.WARNING, logger=snapshot.__name__):
+        assert snapshot.default_codec() == 'zlib'
+    assert 'zlib' in caplog.text
@@ -0,0 +1,57 @@
+"""
+src.models.sql_utils 的 keyset 分页条件
+
+SQLite 与 MySQL 一样把 NULL 视为最小值，用内存库逐页执行生成的条件，
+检查所有行恰好各出现一次且顺序与一次性排序相同。
+"""
+import sqlite3
+
+import pytest
+
+from src.models.sql_utils import build_keyset_clause
+
+ROWS = [(i, ts, imp) for i, (ts, imp) in enumerate(
+    [(None, 5), (3, None), (1, 5), (None, None), (2, 9), (3, 5), (None, 9), (1, None), (2, 5), (3, 9), (None, 5), (1, 9)]
+)]
+
+
+def _paginate(columns, page_size):
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE t (id INTEGER, ts INTEGER, imp INTEGER)')
+    connection.executemany('INSERT INTO t VALUES (?, ?, ?)', ROWS)
+    names = ', '.join(name for name, _ in columns)
+    _, _, order_clause = build_keyset_clause(columns)
+    expected = connection.execute(f'SELECT {names} FROM t {order_clause}').fetchall()
+
+    pages, after = [], None
+    while True:
+        condition, params, order_clause = build_keyset_clause(columns, after, nullable=('ts', 'imp'))
+        where = f"WHERE {condition}" if condition else ""
+        query = f'SELECT {names} FROM t {where} {order_clause} LIMIT {page_size}'
+        page = connection.execute(query.replace('%s', '?').replace('FALSE', '0'), params).fetchall()
+        pages += page
+        if len(page) < page_size:
+            return pages, expected
+        after = page[-1]
+
+
+@pytest.mark.parametrize('columns', [
+    [('ts', True), ('id', True)],
+    [('ts', False), ('id', False)],
+    [('ts', True), ('id', False)],
+    [('imp', True), ('ts', False), ('id', True)],
+    [('imp', False), ('ts', True), ('id', False)],
+])
+@pytest.mark.parametrize('page_size', [1, 2, 5])
+def test_keyset_pages_cover_nulls(columns, page_size):
+    pages, expected = _paginate(columns, page_size)
+    assert pages == expected
+
+
+def test_first_page_has_no_condition():
+    assert build_keyset_clause([('ts', True), ('id', True)], alias='e') == (None, (), "ORDER BY e.ts DESC, e.id DESC")
+
+
+def test_cursor_length_must_match_columns():
+    with pytest.raises(ValueError):
+        build_keyset_clause([('ts', True), ('id', True)], after=(1,))
@@ -0,0 +1,82 @@
+"""
+src.utils.transfer 的批量写入事务
+"""
+import pytest
+
+from src.utils import transfer
+
+
+class FakeCursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, **config):
+        self.config = config
+        self.cursor_ = FakeCursor()
+        self.events = []
+
+    def cursor(self):
+        return self.cursor_
+
+    def commit(self):
+        self.events.append('commit')
+
+    def rollback(self):
+        self.events.append('rollback')
+
+    def close(self):
+        self.events.append('close')
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    opened = []
+
+    def connect(**config):
+        opened.append(FakeConnection(**config))
+        return opened[-1]
+
+    monkeypatch.setattr(transfer.mysql.connector, 'connect', connect)
+    monkeypatch.setattr(transfer, 'ensure_version_table', lambda cursor: None)
+    monkeypatch.setattr(transfer, 'get_current_version', lambda cursor: 7)
+    monkeypatch.setattr(transfer, '_table_columns', lambda cursor: {t: {'id'} for t in transfer.TABLES})
+    monkeypatch.setattr(transfer, 'find_orphans', lambda cursor: [])
+    return opened
+
+
+def test_load_session_commits_after_checks(connections):
+    with transfer.load_session(truncate=True) as (cursor, schema_version, _):
+        cursor.execute("INSERT")
+    connection = connections[0]
+    assert connection.config['autocommit'] is False
+    assert schema_version == 7
+    assert not any(s.startswith('TRUNCATE') for s in cursor.statements)
+    assert {f"DELETE FROM {t}" for t in transfer.TABLES} <= set(cursor.statements)
+    assert cursor.statements.index("SET SESSION foreign_key_checks = 1") > cursor.statements.index("INSERT")
+    assert connection.events == ['commit', 'close']
+
+
+def test_load_session_rolls_back_on_error(connections):
+    with pytest.raises(ValueError):
+        with transfer.load_session(truncate=True):
+            raise ValueError("bad row")
+    assert connections[0].events == ['rollback', 'close']
+
+
+def test_load_session_rolls_back_on_orphans(connections, monkeypatch):
+    monkeypatch.setattr(transfer, 'find_orphans', lambda cursor: [('events', 'location_id', 'locations', 1)])
+    with pytest.raises(ValueError, match="外键"):
+        with transfer.load_session():
+            pass
+    assert connections[0].events == ['rollback', 'close']
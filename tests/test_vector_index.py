@@ -0,0 +1,77 @@
+"""
+src.memory.vector_index 的增删、检索和 IVF 分区训练
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.memory.embedding import Embedder
+from src.memory.vector_index import VectorIndex
+
+
+def _unit_vectors(count, dim=16, seed=1):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_embedder_is_abstract():
+    with pytest.raises(TypeError):
+        Embedder()
+
+
+def test_exact_search_add_replace_remove():
+    vectors = _unit_vectors(10)
+    index = VectorIndex(16)
+    index.add_many([f"k{i}" for i in range(10)], vectors)
+    assert index.search(vectors[3], 1)[0][0][0] == "k3"
+    index.add("k3", vectors[5])
+    assert {key for key, _ in index.search(vectors[5], 2)[0]} == {"k3", "k5"}
+    index.remove("k5")
+    assert "k5" not in index and len(index) == 9
+    assert index.search(vectors[5], 1)[0][0][0] == "k3"
+
+
+def test_training_without_event_loop_is_synchronous():
+    vectors = _unit_vectors(400)
+    index = VectorIndex(16, ivf_threshold=100, nprobe=4)
+    index.add_many(list(range(400)), vectors)
+    assert index.training is None
+    assert index._centroids is not None and index._trained_size == 400
+    assert index.search(vectors[7], 1)[0][0][0] == 7
+
+
+def test_training_in_event_loop_runs_in_background():
+    async def scenario():
+        vectors = _unit_vectors(500)
+        index = VectorIndex(16, ivf_threshold=300, nprobe=64)
+        index.add_many(list(range(300)), vectors[:300])
+        # 训练在线程池中进行，期间仍按精确扫描检索
+        assert index.training is not None and index._centroids is None
+        assert index.search(vectors[10], 1)[0][0][0] == 10
+        # 训练期间写入的向量在切换质心时重新归入最近的分区
+        index.add_many(list(range(300, 500)), vectors[300:])
+        index.add(0, vectors[499])
+        index.remove(1)
+        await index.training
+        assert index.training is None and index._centroids is not None
+        size = len(index)
+        expected = np.argmax(index._vectors[:size] @ index._centroids.T, axis=1)
+        touched = [index._rows[key] for key in [0, *range(300, 500)]]
+        assert np.array_equal(index._assignments[touched], expected[touched])
+        assert index.search(vectors[450], 1)[0][0][0] == 450
+        assert 1 not in index
+
+    asyncio.run(scenario())
+
+
+def test_clear_discards_training_in_progress():
+    async def scenario():
+        index = VectorIndex(16, ivf_threshold=300)
+        index.add_many(list(range(300)), _unit_vectors(300))
+        training = index.training
+        index.clear()
+        await training
+        assert index._centroids is None and index.training is None and len(index) == 0
+
+    asyncio.run(scenario())